@@ -0,0 +1,268 @@
+# coding: utf8
+from inspect import Parameter, signature
+from logging import getLogger
+from pathlib import Path
+from time import perf_counter
+from typing import Any, Dict, Sequence
+
+import pandas as pd
+import torch
+from torch.cuda.amp import GradScaler, autocast
+from torch.utils.data import DataLoader
+
+from clinicadl.utils.callbacks.callbacks import PerformanceCounters
+from clinicadl.utils.caps_dataset.data import return_dataset
+from clinicadl.utils.caps_dataset.synthetic import (
+    synthetic_data_df,
+    synthetic_preprocessing_dict,
+)
+from clinicadl.utils.exceptions import ClinicaDLArgumentError
+
+logger = getLogger("clinicadl.benchmark")
+
+BENCHMARK_STEPS = ["data", "train", "inference"]
+# Column of the synthetic DataFrame used as label by each task
+TASK_LABELS = {
+    "classification": "diagnosis",
+    "regression": "age",
+    "reconstruction": None,
+}
+
+
+def _init_task_manager(network_task: str, mode: str):
+    from clinicadl.utils.task_manager import (
+        ClassificationManager,
+        ReconstructionManager,
+        RegressionManager,
+    )
+
+    if network_task == "classification":
+        return ClassificationManager(mode, n_classes=2)
+    elif network_task == "regression":
+        return RegressionManager(mode)
+    elif network_task == "reconstruction":
+        return ReconstructionManager(mode)
+    else:
+        raise NotImplementedError(
+            f"Task {network_task} is not implemented in ClinicaDL. "
+            f"Please choose between classification, regression and reconstruction."
+        )
+
+
+def _init_model(architecture: str, available_kwargs: Dict[str, Any]):
+    """
+    Instantiates the network, giving to its constructor the arguments it expects
+    among available_kwargs.
+    """
+    import clinicadl.utils.network as network_package
+
+    try:
+        model_class = getattr(network_package, architecture)
+    except AttributeError:
+        raise ClinicaDLArgumentError(
+            f"The network {architecture} does not exist. "
+            f"Please use `clinicadl train list_models` to see the available networks."
+        )
+
+    kwargs = dict()
+    for name, parameter in signature(model_class.__init__).parameters.items():
+        if name == "self":
+            continue
+        if name in available_kwargs:
+            kwargs[name] = available_kwargs[name]
+        elif parameter.default is Parameter.empty:
+            raise ClinicaDLArgumentError(
+                f"The network {architecture} needs the argument {name}, "
+                f"which cannot be set by the benchmark."
+            )
+    return model_class(**kwargs)
+
+
+def _measure(dataloader: DataLoader, step_fn, synchronize: bool) -> Dict[str, float]:
+    """
+    Iterates once over the dataloader and applies step_fn to each batch.
+
+    The first batch is a warm-up (start of the workers, allocation of the memory,
+    choice of the algorithms of cuDNN) which is not counted, unless it is the only one.
+
+    Returns:
+        the number of samples processed, the time elapsed and the time spent
+        waiting for the data.
+    """
+    performance = PerformanceCounters()
+    n_batches = len(dataloader)
+    for i, data in enumerate(performance.iterate(dataloader)):
+        with performance.timer("compute"):
+            step_fn(data)
+            if synchronize:
+                torch.cuda.synchronize()
+        performance.n_samples += data["image"].size(0)
+        if i == 0 and n_batches > 1:
+            performance.reset()
+
+    total_time = perf_counter() - performance.beginning_time
+    return {
+        "n_samples": performance.n_samples,
+        "time": total_time,
+        "data_time": performance.times["data"],
+        "samples_per_s": performance.n_samples / total_time,
+    }
+
+
+def benchmark(
+    architecture: str = None,
+    network_task: str = "classification",
+    mode: str = "image",
+    generator: str = "trivial",
+    image_size: Sequence[int] = (169, 208, 179),
+    n_images: int = 32,
+    batch_size: int = 8,
+    n_proc: int = 2,
+    gpu: bool = True,
+    amp: bool = False,
+    pin_memory: bool = False,
+    prefetch_factor: int = None,
+    image_cache_size: int = 0,
+    seed: int = 0,
+    steps: Sequence[str] = BENCHMARK_STEPS,
+    preprocessing_options: Dict[str, Any] = None,
+    output_tsv: Path = None,
+) -> pd.DataFrame:
+    """
+    Measures the number of samples processed per second by the data pipeline and by
+    a network, on a synthetic dataset generated in memory.
+
+    Args:
+        architecture: name of the network. Default uses the default network of the task.
+        network_task: task learnt by the network (classification, regression or reconstruction).
+        mode: type of the elements given to the network (image, patch, roi or slice).
+        generator: type of the synthetic images (random, trivial or shepplogan).
+        image_size: spatial shape of the synthetic images (D, H, W).
+        n_images: number of images of the synthetic dataset.
+        batch_size: size of the batches.
+        n_proc: number of DataLoader workers.
+        gpu: If True the network is run on GPU.
+        amp: If True automatic mixed precision is used.
+        pin_memory: If True the batches are loaded in pinned memory.
+        prefetch_factor: number of batches loaded in advance by each worker.
+        image_cache_size: number of full images kept in memory by each worker when
+            elements are extracted on-the-fly (patch, roi and slice modes).
+        seed: seed of the synthetic dataset.
+        steps: steps measured among data (DataLoader only), train (forward, backward
+            and optimizer step) and inference (forward without gradients).
+        preprocessing_options: options of the mode given to synthetic_preprocessing_dict
+            (patch_size, stride_size, slice_direction, slice_mode, discarded_slices,
+            roi_list, uncropped_roi).
+        output_tsv: If given, the results are written in this TSV file.
+    Returns:
+        DataFrame with one row per step, containing the number of samples processed,
+        the time elapsed, the time spent waiting for the data and the number of samples per second.
+    """
+    unknown_steps = set(steps) - set(BENCHMARK_STEPS)
+    if len(unknown_steps) > 0:
+        raise ClinicaDLArgumentError(
+            f"Steps {sorted(unknown_steps)} do not exist. Please choose among {BENCHMARK_STEPS}."
+        )
+    if amp and not gpu:
+        raise ClinicaDLArgumentError(
+            "AMP is designed to work with modern GPUs. Please add the --gpu flag."
+        )
+
+    task_manager = _init_task_manager(network_task, mode)
+    if architecture is None:
+        architecture = task_manager.get_default_network()
+    label = TASK_LABELS[network_task]
+
+    data_df = synthetic_data_df(n_images)
+    preprocessing_dict = synthetic_preprocessing_dict(
+        mode, generator, image_size, seed, **(preprocessing_options or dict())
+    )
+    label_code = (
+        task_manager.generate_label_code(data_df, label) if label is not None else None
+    )
+    dataset = return_dataset(
+        None,
+        data_df,
+        preprocessing_dict,
+        all_transformations=None,
+        label=label,
+        label_code=label_code,
+        image_cache_size=image_cache_size,
+    )
+    loader_options = {
+        "num_workers": n_proc,
+        # Pinned memory is only useful to speed up host to GPU copies
+        "pin_memory": pin_memory and torch.cuda.is_available(),
+    }
+    if n_proc > 0:
+        loader_options["persistent_workers"] = True
+        if prefetch_factor is not None:
+            loader_options["prefetch_factor"] = prefetch_factor
+    dataloader = DataLoader(
+        dataset, batch_size=batch_size, shuffle=True, **loader_options
+    )
+    logger.info(
+        f"Synthetic dataset of {n_images} {generator} images of size {list(image_size)}: "
+        f"{len(dataset)} {mode}s of size {list(dataset.size)}."
+    )
+
+    model = _init_model(
+        architecture,
+        {
+            "input_size": dataset.size,
+            "output_size": task_manager.output_size(dataset.size, data_df, label),
+            "gpu": gpu,
+        },
+    )
+    criterion = task_manager.get_criterion()
+    optimizer = torch.optim.Adam(model.parameters())
+    scaler = GradScaler(enabled=amp)
+    synchronize = "cuda" in str(model.device)
+    logger.info(f"Network {architecture} on {model.device}.")
+
+    def data_step(data):
+        pass
+
+    def train_step(data):
+        with autocast(enabled=amp):
+            _, loss_dict = model.compute_outputs_and_loss(data, criterion)
+        scaler.scale(loss_dict["loss"]).backward()
+        scaler.step(optimizer)
+        scaler.update()
+        optimizer.zero_grad(set_to_none=True)
+
+    def inference_step(data):
+        with torch.no_grad(), autocast(enabled=amp):
+            model.compute_outputs_and_loss(data, criterion)
+
+    step_functions = {
+        "data": data_step,
+        "train": train_step,
+        "inference": inference_step,
+    }
+
+    rows = []
+    for step in steps:
+        step_fn = step_functions[step]
+        # Data augmentation and dropout are only applied during training
+        if step == "inference":
+            model.eval()
+            dataset.eval()
+        else:
+            model.train()
+            dataset.train()
+        row = {"step": step, **_measure(dataloader, step_fn, synchronize)}
+        if synchronize:
+            row["max_memory_mb"] = torch.cuda.max_memory_allocated() / 2**20
+        logger.info(
+            f"{step}: {row['samples_per_s']:.2f} samples/s "
+            f"({row['n_samples']} samples in {row['time']:.2f} s, "
+            f"{row['data_time']:.2f} s waiting for data)."
+        )
+        rows.append(row)
+
+    results_df = pd.DataFrame(rows)
+    if output_tsv is not None:
+        results_df.to_csv(output_tsv, sep="\t", index=False)
+        logger.info(f"Results written in {output_tsv}.")
+    return results_df
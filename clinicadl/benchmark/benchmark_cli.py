@@ -0,0 +1,221 @@
+from pathlib import Path
+
+import click
+
+from clinicadl.utils import cli_param
+from clinicadl.utils.exceptions import ClinicaDLArgumentError
+
+
+@click.command(name="benchmark")
+@click.option(
+    "-a",
+    "--architecture",
+    type=str,
+    default=None,
+    help="Name of the network benchmarked. Default uses the default network of the task.",
+)
+@click.option(
+    "--network_task",
+    type=click.Choice(["classification", "regression", "reconstruction"]),
+    default="classification",
+    show_default=True,
+    help="Task learnt by the network.",
+)
+@click.option(
+    "--mode",
+    type=click.Choice(["image", "patch", "roi", "slice"]),
+    default="image",
+    show_default=True,
+    help="Type of the elements given to the network.",
+)
+@click.option(
+    "--generator",
+    type=click.Choice(["random", "trivial", "shepplogan"]),
+    default="trivial",
+    show_default=True,
+    help="Type of the synthetic images generated in memory.",
+)
+@click.option(
+    "--image_size",
+    type=str,
+    default="169x208x179",
+    show_default=True,
+    help="Spatial size of the synthetic images in the shape DxHxW.",
+)
+@click.option(
+    "--n_images",
+    type=int,
+    default=32,
+    show_default=True,
+    help="Number of images of the synthetic dataset.",
+)
+@click.option(
+    "--seed",
+    type=int,
+    default=0,
+    show_default=True,
+    help="Seed of the synthetic dataset.",
+)
+@click.option(
+    "--step",
+    "steps",
+    type=click.Choice(["data", "train", "inference"]),
+    multiple=True,
+    default=["data", "train", "inference"],
+    show_default=True,
+    help="Steps measured: data (DataLoader only), train (forward, backward and optimizer "
+    "step) and inference (forward without gradients).",
+)
+@click.option(
+    "--patch_size",
+    type=int,
+    default=50,
+    show_default=True,
+    help="Patch size (patch mode).",
+)
+@click.option(
+    "--stride_size",
+    type=int,
+    default=50,
+    show_default=True,
+    help="Stride size (patch mode).",
+)
+@click.option(
+    "--slice_direction",
+    "-sd",
+    type=click.IntRange(0, 2),
+    default=0,
+    show_default=True,
+    help="Slice direction. 0: Sagittal plane, 1: Coronal plane, 2: Axial plane (slice mode).",
+)
+@click.option(
+    "--slice_mode",
+    type=click.Choice(["rgb", "single"]),
+    default="rgb",
+    show_default=True,
+    help="Number of channels of the slices (slice mode).",
+)
+@click.option(
+    "-ds",
+    "--discarded_slices",
+    type=int,
+    default=(0, 0),
+    multiple=2,
+    help="""Number of slices discarded from respectively the beginning and
+        the end of the image (slice mode).""",
+)
+@click.option(
+    "--roi_list",
+    type=click.Choice(["left", "right", "center"]),
+    default=["left", "right"],
+    multiple=True,
+    show_default=True,
+    help="Regions extracted from the synthetic images (roi mode).",
+)
+@click.option(
+    "--roi_uncrop_output",
+    type=bool,
+    default=False,
+    is_flag=True,
+    help="Disable cropping option so the output tensors have the same size than the whole image (roi mode).",
+)
+@click.option(
+    "--image_cache_size",
+    type=int,
+    default=0,
+    show_default=True,
+    help="Number of full images kept in memory by each worker when elements are "
+    "extracted on-the-fly (patch, roi and slice modes).",
+)
+@click.option(
+    "--output_tsv",
+    type=click.Path(path_type=Path),
+    default=None,
+    help="Path to a TSV file in which the results are written.",
+)
+@cli_param.option.use_gpu
+@cli_param.option.amp
+@cli_param.option.n_proc
+@cli_param.option.batch_size
+@cli_param.option.pin_memory
+@cli_param.option.prefetch_factor
+def cli(
+    architecture,
+    network_task,
+    mode,
+    generator,
+    image_size,
+    n_images,
+    seed,
+    steps,
+    patch_size,
+    stride_size,
+    slice_direction,
+    slice_mode,
+    discarded_slices,
+    roi_list,
+    roi_uncrop_output,
+    image_cache_size,
+    output_tsv,
+    gpu,
+    amp,
+    n_proc,
+    batch_size,
+    pin_memory,
+    prefetch_factor,
+):
+    """Measure the number of samples processed per second by a network.
+
+    The network is fed with synthetic images generated in memory, so that the speed
+    of the data pipeline, of the training and of the inference can be measured
+    without generating and reading a CAPS.
+    """
+    from clinicadl.utils.cmdline_utils import check_gpu
+
+    if gpu:
+        check_gpu()
+    elif amp:
+        raise ClinicaDLArgumentError(
+            "AMP is designed to work with modern GPUs. Please add the --gpu flag."
+        )
+
+    try:
+        image_size = [int(size) for size in image_size.split("x")]
+    except ValueError:
+        raise ClinicaDLArgumentError(
+            f"The image size must be in the shape DxHxW, got {image_size}."
+        )
+
+    from .benchmark import benchmark
+
+    benchmark(
+        architecture=architecture,
+        network_task=network_task,
+        mode=mode,
+        generator=generator,
+        image_size=image_size,
+        n_images=n_images,
+        batch_size=batch_size,
+        n_proc=n_proc,
+        gpu=gpu,
+        amp=amp,
+        pin_memory=bool(pin_memory),
+        prefetch_factor=prefetch_factor,
+        image_cache_size=image_cache_size,
+        seed=seed,
+        steps=steps,
+        preprocessing_options={
+            "patch_size": patch_size,
+            "stride_size": stride_size,
+            "slice_direction": slice_direction,
+            "slice_mode": slice_mode,
+            "discarded_slices": discarded_slices,
+            "roi_list": roi_list,
+            "uncropped_roi": roi_uncrop_output,
+        },
+        output_tsv=output_tsv,
+    )
+
+
+if __name__ == "__main__":
+    cli()
@@ -1,6 +1,7 @@
 # coding: utf8
 import click
 
+from clinicadl.benchmark.benchmark_cli import cli as benchmark_cli
 from clinicadl.generate.generate_cli import cli as generate_cli
 from clinicadl.hugging_face.hugging_face_cli import cli as hf_cli
 from clinicadl.interpret.interpret_cli import cli as interpret_cli
@@ -47,6 +48,7 @@ cli.add_command(interpret_cli)
 cli.add_command(qc_cli)
 cli.add_command(random_search_cli)
 cli.add_command(hf_cli)
+cli.add_command(benchmark_cli)
 
 if __name__ == "__main__":
     cli()
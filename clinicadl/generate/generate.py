@@ -7,6 +7,7 @@ This file generates data for trivial or intractable (random) data for binary cla
 import tarfile
 from logging import getLogger
 from pathlib import Path
+from tempfile import TemporaryDirectory
 from typing import Dict, List, Optional, Tuple
 
 import nibabel as nib
@@ -303,18 +304,26 @@ def generate_trivial_dataset(
         preprocessing, uncropped_image, tracer, suvr_reference_region
     )
 
-    def create_trivial_image(subject_id: int, output_df: pd.DataFrame) -> pd.DataFrame:
+    # Find all the source images at once, with one lookup per cohort
+    image_paths = dict()
+    for cohort, cohort_df in data_df.loc[range(n_subjects)].groupby("cohort"):
+        cohort_paths = clinicadl_file_reader(
+            list(cohort_df.participant_id),
+            list(cohort_df.session_id),
+            caps_dict[cohort],
+            file_type,
+            n_procs=n_proc,
+        )[0]
+        image_paths.update(zip(cohort_df.index, cohort_paths))
+
+    def create_trivial_image(
+        subject_id: int, atlas_to_mask: np.ndarray, output_df: pd.DataFrame
+    ) -> pd.DataFrame:
         data_idx = subject_id // 2
         label = subject_id % 2
 
-        participant_id = data_df.loc[data_idx, "participant_id"]
         session_id = data_df.loc[data_idx, "session_id"]
-        cohort = data_df.loc[data_idx, "cohort"]
-        image_path = Path(
-            clinicadl_file_reader(
-                [participant_id], [session_id], caps_dict[cohort], file_type
-            )[0][0]
-        )
+        image_path = Path(image_paths[data_idx])
         image_nii = nib.load(image_path)
         image = image_nii.get_fdata()
 
@@ -335,12 +344,6 @@ def generate_trivial_dataset(
 
         trivial_image_nii_dir.mkdir(parents=True, exist_ok=True)
 
-        path_to_mask = mask_path / f"mask-{label + 1}.nii"
-        if path_to_mask.is_file():
-            atlas_to_mask = nib.load(path_to_mask).get_fdata()
-        else:
-            raise ValueError("masks need to be named mask-1.nii and mask-2.nii")
-
         # Create atrophied image
         trivial_image = im_loss_roi_gaussian_distribution(
             image, atlas_to_mask, atrophy_percent
@@ -357,10 +360,22 @@ def generate_trivial_dataset(
 
         return output_df
 
-    results_df = Parallel(n_jobs=n_proc)(
-        delayed(create_trivial_image)(subject_id, output_df)
-        for subject_id in range(2 * n_subjects)
-    )
+    with TemporaryDirectory() as mask_dir:
+        # The masks are loaded once and memory-mapped, so that the workers share them
+        # instead of reading the NIfTI files for each image
+        masks = []
+        for label in range(2):
+            path_to_mask = mask_path / f"mask-{label + 1}.nii"
+            if not path_to_mask.is_file():
+                raise ValueError("masks need to be named mask-1.nii and mask-2.nii")
+            mask_npy = Path(mask_dir) / f"mask-{label + 1}.npy"
+            np.save(mask_npy, nib.load(path_to_mask).get_fdata())
+            masks.append(np.load(mask_npy, mmap_mode="r"))
+
+        results_df = Parallel(n_jobs=n_proc)(
+            delayed(create_trivial_image)(subject_id, masks[subject_id % 2], output_df)
+            for subject_id in range(2 * n_subjects)
+        )
     output_df = pd.DataFrame()
     for result in results_df:
         output_df = pd.concat([result, output_df])
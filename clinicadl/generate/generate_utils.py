@@ -129,21 +129,17 @@ def im_loss_roi_gaussian_distribution(
     gm_masked[atlas_to_mask == 0] = 0
 
     gm_loss = np.array(gm_masked, copy=True)
-    idx = np.nonzero(gm_masked)
-    coordinates = []
-    for i in range(len(idx[0])):
-        coordinates.append([idx[0][i], idx[1][i], idx[2][i]])
-    length_coordinates = len(coordinates)  # all the non zero values
+    # all the non zero values, in the same order as np.nonzero
+    atrophy_voxels = gm_masked != 0
+    gm_values = gm_masked[atrophy_voxels]
 
     # gaussian distribution with std = 0.1 and media = 0
-    n = np.random.normal(loc=0.0, scale=0.1, size=length_coordinates)
+    n = np.random.normal(loc=0.0, scale=0.1, size=len(gm_values))
     max_value = np.min(n)
     n_new = n + abs(max_value)
 
     n_diff = n_new * 10 + min_value
-    for i, coord in enumerate(coordinates):
-        x, y, z = coord
-        gm_loss[x, y, z] = gm_masked[x, y, z] - n_diff[i] * (gm_masked[x, y, z]) / 100
+    gm_loss[atrophy_voxels] = gm_values - n_diff * gm_values / 100
 
     normal_region = np.array(im_data, copy=True)
     normal_region[atlas_to_mask > 0] = 0
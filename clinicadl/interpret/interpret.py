@@ -25,6 +25,9 @@ def interpret(
     overwrite_name: bool = False,
     level: int = None,
     save_nifti: bool = False,
+    save_diagnosis_maps: bool = False,
+    pin_memory: bool = None,
+    prefetch_factor: int = None,
 ):
     """
     This function loads a MAPS and interprets all the models selected using a metric in selection_metrics.
@@ -74,6 +77,12 @@ def interpret(
         Layer number in the convolutional part after which the feature map is chosen.
     save_nifi : bool
         If True, save the interpretation map in nifti format.
+    save_diagnosis_maps: bool
+        If True, also saves the mean interpretation of each diagnosis.
+    pin_memory: bool
+        If given, sets the value of pin_memory, else use the same as in training step.
+    prefetch_factor: int
+        If given, sets the value of prefetch_factor, else use the same as in training step.
     verbose: int
         Level of verbosity (0: warning, 1: info, 2: debug).
     """
@@ -105,4 +114,7 @@ def interpret(
         overwrite_name=overwrite_name,
         level=level,
         save_nifti=save_nifti,
+        save_diagnosis_maps=save_diagnosis_maps,
+        pin_memory=pin_memory,
+        prefetch_factor=prefetch_factor,
     )
@@ -76,6 +76,8 @@ from clinicadl.utils.exceptions import ClinicaDLArgumentError
 @cli_param.option.use_gpu
 @cli_param.option.amp
 @cli_param.option.batch_size
+@cli_param.option.pin_memory
+@cli_param.option.prefetch_factor
 @cli_param.option.overwrite
 @click.option(
     "--overwrite_name",
@@ -85,6 +87,13 @@ from clinicadl.utils.exceptions import ClinicaDLArgumentError
     help="Overwrite the name if it already exists.",
 )
 @cli_param.option.save_nifti
+@click.option(
+    "--save_diagnosis_maps",
+    type=bool,
+    default=False,
+    is_flag=True,
+    help="Save the mean saliency map of each diagnosis in addition to the mean saliency map.",
+)
 def cli(
     input_maps_directory,
     data_group,
@@ -99,12 +108,15 @@ def cli(
     target_node,
     save_individual,
     batch_size,
+    pin_memory,
+    prefetch_factor,
     n_proc,
     gpu,
     amp,
     overwrite,
     overwrite_name,
     save_nifti,
+    save_diagnosis_maps,
 ):
     """Interpretation of trained models using saliency map method.
 
@@ -140,6 +152,8 @@ def cli(
         target_node=target_node,
         save_individual=save_individual,
         batch_size=batch_size,
+        pin_memory=pin_memory,
+        prefetch_factor=prefetch_factor,
         n_proc=n_proc,
         gpu=gpu,
         amp=amp,
@@ -147,5 +161,6 @@ def cli(
         overwrite_name=overwrite_name,
         level=level_grad_cam,
         save_nifti=save_nifti,
+        save_diagnosis_maps=save_diagnosis_maps,
         # verbose=verbose,
     )
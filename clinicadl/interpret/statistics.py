@@ -0,0 +1,32 @@
+import torch
+
+
+class RunningMoments:
+    """
+    Computes incrementally the mean and variance of a stream of maps (Welford's algorithm).
+
+    The accumulators are stored in float64 so that the statistics of a large number of
+    maps do not suffer from the rounding errors of a float32 sum.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.mean = None
+        self.m2 = None
+
+    def update(self, map_pt: torch.Tensor):
+        """Adds one map to the statistics."""
+        map_pt = map_pt.to(torch.float64)
+        if self.mean is None:
+            self.mean = torch.zeros_like(map_pt)
+            self.m2 = torch.zeros_like(map_pt)
+
+        self.count += 1
+        delta = map_pt - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (map_pt - self.mean)
+
+    @property
+    def variance(self) -> torch.Tensor:
+        """Variance of the maps (normalized by the number of maps)."""
+        return self.m2 / self.count
@@ -26,6 +26,9 @@ def predict(
     save_nifti: bool = False,
     save_latent_tensor: bool = False,
     skip_leak_check: bool = False,
+    single_pass: bool = False,
+    pin_memory: bool = None,
+    prefetch_factor: int = None,
 ):
     """
     This function loads a MAPS and predicts the global metrics and individual values
@@ -49,6 +52,9 @@ def predict(
         overwrite: If True former definition of data group is erased
         save_tensor: For reconstruction task only, if True it will save the reconstruction as .pt file in the MAPS.
         save_nifti: For reconstruction task only, if True it will save the reconstruction as NIfTI file in the MAPS.
+        single_pass: If True, all the models are loaded at once and the data is read only once.
+        pin_memory: If True, batches are copied in page-locked memory. Default uses the training value.
+        prefetch_factor: number of batches loaded in advance by each worker. Default uses the training value.
     """
     verbose_list = ["warning", "info", "debug"]
 
@@ -81,4 +87,7 @@ def predict(
         save_nifti=save_nifti,
         save_latent_tensor=save_latent_tensor,
         skip_leak_check=skip_leak_check,
+        single_pass=single_pass,
+        pin_memory=pin_memory,
+        prefetch_factor=prefetch_factor,
     )
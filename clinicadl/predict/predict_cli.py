@@ -80,12 +80,22 @@ from clinicadl.utils.exceptions import ClinicaDLArgumentError
     is_flag=True,
     help="Skip the data leakage check.",
 )
+@click.option(
+    "--single_pass",
+    type=bool,
+    default=False,
+    is_flag=True,
+    help="""Load all the models evaluated (splits and selection metrics) at once and
+    feed each batch to all of them, so that the data is read only once.""",
+)
 @cli_param.option.split
 @cli_param.option.selection_metrics
 @cli_param.option.use_gpu
 @cli_param.option.amp
 @cli_param.option.n_proc
 @cli_param.option.batch_size
+@cli_param.option.pin_memory
+@cli_param.option.prefetch_factor
 @cli_param.option.overwrite
 def cli(
     input_maps_directory,
@@ -97,6 +107,8 @@ def cli(
     amp,
     n_proc,
     batch_size,
+    pin_memory,
+    prefetch_factor,
     use_labels,
     label,
     selection_metrics,
@@ -107,6 +119,7 @@ def cli(
     save_nifti,
     save_latent_tensor,
     skip_leak_check,
+    single_pass,
 ):
     """Infer the outputs of a trained model on a test set.
 
@@ -136,6 +149,8 @@ def cli(
         amp=amp,
         n_proc=n_proc,
         batch_size=batch_size,
+        pin_memory=pin_memory,
+        prefetch_factor=prefetch_factor,
         split_list=split,
         selection_metrics=selection_metrics,
         diagnoses=diagnoses,
@@ -145,4 +160,5 @@ def cli(
         save_nifti=save_nifti,
         save_latent_tensor=save_latent_tensor,
         skip_leak_check=skip_leak_check,
+        single_pass=single_pass,
     )
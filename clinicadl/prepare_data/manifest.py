@@ -0,0 +1,146 @@
+# coding: utf8
+
+import hashlib
+import json
+import os
+from logging import getLogger
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+import pandas as pd
+
+logger = getLogger("clinicadl.prepare_data")
+
+MANIFEST_COLUMNS = ["input_path", "size", "mtime_ns", "outputs"]
+# Keys of the preprocessing dict which do not change the extracted tensors
+MANIFEST_IGNORED_KEYS = {
+    "extract_json",
+    "storage_format",
+    "roi_template",
+    "roi_mask_pattern",
+    "masks_location",
+}
+
+ManifestEntry = Tuple[int, int, List[str]]
+
+
+def compute_manifest_key(parameters: Dict[str, Any]) -> str:
+    """
+    Computes the key identifying the manifest of an extraction.
+
+    All the extraction parameters except the name of the JSON file are taken into account,
+    so that a manifest is only reused to skip tensors extracted in the same way.
+
+    Args:
+        parameters: preprocessing dict of prepare_data.
+    Returns:
+        the hexadecimal key of the manifest.
+    """
+    content = {
+        key: value
+        for key, value in parameters.items()
+        if key not in MANIFEST_IGNORED_KEYS
+    }
+    return hashlib.sha256(
+        json.dumps(content, sort_keys=True, default=str).encode("utf-8")
+    ).hexdigest()[:16]
+
+
+def get_manifest_path(caps_directory: Path, key: str) -> Path:
+    """Returns the location of the manifest of key in caps_directory."""
+    return caps_directory / "tensor_extraction" / "manifest" / f"{key}.tsv"
+
+
+def file_signature(path: Path) -> Tuple[int, int]:
+    """Returns the size and the modification time (in ns) of a file."""
+    stat = path.stat()
+    return stat.st_size, stat.st_mtime_ns
+
+
+def read_manifest(caps_directory: Path, key: str) -> Dict[str, ManifestEntry]:
+    """
+    Reads the manifest of the tensors extracted in a CAPS.
+
+    Args:
+        caps_directory: path to the CAPS folder.
+        key: key of the manifest computed with compute_manifest_key.
+    Returns:
+        dictionary linking the path of each input image to its size, its modification time
+        and the paths of the tensors extracted from it (relative to the CAPS).
+        It is empty if no manifest was written before.
+    """
+    manifest_path = get_manifest_path(caps_directory, key)
+    if not manifest_path.is_file():
+        return dict()
+
+    manifest_df = pd.read_csv(
+        manifest_path, sep="\t", dtype={"input_path": str, "outputs": str}
+    )
+    if not set(MANIFEST_COLUMNS).issubset(manifest_df.columns.values):
+        logger.warning(
+            f"The manifest {manifest_path} is corrupted and will be ignored."
+        )
+        return dict()
+
+    logger.debug(f"Manifest read at {manifest_path}.")
+    return {
+        input_path: (int(size), int(mtime_ns), outputs.split(";"))
+        for input_path, size, mtime_ns, outputs in zip(
+            manifest_df.input_path,
+            manifest_df["size"],
+            manifest_df.mtime_ns,
+            manifest_df.outputs.fillna(""),
+        )
+    }
+
+
+def write_manifest(
+    caps_directory: Path, key: str, manifest: Dict[str, ManifestEntry]
+) -> None:
+    """
+    Writes the manifest of the tensors extracted in a CAPS.
+
+    The file is first written in a temporary file and then renamed, so that an interrupted
+    extraction never leaves a partially written manifest.
+
+    Args:
+        caps_directory: path to the CAPS folder.
+        key: key of the manifest computed with compute_manifest_key.
+        manifest: dictionary linking the path of each input image to its size, its modification
+            time and the paths of the tensors extracted from it.
+    """
+    manifest_path = get_manifest_path(caps_directory, key)
+    rows = [
+        [input_path, size, mtime_ns, ";".join(outputs)]
+        for input_path, (size, mtime_ns, outputs) in manifest.items()
+    ]
+    manifest_df = pd.DataFrame(rows, columns=MANIFEST_COLUMNS)
+    manifest_df.sort_values("input_path", inplace=True)
+
+    manifest_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = manifest_path.with_name(f".{manifest_path.name}.{os.getpid()}")
+    manifest_df.to_csv(tmp_path, sep="\t", index=False)
+    os.replace(tmp_path, manifest_path)
+    logger.debug(f"Manifest written at {manifest_path}.")
+
+
+def is_up_to_date(
+    caps_directory: Path, input_file: Path, entry: ManifestEntry = None
+) -> bool:
+    """
+    Checks if the tensors extracted from an image can be kept.
+
+    Args:
+        caps_directory: path to the CAPS folder.
+        input_file: path to the input image.
+        entry: entry of the manifest corresponding to input_file.
+    Returns:
+        True if the image did not change since the extraction (same size and
+        modification time) and all the extracted tensors still exist.
+    """
+    if entry is None:
+        return False
+    size, mtime_ns, outputs = entry
+    if file_signature(input_file) != (size, mtime_ns):
+        return False
+    return all((caps_directory / output).is_file() for output in outputs)
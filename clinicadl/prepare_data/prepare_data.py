@@ -1,6 +1,9 @@
+import os
 from logging import getLogger
 from pathlib import Path
 
+import pandas as pd
+
 
 def DeepLearningPrepareData(
     caps_directory: Path,
@@ -8,7 +11,31 @@ def DeepLearningPrepareData(
     n_proc: int,
     parameters: dict,
     from_bids: str = None,
+    skip_existing: bool = False,
 ):
+    """
+    Extracts the tensors of images, patches, slices or regions from the NIfTI images
+    of a CAPS (or BIDS) directory.
+
+    The images are processed by chunks of n_proc * 4 images and the progress is logged
+    after each chunk. An image that cannot be processed does not stop the extraction:
+    the errors are written in a TSV file next to the preprocessing JSON.
+
+    With the pt storage format, a manifest records the size and modification time of each
+    input image with the list of tensors extracted from it. If skip_existing is True, the
+    images which did not change since their extraction with the same parameters are skipped.
+
+    Args:
+        caps_directory: path to the CAPS folder in which the tensors are saved.
+        tsv_file: TSV file with the list of participants and sessions to process.
+        n_proc: number of processes used.
+        parameters: preprocessing dict.
+        from_bids: path to a BIDS folder from which the images are read instead of the CAPS.
+        skip_existing: If True, the images already extracted are skipped.
+    """
+    from contextlib import nullcontext
+    from time import time
+
     from joblib import Parallel, delayed
     from torch import save as save_tensor
 
@@ -18,9 +45,16 @@ def DeepLearningPrepareData(
         container_from_filename,
         get_subject_session_list,
     )
-    from clinicadl.utils.exceptions import ClinicaDLArgumentError
-    from clinicadl.utils.preprocessing import write_preprocessing
-
+    from clinicadl.utils.exceptions import ClinicaDLArgumentError, ClinicaDLException
+    from clinicadl.utils.preprocessing import read_preprocessing, write_preprocessing
+
+    from .manifest import (
+        compute_manifest_key,
+        file_signature,
+        is_up_to_date,
+        read_manifest,
+        write_manifest,
+    )
     from .prepare_data_utils import check_mask_list, compute_folder_and_file_type
 
     logger = getLogger("clinicadl.prepare_data")
@@ -64,6 +98,13 @@ def DeepLearningPrepareData(
         f"Selected images are preprocessed with {parameters['preprocessing']} pipeline`."
     )
 
+    if parameters.get("size_reduction_factor") is not None and (
+        parameters["mode"] != "image"
+    ):
+        raise ClinicaDLArgumentError(
+            "The size of the images can only be reduced in image mode."
+        )
+
     mod_subfolder, file_type = compute_folder_and_file_type(parameters, from_bids)
     parameters["file_type"] = file_type
     # Input file:
@@ -72,20 +113,65 @@ def DeepLearningPrepareData(
     ]
     logger.debug(f"Selected image file name list: {input_files}.")
 
+    packed = parameters.get("storage_format", "pt") == "packed"
+    if skip_existing and packed:
+        raise ClinicaDLArgumentError(
+            "Existing tensors can only be skipped with the pt storage format."
+        )
+
+    # Check the preprocessing JSON before the extraction instead of failing at the end
+    manifest_key = compute_manifest_key(parameters)
+    json_path = caps_directory / "tensor_extraction" / parameters["extract_json"]
+    write_json = True
+    if json_path.is_file():
+        if skip_existing and (
+            compute_manifest_key(read_preprocessing(json_path)) == manifest_key
+        ):
+            write_json = False
+        else:
+            raise FileExistsError(
+                f"JSON file at {json_path} already exists. "
+                f"Please choose another name for your preprocessing file."
+            )
+
+    manifest = {} if packed else read_manifest(caps_directory, manifest_key)
+
+    def manifest_key_of(file) -> str:
+        return Path(os.path.relpath(file, input_directory)).as_posix()
+
+    n_files = len(input_files)
+    if skip_existing:
+        input_files = [
+            file
+            for file in input_files
+            if not is_up_to_date(
+                caps_directory, Path(file), manifest.get(manifest_key_of(file))
+            )
+        ]
+        logger.info(
+            f"{n_files - len(input_files)} images were already extracted and are skipped."
+        )
+
     def write_output_imgs(output_mode, container, subfolder):
+        output_file_dir = (
+            Path(container) / "deeplearning_prepare_data" / subfolder / mod_subfolder
+        )
+        if packed:
+            # Tensors are sent back to the main process which packs them in the shards
+            return [
+                ((output_file_dir / filename).as_posix(), tensor)
+                for filename, tensor in output_mode
+            ]
+
         # Write the extracted tensor on a .pt file
+        output_paths = []
         for filename, tensor in output_mode:
-            output_file_dir = (
-                caps_directory
-                / container
-                / "deeplearning_prepare_data"
-                / subfolder
-                / mod_subfolder
-            )
-            output_file_dir.mkdir(parents=True, exist_ok=True)
-            output_file = output_file_dir / filename
+            (caps_directory / output_file_dir).mkdir(parents=True, exist_ok=True)
+            output_file = caps_directory / output_file_dir / filename
             save_tensor(tensor, output_file)
             logger.debug(f"Output tensor saved at {output_file}")
+            output_paths.append((output_file_dir / filename).as_posix())
+        return output_paths
 
     if parameters["mode"] == "image" or not parameters["prepare_dl"]:
 
@@ -95,11 +181,15 @@ def DeepLearningPrepareData(
             logger.debug(f"Processing of {file}.")
             container = container_from_filename(file)
             subfolder = "image_based"
-            output_mode = extract_images(Path(file))
+            output_mode = extract_images(
+                Path(file),
+                size_reduction_factor=parameters.get("size_reduction_factor"),
+                tensor_dtype=parameters.get("tensor_dtype", "float32"),
+            )
             logger.debug(f"Image extracted.")
-            write_output_imgs(output_mode, container, subfolder)
+            return write_output_imgs(output_mode, container, subfolder)
 
-        Parallel(n_jobs=n_proc)(delayed(prepare_image)(file) for file in input_files)
+        prepare_function = prepare_image
 
     elif parameters["prepare_dl"]:
         if parameters["mode"] == "slice":
@@ -117,11 +207,9 @@ def DeepLearningPrepareData(
                     discarded_slices=parameters["discarded_slices"],
                 )
                 logger.debug(f"    {len(output_mode)} slices extracted.")
-                write_output_imgs(output_mode, container, subfolder)
+                return write_output_imgs(output_mode, container, subfolder)
 
-            Parallel(n_jobs=n_proc)(
-                delayed(prepare_slice)(file) for file in input_files
-            )
+            prepare_function = prepare_slice
 
         elif parameters["mode"] == "patch":
 
@@ -137,11 +225,9 @@ def DeepLearningPrepareData(
                     stride_size=parameters["stride_size"],
                 )
                 logger.debug(f"    {len(output_mode)} patches extracted.")
-                write_output_imgs(output_mode, container, subfolder)
+                return write_output_imgs(output_mode, container, subfolder)
 
-            Parallel(n_jobs=n_proc)(
-                delayed(prepare_patch)(file) for file in input_files
-            )
+            prepare_function = prepare_patch
 
         elif parameters["mode"] == "roi":
 
@@ -203,15 +289,101 @@ def DeepLearningPrepareData(
                     uncrop_output=parameters["uncropped_roi"],
                 )
                 logger.debug(f"    ROI extracted.")
-                write_output_imgs(output_mode, container, subfolder)
+                return write_output_imgs(output_mode, container, subfolder)
 
-            Parallel(n_jobs=n_proc)(delayed(prepare_roi)(file) for file in input_files)
+            prepare_function = prepare_roi
 
     else:
         raise NotImplementedError(
             f"Extraction is not implemented for mode {parameters['mode']}."
         )
 
+    def safe_prepare(file):
+        """Runs prepare_function and returns its error message instead of raising it."""
+        try:
+            return prepare_function(file), None
+        except Exception as e:
+            return None, f"{type(e).__name__}: {e}"
+
+    if packed:
+        from clinicadl.utils.caps_dataset.packed_store import (
+            PackedTensorWriter,
+            get_packed_directory,
+        )
+
+        packed_directory = get_packed_directory(
+            caps_directory, parameters["extract_json"]
+        )
+        writer = PackedTensorWriter(packed_directory)
+    else:
+        writer = nullcontext()
+
+    # Images are processed by chunks to bound the number of tensors held in memory
+    # and to report the progress
+    chunk_size = 4 * max(n_proc, 1)
+    errors = []
+    beginning_time = last_manifest_time = time()
+    with writer:
+        for chunk_start in range(0, len(input_files), chunk_size):
+            chunk_files = input_files[chunk_start : chunk_start + chunk_size]
+            signatures = [file_signature(Path(file)) for file in chunk_files]
+            outputs = Parallel(n_jobs=n_proc)(
+                delayed(safe_prepare)(file) for file in chunk_files
+            )
+            for file, signature, (output, error) in zip(
+                chunk_files, signatures, outputs
+            ):
+                if error is not None:
+                    logger.warning(f"{file} could not be processed: {error}")
+                    errors.append([file, error])
+                elif packed:
+                    for tensor_path, tensor in output:
+                        writer.write(tensor_path, tensor)
+                else:
+                    manifest[manifest_key_of(file)] = (*signature, output)
+
+            # The manifest is regularly saved so that an interrupted job can be resumed
+            if not packed and time() - last_manifest_time > 60:
+                write_manifest(caps_directory, manifest_key, manifest)
+                last_manifest_time = time()
+
+            n_done = min(chunk_start + chunk_size, len(input_files))
+            elapsed_time = time() - beginning_time
+            throughput = n_done / elapsed_time if elapsed_time > 0 else 0.0
+            eta = (
+                f"{(len(input_files) - n_done) / throughput:.0f} s"
+                if throughput > 0
+                else "unknown"
+            )
+            logger.info(
+                f"{n_done}/{len(input_files)} images processed "
+                f"({throughput:.2f} images/s, ETA {eta})."
+            )
+
+    if packed:
+        logger.info(f"Tensors packed at {packed_directory}.")
+    else:
+        write_manifest(caps_directory, manifest_key, manifest)
+
+    errors_path = json_path.with_name(f"{json_path.stem}_errors.tsv")
+    if len(errors) > 0:
+        errors_path.parent.mkdir(parents=True, exist_ok=True)
+        pd.DataFrame(errors, columns=["input_path", "error"]).to_csv(
+            errors_path, sep="\t", index=False
+        )
+        logger.warning(
+            f"{len(errors)} images could not be processed, "
+            f"the list of errors is written at {errors_path}."
+        )
+        if len(errors) == n_files:
+            raise ClinicaDLException(
+                f"None of the images could be processed. First error: {errors[0][1]}"
+            )
+    else:
+        # The errors of a previous run were fixed
+        errors_path.unlink(missing_ok=True)
+
     # Save parameters dictionary
-    preprocessing_json_path = write_preprocessing(parameters, caps_directory)
-    logger.info(f"Preprocessing JSON saved at {preprocessing_json_path}.")
+    if write_json:
+        preprocessing_json_path = write_preprocessing(parameters, caps_directory)
+        logger.info(f"Preprocessing JSON saved at {preprocessing_json_path}.")
@@ -15,6 +15,10 @@ from .prepare_data_utils import get_parameters_dict
 @cli_param.option.n_proc
 @cli_param.option.subjects_sessions_tsv
 @cli_param.option.extract_json
+@cli_param.option.storage_format
+@cli_param.option.skip_existing
+@cli_param.option.size_reduction_factor
+@cli_param.option.tensor_dtype
 @cli_param.option.use_uncropped_image
 @cli_param.option.tracer
 @cli_param.option.suvr_reference_region
@@ -27,6 +31,10 @@ def image_cli(
     n_proc: int,
     subjects_sessions_tsv: Optional[Path] = None,
     extract_json: str = None,
+    storage_format: str = "pt",
+    skip_existing: bool = False,
+    size_reduction_factor: Optional[int] = None,
+    tensor_dtype: str = "float32",
     use_uncropped_image: bool = False,
     tracer: Optional[str] = None,
     suvr_reference_region: Optional[str] = None,
@@ -51,12 +59,16 @@ def image_cli(
         suvr_reference_region,
         dti_measure,
         dti_space,
+        storage_format=storage_format,
+        size_reduction_factor=size_reduction_factor,
+        tensor_dtype=tensor_dtype,
     )
     DeepLearningPrepareData(
         caps_directory=caps_directory,
         tsv_file=subjects_sessions_tsv,
         n_proc=n_proc,
         parameters=parameters,
+        skip_existing=skip_existing,
     )
 
 
@@ -67,6 +79,8 @@ def image_cli(
 @cli_param.option.save_features
 @cli_param.option.subjects_sessions_tsv
 @cli_param.option.extract_json
+@cli_param.option.storage_format
+@cli_param.option.skip_existing
 @cli_param.option.use_uncropped_image
 @click.option(
     "-ps",
@@ -94,6 +108,8 @@ def patch_cli(
     save_features: bool = False,
     subjects_sessions_tsv: Optional[Path] = None,
     extract_json: str = None,
+    storage_format: str = "pt",
+    skip_existing: bool = False,
     use_uncropped_image: bool = False,
     patch_size: int = 50,
     stride_size: int = 50,
@@ -120,6 +136,7 @@ def patch_cli(
         suvr_reference_region,
         dti_measure,
         dti_space,
+        storage_format=storage_format,
     )
     parameters["patch_size"] = patch_size
     parameters["stride_size"] = stride_size
@@ -129,6 +146,7 @@ def patch_cli(
         tsv_file=subjects_sessions_tsv,
         n_proc=n_proc,
         parameters=parameters,
+        skip_existing=skip_existing,
     )
 
 
@@ -139,6 +157,8 @@ def patch_cli(
 @cli_param.option.save_features
 @cli_param.option.subjects_sessions_tsv
 @cli_param.option.extract_json
+@cli_param.option.storage_format
+@cli_param.option.skip_existing
 @cli_param.option.use_uncropped_image
 @click.option(
     "-sd",
@@ -181,6 +201,8 @@ def slice_cli(
     save_features: bool = False,
     subjects_sessions_tsv: Optional[Path] = None,
     extract_json: str = None,
+    storage_format: str = "pt",
+    skip_existing: bool = False,
     use_uncropped_image: bool = False,
     slice_direction: int = 0,
     slice_mode: str = "rgb",
@@ -208,6 +230,7 @@ def slice_cli(
         suvr_reference_region,
         dti_measure,
         dti_space,
+        storage_format=storage_format,
     )
     parameters["slice_direction"] = slice_direction
     parameters["slice_mode"] = slice_mode
@@ -218,6 +241,7 @@ def slice_cli(
         tsv_file=subjects_sessions_tsv,
         n_proc=n_proc,
         parameters=parameters,
+        skip_existing=skip_existing,
     )
 
 
@@ -228,6 +252,8 @@ def slice_cli(
 @cli_param.option.save_features
 @cli_param.option.subjects_sessions_tsv
 @cli_param.option.extract_json
+@cli_param.option.storage_format
+@cli_param.option.skip_existing
 @cli_param.option.use_uncropped_image
 @click.option(
     "--roi_list",
@@ -273,6 +299,8 @@ def roi_cli(
     save_features: bool = False,
     subjects_sessions_tsv: Optional[Path] = None,
     extract_json: str = None,
+    storage_format: str = "pt",
+    skip_existing: bool = False,
     use_uncropped_image: bool = False,
     roi_list: list = [],
     roi_uncrop_output: bool = False,
@@ -301,6 +329,7 @@ def roi_cli(
         suvr_reference_region,
         dti_measure,
         dti_space,
+        storage_format=storage_format,
     )
     parameters["roi_list"] = roi_list
     parameters["uncropped_roi"] = roi_uncrop_output
@@ -312,6 +341,7 @@ def roi_cli(
         tsv_file=subjects_sessions_tsv,
         n_proc=n_proc,
         parameters=parameters,
+        skip_existing=skip_existing,
     )
 
 
@@ -1,7 +1,7 @@
 # coding: utf8
 from pathlib import Path
 from time import time
-from typing import Any, Dict, List, Tuple, Union
+from typing import Any, Dict, List, Optional, Tuple, Union
 
 import numpy as np
 import torch
@@ -18,6 +18,9 @@ def get_parameters_dict(
     suvr_reference_region: str,
     dti_measure: str,
     dti_space: str,
+    storage_format: str = "pt",
+    size_reduction_factor: Optional[int] = None,
+    tensor_dtype: str = "float32",
 ) -> Dict[str, Any]:
     """
     Parameters
@@ -40,6 +43,12 @@ def get_parameters_dict(
         Name of the tracer (specific to PET pipelines).
     suvr_reference_region: str
         Name of the reference region for normalization specific to PET pipelines)
+    storage_format: str
+        Format used to save the tensors (pt or packed).
+    size_reduction_factor: int
+        Factor of the size reduction applied to the images before saving them (image mode only).
+    tensor_dtype: str
+        Type of the saved tensors (float32 or float16).
     Returns:
         The dictionary of parameters specific to the preprocessing
     """
@@ -48,6 +57,7 @@ def get_parameters_dict(
         "mode": extract_method,
         "use_uncropped_image": use_uncropped_image,
         "prepare_dl": save_features,
+        "storage_format": storage_format,
     }
 
     if modality == "custom":
@@ -59,6 +69,11 @@ def get_parameters_dict(
         parameters["dti_space"] = dti_space
         parameters["dti_measure"] = dti_measure
 
+    if size_reduction_factor is not None:
+        parameters["size_reduction_factor"] = size_reduction_factor
+    if tensor_dtype != "float32":
+        parameters["tensor_dtype"] = tensor_dtype
+
     parameters["extract_json"] = compute_extract_json(extract_json)
 
     return parameters
@@ -127,6 +142,13 @@ def compute_folder_and_file_type(
             raise NotImplementedError(
                 f"Extraction of preprocessing {parameters['preprocessing']} is not implemented from CAPS directory."
             )
+
+    # Reduced tensors are saved apart from the full-size ones
+    if parameters.get("size_reduction_factor") is not None:
+        mod_subfolder += f"_reduction-{parameters['size_reduction_factor']}"
+    if parameters.get("tensor_dtype", "float32") != "float32":
+        mod_subfolder += f"_{parameters['tensor_dtype']}"
+
     return mod_subfolder, file_type
 
 
@@ -325,12 +347,20 @@ def extract_patch_path(
 ############
 # IMAGE    #
 ############
-def extract_images(input_img: Path) -> List[Tuple[str, torch.Tensor]]:
+def extract_images(
+    input_img: Path,
+    size_reduction_factor: Optional[int] = None,
+    tensor_dtype: str = "float32",
+) -> List[Tuple[str, torch.Tensor]]:
     """Extract the images
     This function convert nifti image to tensor (.pt) version of the image.
     Tensor version is saved at the same location than input_img.
     Args:
         input_img: path to the NifTi input image.
+        size_reduction_factor: if given, the transformations applied during training
+            with size reduction (NaN removal, min-max normalization on the whole image,
+            then SizeReduction) are applied to the image before saving it.
+        tensor_dtype: type of the output tensor (float32 or float16).
     Returns:
         filename (str): single tensor file  saved on the disk. Same location than input file.
     """
@@ -339,10 +369,24 @@ def extract_images(input_img: Path) -> List[Tuple[str, torch.Tensor]]:
 
     image_array = nib.load(input_img).get_fdata(dtype="float32")
     image_tensor = torch.from_numpy(image_array).unsqueeze(0).float()
-    # make sure the tensor type is torch.float32
+    if size_reduction_factor is not None:
+        from clinicadl.utils.caps_dataset.data import get_transforms
+
+        # Same order as during training: the extrema are computed on the whole image
+        _, all_transformations = get_transforms(
+            normalize=True,
+            size_reduction=True,
+            size_reduction_factor=size_reduction_factor,
+        )
+        image_tensor = all_transformations(image_tensor)
+    # make sure the tensor type is torch.float32 (or the type asked)
     output_file = (
         Path(input_img.name.replace(".nii.gz", ".pt")),
-        image_tensor.clone(),
+        image_tensor.to(
+            dtype=getattr(torch, tensor_dtype),
+            memory_format=torch.contiguous_format,
+            copy=True,
+        ),
     )
 
     return [output_file]
@@ -15,10 +15,12 @@ from clinicadl.utils import cli_param
     "group_label",
     type=str,
 )
+@cli_param.option.n_proc
 def cli(
     caps_directory,
     output_directory,
     group_label,
+    n_proc,
 ):
     """Performs quality check on t1-volume pipeline.
 
@@ -34,4 +36,5 @@ def cli(
         caps_directory,
         output_directory,
         group_label,
+        n_proc=n_proc,
     )
@@ -13,10 +13,13 @@ import pandas as pd
 from clinicadl.quality_check.t1_volume.utils import extract_metrics
 
 
-def quality_check(caps_dir: Path, output_directory: Path, group_label):
+def quality_check(caps_dir: Path, output_directory: Path, group_label, n_proc: int = 1):
     logger = getLogger("clinicadl.quality_check")
     extract_metrics(
-        caps_dir=caps_dir, output_dir=output_directory, group_label=group_label
+        caps_dir=caps_dir,
+        output_dir=output_directory,
+        group_label=group_label,
+        n_proc=n_proc,
     )
     logger.info(
         f"Quality check metrics extracted at {output_directory / 'QC_metrics.tsv'}."
@@ -7,11 +7,12 @@ from pathlib import Path
 import nibabel as nib
 import numpy as np
 import pandas as pd
+from joblib import Parallel, delayed
 
 from clinicadl.utils.clinica_utils import RemoteFileStructure, fetch_file
 
 
-def extract_metrics(caps_dir: Path, output_dir: Path, group_label):
+def extract_metrics(caps_dir: Path, output_dir: Path, group_label, n_proc: int = 1):
     if not output_dir.is_dir():
         output_dir.mkdir(parents=True)
 
@@ -51,6 +52,10 @@ def extract_metrics(caps_dir: Path, output_dir: Path, group_label):
     template_np = template_nii.get_fdata()
     template_np = np.sum(template_np, axis=3)
     template_segmentation_np = template_np * segmentation_np
+    hist_template, _, _ = np.histogram2d(
+        template_segmentation_np.ravel(), template_segmentation_np.ravel()
+    )
+    template_mutual_information = _mutual_information(hist_template)
 
     # Get the data
     filename = output_dir / "QC_metrics.tsv"
@@ -61,12 +66,12 @@ def extract_metrics(caps_dir: Path, output_dir: Path, group_label):
         "non_zero_percentage",
         "frontal_similarity",
     ]
-    results_df = pd.DataFrame(columns=columns)
 
     subjects = list((caps_dir / "subjects").iterdir())
     subjects = [
         subject.stem for subject in subjects if str(subject.stem)[:4:] == "sub-"
     ]
+    image_list = []
     for subject in subjects:
         subject_path = caps_dir / "subjects" / subject
         sessions = list(subject_path.iterdir())
@@ -89,44 +94,74 @@ def extract_metrics(caps_dir: Path, output_dir: Path, group_label):
                 )
             )
             if image_path.is_file():
-                # GM analysis
-                image_nii = nib.load(image_path)
-                image_np = image_nii.get_fdata()
-                image_segmentation_np = image_np * segmentation_np
-                eyes_nmi_value = nmi(
-                    occlusion1=template_segmentation_np,
-                    occlusion2=image_segmentation_np,
-                )
-
-                non_zero_percentage = np.count_nonzero(image_np) / image_np.size
-
-                row = [
-                    [
-                        subject,
-                        session,
-                        np.max(image_np),
-                        non_zero_percentage,
-                        eyes_nmi_value,
-                    ]
-                ]
-                row_df = pd.DataFrame(row, columns=columns)
-                results_df = pd.concat([results_df, row_df])
+                image_list.append((subject, session, image_path))
+
+    # Large arrays (segmentation and template) are memory-mapped by joblib and shared
+    # between the workers instead of being pickled for each session
+    rows = Parallel(n_jobs=n_proc)(
+        delayed(_compute_session_metrics)(
+            subject,
+            session,
+            image_path,
+            segmentation_np,
+            template_segmentation_np,
+            template_mutual_information,
+        )
+        for subject, session, image_path in image_list
+    )
+    results_df = pd.DataFrame(rows, columns=columns)
 
     results_df.sort_values("max_intensity", inplace=True, ascending=True)
     results_df.to_csv(filename, sep="\t", index=False)
 
 
-def nmi(occlusion1, occlusion2):
-    """Mutual information for joint histogram"""
+def _compute_session_metrics(
+    subject: str,
+    session: str,
+    image_path: Path,
+    segmentation_np: np.ndarray,
+    template_segmentation_np: np.ndarray,
+    template_mutual_information: float,
+):
+    """Computes the QC metrics of the gray matter map of one session."""
+    image_nii = nib.load(image_path)
+    image_np = image_nii.get_fdata()
+    image_segmentation_np = image_np * segmentation_np
+    eyes_nmi_value = nmi(
+        occlusion1=template_segmentation_np,
+        occlusion2=image_segmentation_np,
+        mutual_information1=template_mutual_information,
+    )
+
+    non_zero_percentage = np.count_nonzero(image_np) / image_np.size
+
+    return [
+        subject,
+        session,
+        np.max(image_np),
+        non_zero_percentage,
+        eyes_nmi_value,
+    ]
+
+
+def nmi(occlusion1, occlusion2, mutual_information1=None):
+    """
+    Mutual information for joint histogram
+
+    The self mutual information of occlusion1 can be given if it is already known
+    (e.g. for a template compared to many images).
+    """
     # Convert bins counts to probability values
     hist_inter, _, _ = np.histogram2d(occlusion1.ravel(), occlusion2.ravel())
-    hist1, _, _ = np.histogram2d(occlusion1.ravel(), occlusion1.ravel())
+    if mutual_information1 is None:
+        hist1, _, _ = np.histogram2d(occlusion1.ravel(), occlusion1.ravel())
+        mutual_information1 = _mutual_information(hist1)
     hist2, _, _ = np.histogram2d(occlusion2.ravel(), occlusion2.ravel())
 
     return (
         2
         * _mutual_information(hist_inter)
-        / (_mutual_information(hist1) + _mutual_information(hist2))
+        / (mutual_information1 + _mutual_information(hist2))
     )
 
 
@@ -0,0 +1,237 @@
+"""
+Ledger of the trials of a random search and pruning of the poor configurations.
+"""
+
+import json
+import math
+import os
+from logging import getLogger
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import pandas as pd
+
+from clinicadl.utils.callbacks.callbacks import Callback
+from clinicadl.utils.exceptions import ClinicaDLArgumentError
+
+logger = getLogger("clinicadl.random_search")
+
+LOSSES_COLUMNS = ["split", "epoch", "loss"]
+
+
+def _atomic_write(path: Path, write_fn) -> None:
+    """Writes a file in a temporary file first, so that readers never see a partial file."""
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}")
+    write_fn(tmp_path)
+    os.replace(tmp_path, path)
+
+
+class TrialLedger:
+    """
+    Records the state of the trials of a random search in the folder ledger of the search.
+
+    Each trial only writes its own files, so that concurrent trials never write
+    in the same file:
+
+    - trial-<id>.json contains the status of the trial (running, complete, pruned or failed),
+    - trial-<id>_losses.tsv contains the validation loss of the trial at each epoch.
+
+    Args:
+        search_directory: folder containing the MAPS of the trials.
+    """
+
+    def __init__(self, search_directory: Path):
+        self.search_directory = search_directory
+        self.ledger_directory = search_directory / "ledger"
+        self.ledger_directory.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def trial_name(trial_id: int) -> str:
+        return f"trial-{trial_id:03d}"
+
+    def maps_path(self, trial_id: int) -> Path:
+        """Path to the MAPS of a trial."""
+        return self.search_directory / self.trial_name(trial_id)
+
+    def _record_path(self, trial_id: int) -> Path:
+        return self.ledger_directory / f"{self.trial_name(trial_id)}.json"
+
+    def _losses_path(self, trial_id: int) -> Path:
+        return self.ledger_directory / f"{self.trial_name(trial_id)}_losses.tsv"
+
+    def read_record(self, trial_id: int) -> Optional[Dict[str, Any]]:
+        """Returns the record of a trial, or None if the trial was never started."""
+        record_path = self._record_path(trial_id)
+        if not record_path.is_file():
+            return None
+        with record_path.open("r") as f:
+            return json.load(f)
+
+    def write_record(self, trial_id: int, **record) -> None:
+        """Writes the record of a trial."""
+        record = {"trial_id": trial_id, **record}
+
+        def write_fn(path):
+            with path.open("w") as f:
+                json.dump(record, f, indent=4)
+
+        _atomic_write(self._record_path(trial_id), write_fn)
+
+    def read_losses(self, trial_id: int) -> pd.DataFrame:
+        """Returns the validation losses reported by a trial."""
+        losses_path = self._losses_path(trial_id)
+        if not losses_path.is_file():
+            return pd.DataFrame(columns=LOSSES_COLUMNS)
+        return pd.read_csv(losses_path, sep="\t")
+
+    def report(self, trial_id: int, split: int, epoch: int, loss: float) -> None:
+        """
+        Adds the validation loss of a trial after epoch epochs of training on split.
+
+        Args:
+            trial_id: index of the trial.
+            split: index of the split trained.
+            epoch: number of epochs done.
+            loss: validation loss.
+        """
+        row_df = pd.DataFrame([[split, epoch, loss]], columns=LOSSES_COLUMNS)
+        losses_df = self.read_losses(trial_id)
+        losses_df = row_df if losses_df.empty else pd.concat([losses_df, row_df])
+        _atomic_write(
+            self._losses_path(trial_id),
+            lambda path: losses_df.to_csv(path, sep="\t", index=False),
+        )
+
+    def reset(self, trial_id: int) -> None:
+        """Removes the losses of a trial trained again."""
+        self._losses_path(trial_id).unlink(missing_ok=True)
+
+    def rung_losses(self, split: int, epoch: int) -> List[float]:
+        """Returns the validation losses of all the trials on split after epoch epochs."""
+        losses = []
+        for losses_path in self.ledger_directory.glob("trial-*_losses.tsv"):
+            losses_df = pd.read_csv(losses_path, sep="\t")
+            losses_df = losses_df[
+                (losses_df.split == split) & (losses_df.epoch == epoch)
+            ]
+            losses += losses_df.loss.tolist()
+        return losses
+
+    def summary(self) -> pd.DataFrame:
+        """
+        Summarizes the trials in trials.tsv, the best trials first.
+
+        Returns:
+            DataFrame with the status of each trial, the number of epochs done
+            and its best validation loss.
+        """
+        rows = []
+        for record_path in sorted(self.ledger_directory.glob("trial-*.json")):
+            with record_path.open("r") as f:
+                record = json.load(f)
+            losses_df = self.read_losses(record["trial_id"])
+            rows.append(
+                {
+                    "trial": self.trial_name(record["trial_id"]),
+                    "status": record["status"],
+                    "epochs": losses_df.epoch.max() if len(losses_df) else 0,
+                    "best_validation_loss": (
+                        losses_df.loss.min() if len(losses_df) else math.nan
+                    ),
+                }
+            )
+        summary_df = pd.DataFrame(
+            rows, columns=["trial", "status", "epochs", "best_validation_loss"]
+        )
+        summary_df.sort_values("best_validation_loss", inplace=True)
+        summary_df.to_csv(self.search_directory / "trials.tsv", sep="\t", index=False)
+        return summary_df
+
+
+class SuccessiveHalvingPruner:
+    """
+    Asynchronous successive halving (ASHA).
+
+    The trials are compared at rungs of min_epochs * reduction_factor ** k epochs.
+    At each rung, a trial is continued only if its validation loss is among the best
+    1 / reduction_factor losses reported at this rung by all the trials so far.
+    The trials are never waiting for each other: the first trials reaching a rung
+    are compared to fewer trials than the last ones.
+
+    Args:
+        max_epochs: maximum number of epochs of a trial.
+        min_epochs: number of epochs of the first rung.
+        reduction_factor: inverse of the proportion of trials continued at each rung.
+    """
+
+    def __init__(self, max_epochs: int, min_epochs: int = 1, reduction_factor: int = 3):
+        if min_epochs < 1 or reduction_factor < 2:
+            raise ClinicaDLArgumentError(
+                "The minimum number of epochs must be positive and the reduction "
+                "factor must be at least 2."
+            )
+        self.reduction_factor = reduction_factor
+        self.rungs = []
+        rung = min_epochs
+        while rung < max_epochs:
+            self.rungs.append(rung)
+            rung *= reduction_factor
+
+    def should_prune(self, rung_losses: List[float], loss: float) -> bool:
+        """
+        Args:
+            rung_losses: losses reported at the rung by all the trials, including loss.
+            loss: loss of the trial evaluated.
+        Returns:
+            True if the trial must be stopped.
+        """
+        if math.isnan(loss):
+            return True
+        rung_losses = sorted(
+            math.inf if math.isnan(value) else value for value in rung_losses
+        )
+        n_continued = max(1, len(rung_losses) // self.reduction_factor)
+        return loss > rung_losses[n_continued - 1]
+
+
+class PruningCallback(Callback):
+    """
+    Reports the validation loss of a trial to the ledger at the end of each epoch,
+    and stops the training if the pruner prunes the trial at a rung.
+
+    Only the standard training of a single network is pruned.
+    """
+
+    def __init__(
+        self, ledger: TrialLedger, pruner: SuccessiveHalvingPruner, trial_id: int
+    ):
+        super().__init__()
+        self.ledger = ledger
+        self.pruner = pruner
+        self.trial_id = trial_id
+        self.pruned = False
+
+    def on_train_begin(self, parameters, **kwargs):
+        self.split = kwargs.get("split")
+        self.network = kwargs.get("network")
+        self.stop_training = False
+
+    def on_epoch_end(self, parameters, **kwargs):
+        epoch = kwargs.get("epoch")
+        network = kwargs.get("network", self.network)
+        if epoch is None or network is not None:
+            return
+        loss = float(kwargs["metrics_valid"]["loss"])
+        n_epochs = epoch + 1
+        self.ledger.report(self.trial_id, self.split, n_epochs, loss)
+
+        if n_epochs in self.pruner.rungs:
+            rung_losses = self.ledger.rung_losses(self.split, n_epochs)
+            if self.pruner.should_prune(rung_losses, loss):
+                logger.info(
+                    f"Trial {self.trial_id} pruned after {n_epochs} epochs on split "
+                    f"{self.split}: its validation loss {loss:.4f} is not among the "
+                    f"best of the {len(rung_losses)} trials of the rung."
+                )
+                self.pruned = True
+                self.stop_training = True
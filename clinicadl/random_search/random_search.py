@@ -2,17 +2,40 @@
 Launch a random network training.
 """
 
+import os
+import random
+import shutil
+from copy import deepcopy
+from logging import DEBUG, getLogger
 from pathlib import Path
+from typing import Any, Dict
 
+import pandas as pd
+
+from clinicadl.random_search.pruning import (
+    PruningCallback,
+    SuccessiveHalvingPruner,
+    TrialLedger,
+)
 from clinicadl.random_search.random_search_utils import get_space_dict, random_sampling
 from clinicadl.train import train
+from clinicadl.utils.exceptions import ClinicaDLArgumentError
 
+logger = getLogger("clinicadl.random_search")
 
-def launch_search(launch_directory: Path, job_name):
+# Trials which are not trained again when the search is resumed
+FINISHED_STATUS = ["complete", "pruned"]
+
+
+def _check_launch_directory(launch_directory: Path):
     if not (launch_directory / "random_search.toml").is_file():
         raise FileNotFoundError(
             f"TOML file 'random_search.toml' must be written in directory: {launch_directory}."
         )
+
+
+def launch_search(launch_directory: Path, job_name):
+    _check_launch_directory(launch_directory)
     space_options = get_space_dict(launch_directory)
     options = random_sampling(space_options)
 
@@ -21,3 +44,245 @@ def launch_search(launch_directory: Path, job_name):
     options["architecture"] = "RandomArchitecture"
 
     train(maps_directory, options, split)
+
+
+def sample_trial_options(
+    space_options: Dict[str, Any], trial_id: int
+) -> Dict[str, Any]:
+    """
+    Samples the options of a trial. The sampling only depends on the seed of the search
+    and on the index of the trial, so that a resumed trial is trained with the same options.
+    """
+    state = random.getstate()
+    random.seed(f"{space_options['seed']}-{trial_id}")
+    try:
+        options = random_sampling(space_options)
+    finally:
+        random.setstate(state)
+    options["architecture"] = "RandomArchitecture"
+    return options
+
+
+def _share_path_index(space_options: Dict[str, Any]):
+    """
+    Resolves the paths of the images of all the splits once before the trials, so that
+    the trials read the path index persisted in the CAPS instead of all exploring it.
+    """
+    from clinicadl.utils import split_manager
+    from clinicadl.utils.caps_dataset.data import get_transforms, return_dataset
+    from clinicadl.utils.maps_manager.maps_manager_utils import add_default_values
+
+    parameters = add_default_values(deepcopy(space_options))
+    split_class = getattr(split_manager, parameters["validation"])
+    args = list(
+        split_class.__init__.__code__.co_varnames[
+            : split_class.__init__.__code__.co_argcount
+        ]
+    )
+    args.remove("self")
+    args.remove("split_list")
+    kwargs = {"split_list": parameters["split"]}
+    for arg in args:
+        kwargs[arg] = parameters[arg]
+    split_manager = split_class(**kwargs)
+
+    data_df = pd.concat(
+        [
+            split_df
+            for split in split_manager.split_iterator()
+            for split_df in split_manager[split].values()
+        ]
+    )
+    data_df = data_df.drop_duplicates(["participant_id", "session_id", "cohort"])
+    # Checks that the size reduction of the trials matches the one of the tensors
+    _, all_transforms = get_transforms(
+        size_reduction=parameters["size_reduction"],
+        size_reduction_factor=parameters["size_reduction_factor"],
+    )
+    return_dataset(
+        parameters["caps_directory"],
+        data_df.reset_index(drop=True),
+        parameters["preprocessing_dict"],
+        all_transformations=all_transforms,
+        label_presence=False,
+        multi_cohort=parameters["multi_cohort"],
+        n_proc=max(1, parameters["n_proc"]),
+    )
+
+
+def _check_loader_workers(n_proc: int):
+    """
+    Iterates a DataLoader with n_proc workers. An error raised when the workers start
+    concerns all the trials, so it stops the search instead of failing each trial.
+    """
+    import torch
+    from torch.utils.data import DataLoader
+
+    if n_proc > 0:
+        for _ in DataLoader(torch.zeros(n_proc), num_workers=n_proc):
+            pass
+
+
+def run_trial(
+    search_directory: Path,
+    trial_id: int,
+    space_options: Dict[str, Any],
+    min_epochs: int = 1,
+    reduction_factor: int = 3,
+) -> str:
+    """
+    Trains the network of a trial split by split, reporting its validation loss to the
+    ledger of the search. The training stops as soon as the trial is pruned.
+
+    Args:
+        search_directory: folder containing the MAPS of the trials.
+        trial_id: index of the trial.
+        space_options: options of the search returned by get_space_dict.
+        min_epochs: number of epochs of the first rung of the pruner.
+        reduction_factor: inverse of the proportion of trials continued at each rung.
+    Returns:
+        the status of the trial (complete, pruned or failed).
+    """
+    from clinicadl.utils.maps_manager import MapsManager
+
+    ledger = TrialLedger(search_directory)
+    record = ledger.read_record(trial_id)
+    if record is not None and record["status"] in FINISHED_STATUS:
+        logger.info(f"Trial {trial_id} is already {record['status']}.")
+        return record["status"]
+
+    options = sample_trial_options(space_options, trial_id)
+    _check_loader_workers(options["n_proc"])
+
+    # A trial interrupted or failed is trained again from scratch
+    maps_path = ledger.maps_path(trial_id)
+    if maps_path.is_dir():
+        shutil.rmtree(maps_path)
+    ledger.reset(trial_id)
+    ledger.write_record(trial_id, status="running")
+
+    split_list = options.pop("split")
+    pruner = SuccessiveHalvingPruner(options["epochs"], min_epochs, reduction_factor)
+    callback = PruningCallback(ledger, pruner, trial_id)
+    logger.info(f"Trial {trial_id} trained in {maps_path}.")
+    try:
+        maps_manager = MapsManager(
+            maps_path, options, verbose=None, callbacks=[callback]
+        )
+        for split in maps_manager._init_split_manager(split_list).split_iterator():
+            maps_manager.train(split_list=[split])
+            if callback.pruned:
+                break
+    except Exception:
+        logger.exception(f"Trial {trial_id} failed.")
+        status = "failed"
+    else:
+        status = "pruned" if callback.pruned else "complete"
+
+    ledger.write_record(trial_id, status=status)
+    return status
+
+
+def _run_trial_process(
+    launch_directory: Path,
+    job_name: str,
+    trial_id: int,
+    min_epochs: int,
+    reduction_factor: int,
+    verbose: bool = False,
+) -> str:
+    """
+    Runs a trial in a process launched by launch_trials (see run_trial). The options of
+    the search are read again from random_search.toml, as the TOML tables cannot be pickled.
+    """
+    from clinicadl.utils.logger import setup_logging
+    from clinicadl.utils.maps_manager.ddp import cluster
+
+    setup_logging(verbose)
+    # Each process initiates its own process group of size 1, which cannot listen
+    # on the port of the other processes (fixed on SLURM).
+    # The cluster API sets the port when it is first called, hence after this call.
+    cluster.world_size
+    os.environ["MASTER_PORT"] = str(cluster.api.DefaultAPI.find_available_port())
+    return run_trial(
+        launch_directory / job_name,
+        trial_id,
+        get_space_dict(launch_directory),
+        min_epochs,
+        reduction_factor,
+    )
+
+
+def launch_trials(
+    launch_directory: Path,
+    job_name: str,
+    n_trials: int,
+    n_concurrent: int = 1,
+    min_epochs: int = 1,
+    reduction_factor: int = 3,
+):
+    """
+    Trains n_trials networks sampled from random_search.toml, n_concurrent at a time.
+
+    The trials are pruned with asynchronous successive halving on their validation loss,
+    and their state is kept in the ledger of the search, so that launching the same
+    command again resumes the search: complete and pruned trials are skipped, and the
+    other ones are trained again.
+
+    Args:
+        launch_directory: folder containing random_search.toml.
+        job_name: name of the folder of the search in launch_directory.
+        n_trials: number of networks sampled.
+        n_concurrent: number of trials trained at the same time.
+        min_epochs: number of epochs of the first rung of the pruner.
+        reduction_factor: inverse of the proportion of trials continued at each rung.
+    """
+    from clinicadl.utils.maps_manager.ddp import cluster
+    from clinicadl.utils.maps_manager.maps_manager_utils import run_in_processes
+
+    if n_concurrent > 1 and cluster.world_size > 1:
+        raise ClinicaDLArgumentError(
+            "Trials can only be trained concurrently without data parallelism. "
+            "Please set n_concurrent to 1."
+        )
+    _check_launch_directory(launch_directory)
+    space_options = get_space_dict(launch_directory)
+    # Checks the pruning options before launching the trials
+    SuccessiveHalvingPruner(space_options["epochs"], min_epochs, reduction_factor)
+
+    search_directory = launch_directory / job_name
+    ledger = TrialLedger(search_directory)
+    _share_path_index(space_options)
+
+    if n_concurrent > 1:
+        # Spawned processes, as the workers of joblib cannot start DataLoader workers
+        verbose = getLogger("clinicadl").getEffectiveLevel() <= DEBUG
+        run_in_processes(
+            _run_trial_process,
+            [
+                (
+                    launch_directory,
+                    job_name,
+                    trial_id,
+                    min_epochs,
+                    reduction_factor,
+                    verbose,
+                )
+                for trial_id in range(n_trials)
+            ],
+            n_concurrent,
+        )
+    else:
+        for trial_id in range(n_trials):
+            run_trial(
+                search_directory, trial_id, space_options, min_epochs, reduction_factor
+            )
+
+    summary_df = ledger.summary()
+    status_counts = summary_df.status.value_counts()
+    logger.info(
+        "Random search done: "
+        + ", ".join(f"{count} {status}" for status, count in status_counts.items())
+        + f". The trials are summarized in {search_directory / 'trials.tsv'}."
+    )
+    return summary_df
@@ -9,9 +9,43 @@ import click
     type=click.Path(exists=True, path_type=Path),
 )
 @click.argument("name", type=str)
+@click.option(
+    "--n_trials",
+    type=click.IntRange(min=1),
+    default=None,
+    help="Number of networks sampled and trained. The trials are pruned on their "
+    "validation loss and can be resumed by launching the same command again. "
+    "Default trains a single network in NAME.",
+)
+@click.option(
+    "--n_concurrent",
+    type=click.IntRange(min=1),
+    default=1,
+    show_default=True,
+    help="Number of trials trained at the same time.",
+)
+@click.option(
+    "--min_epochs",
+    type=click.IntRange(min=1),
+    default=1,
+    show_default=True,
+    help="Number of epochs after which the trials are compared for the first time.",
+)
+@click.option(
+    "--reduction_factor",
+    type=click.IntRange(min=2),
+    default=3,
+    show_default=True,
+    help="Only one trial in reduction_factor is continued each time the trials are "
+    "compared, after min_epochs * reduction_factor ** k epochs.",
+)
 def cli(
     launch_directory,
     name,
+    n_trials,
+    n_concurrent,
+    min_epochs,
+    reduction_factor,
 ):
     """Hyperparameter exploration using random search.
 
@@ -19,9 +53,21 @@ def cli(
 
     NAME is the name of the output folder containing the experiment.
     """
-    from .random_search import launch_search
+    if n_trials is None:
+        from .random_search import launch_search
+
+        launch_search(launch_directory, name)
+    else:
+        from .random_search import launch_trials
 
-    launch_search(launch_directory, name)
+        launch_trials(
+            launch_directory,
+            name,
+            n_trials,
+            n_concurrent=n_concurrent,
+            min_epochs=min_epochs,
+            reduction_factor=reduction_factor,
+        )
 
 
 if __name__ == "__main__":
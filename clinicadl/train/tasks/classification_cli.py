@@ -18,8 +18,16 @@ from .task_utils import task_launcher
 @train_option.n_proc
 @train_option.batch_size
 @train_option.evaluation_steps
+@train_option.train_metrics
+@train_option.train_metrics_subset_size
 @train_option.fully_sharded_data_parallel
 @train_option.amp
+@train_option.image_cache_size
+@train_option.parallel_splits
+# DataLoader
+@train_option.pin_memory
+@train_option.persistent_workers
+@train_option.prefetch_factor
 # Reproducibility
 @train_option.seed
 @train_option.deterministic
@@ -28,6 +36,7 @@ from .task_utils import task_launcher
 # Model
 @train_option.architecture
 @train_option.multi_network
+@train_option.joint_multi_network
 @train_option.ssda_network
 # Data
 @train_option.multi_cohort
@@ -55,6 +64,7 @@ from .task_utils import task_launcher
 @train_option.tolerance
 @train_option.accumulation_steps
 @train_option.profiler
+@train_option.checkpoint_frequency
 @train_option.track_exp
 # transfer learning
 @train_option.transfer_path
@@ -48,19 +48,27 @@ def task_launcher(network_task: str, task_options_list: List[str], **kwargs):
         "evaluation_steps",
         "fully_sharded_data_parallel",
         "gpu",
+        "image_cache_size",
         "learning_rate",
         "multi_cohort",
         "multi_network",
+        "joint_multi_network",
         "ssda_network",
         "n_proc",
         "n_splits",
         "nb_unfrozen_layer",
         "normalize",
         "optimizer",
+        "parallel_splits",
         "patience",
+        "persistent_workers",
+        "pin_memory",
+        "prefetch_factor",
         "profiler",
         "tolerance",
         "track_exp",
+        "train_metrics",
+        "train_metrics_subset_size",
         "transfer_path",
         "transfer_selection_metric",
         "valid_longitudinal",
@@ -69,6 +77,7 @@ def task_launcher(network_task: str, task_options_list: List[str], **kwargs):
         "save_all_models",
         "seed",
         "split",
+        "checkpoint_frequency",
         "caps_target",
         "tsv_target_lab",
         "tsv_target_unlab",
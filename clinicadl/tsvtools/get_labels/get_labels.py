@@ -21,13 +21,7 @@ import pandas as pd
 
 from clinicadl.utils.exceptions import ClinicaDLArgumentError, ClinicaDLTSVError
 from clinicadl.utils.maps_manager.iotools import commandline_to_json
-from clinicadl.utils.tsvtools_utils import (
-    cleaning_nan_diagnoses,
-    find_label,
-    first_session,
-    last_session,
-    neighbour_session,
-)
+from clinicadl.utils.tsvtools_utils import cleaning_nan_diagnoses, find_label
 
 logger = getLogger("clinicadl.tsvtools")
 
@@ -47,47 +41,34 @@ def infer_or_drop_diagnosis(bids_df: pd.DataFrame) -> pd.DataFrame:
     bids_copy_df: DataFrame
         Cleaned copy of the input bids_df.
     """
-    bids_copy_df = copy(bids_df)
-    found_diag_interpol = 0
-    nb_drop = 0
-
-    for subject, subject_df in bids_df.groupby(level=0):
-        session_list = [session for _, session in subject_df.index.values]
-
-        for _, session in subject_df.index.values:
-            diagnosis = subject_df.loc[(subject, session), "diagnosis"]
-
-            if isinstance(diagnosis, float):
-                if session == last_session(session_list):
-                    bids_copy_df.drop(index=(_, session), axis=0, inplace=True)
-                    nb_drop += 1
-                else:
-                    prev_session = neighbour_session(session, session_list, -1)
-                    prev_diagnosis = bids_df.loc[(subject, prev_session), "diagnosis"]
-                    while isinstance(
-                        prev_diagnosis, float
-                    ) and prev_session != first_session(subject_df):
-                        prev_session = neighbour_session(prev_session, session_list, -1)
-                        prev_diagnosis = bids_df.loc[
-                            (subject, prev_session), "diagnosis"
-                        ]
-                    post_session = neighbour_session(session, session_list, +1)
-                    post_diagnosis = bids_df.loc[(subject, post_session), "diagnosis"]
-                    while isinstance(
-                        post_diagnosis, float
-                    ) and post_session != last_session(session_list):
-                        post_session = neighbour_session(post_session, session_list, +1)
-                        post_diagnosis = bids_df.loc[
-                            (subject, post_session), "diagnosis"
-                        ]
-                    if prev_diagnosis == post_diagnosis:
-                        found_diag_interpol += 1
-                        bids_copy_df.loc[
-                            (subject, session), "diagnosis"
-                        ] = prev_diagnosis
-                    else:
-                        bids_copy_df.drop((subject, session), inplace=True)
-                        nb_drop += 1
+    diagnosis = bids_df["diagnosis"]
+    missing_diagnosis = diagnosis.isna()
+
+    # Nearest known diagnoses before and after each session of the same subject
+    sorted_diagnosis = diagnosis.sort_index()
+    subject_diagnosis = sorted_diagnosis.groupby(level=0, sort=False)
+    prev_diagnosis = (
+        subject_diagnosis.shift(1).groupby(level=0, sort=False).ffill()
+    ).reindex(bids_df.index)
+    post_diagnosis = (
+        subject_diagnosis.shift(-1).groupby(level=0, sort=False).bfill()
+    ).reindex(bids_df.index)
+    is_last_session = (subject_diagnosis.cumcount(ascending=False) == 0).reindex(
+        bids_df.index
+    )
+
+    inferred = (
+        missing_diagnosis
+        & ~is_last_session
+        & prev_diagnosis.notna()
+        & (prev_diagnosis == post_diagnosis)
+    )
+    dropped = missing_diagnosis & ~inferred
+    found_diag_interpol = inferred.sum()
+    nb_drop = dropped.sum()
+
+    bids_copy_df = bids_df[~dropped].copy()
+    bids_copy_df.loc[inferred[~dropped], "diagnosis"] = prev_diagnosis[inferred]
 
     logger.info(f"Inferred diagnosis: {found_diag_interpol}")
     logger.info(f"Dropped subjects (inferred diagnosis): {nb_drop}")
@@ -118,17 +99,20 @@ def mod_selection(
     bids_copy_df = copy(bids_df)
     nb_subjects = 0
     if mod is not None:
-        for subject, session in bids_df.index.values:
-            try:
-                mod_present = missing_mods_dict[
-                    bids_copy_df.loc[(subject, session), "session_id"]
-                ].loc[subject, mod]
-                if not mod_present:
-                    bids_copy_df.drop((subject, session), inplace=True)
-                    nb_subjects += 1
-            except KeyError:
-                bids_copy_df.drop((subject, session), inplace=True)
-                nb_subjects += 1
+        subjects = bids_df.index.get_level_values(0)
+        mod_present = np.zeros(len(bids_df), dtype=bool)
+        for session_id, missing_mods_df in missing_mods_dict.items():
+            if mod not in missing_mods_df.columns:
+                continue
+            session_mask = (bids_df["session_id"] == session_id).to_numpy()
+            session_subjects = subjects[session_mask]
+            mod_series = missing_mods_df.loc[~missing_mods_df.index.duplicated(), mod]
+            mod_present[session_mask] = (
+                session_subjects.isin(mod_series.index)
+                & mod_series.reindex(session_subjects).astype(bool).to_numpy()
+            )
+        nb_subjects = np.sum(~mod_present)
+        bids_copy_df = bids_df[mod_present].copy()
     logger.info(f"Dropped sessions (mod selection): {nb_subjects}")
     return bids_copy_df
 
@@ -147,17 +131,9 @@ def remove_unique_session(bids_df: pd.DataFrame) -> pd.DataFrame:
     bids_copy_df: DataFrame
         Cleaned copy of the input bids_df
     """
-    bids_copy_df = copy(bids_df)
-    nb_unique = 0
-
-    for subject, subject_df in bids_df.groupby(level=0):
-        session_list = [session for _, session in subject_df.index.values]
-        session_list.sort()
-        nb_session = len(session_list)
-        if nb_session == 1:
-            bids_copy_df.drop((subject, session_list[0]), inplace=True)
-            subject_df.drop((subject, session_list[0]), inplace=True)
-            nb_unique += 1
+    unique_session = ~bids_df.index.get_level_values(0).duplicated(keep=False)
+    nb_unique = np.sum(unique_session)
+    bids_copy_df = bids_df[~unique_session].copy()
     logger.info(f"Dropped subjects (unique session): {nb_unique}")
 
     return bids_copy_df
@@ -181,14 +157,9 @@ def diagnosis_removal(bids_df: pd.DataFrame, diagnosis_list: List[str]) -> pd.Da
 
     """
 
-    output_df = copy(bids_df)
-    nb_subjects = 0
-    for subject, subject_df in bids_df.groupby(level=0):
-        for _, session in subject_df.index.values:
-            group = subject_df.loc[(subject, session), "diagnosis"]
-            if group not in diagnosis_list:
-                output_df.drop((subject, session), inplace=True)
-                nb_subjects += 1
+    kept_diagnosis = bids_df["diagnosis"].isin(diagnosis_list)
+    nb_subjects = np.sum(~kept_diagnosis)
+    output_df = bids_df[kept_diagnosis].copy()
 
     logger.info(f"Dropped subjects (diagnoses): {nb_subjects}")
     return output_df
@@ -215,18 +186,15 @@ def apply_restriction(bids_df: pd.DataFrame, restriction_path: Path) -> pd.DataF
     nb_subjects = 0
     if restriction_path is not None:
         restriction_df = pd.read_csv(restriction_path, sep="\t")
-
-        for subject, session in bids_df.index.values:
-            subject_qc_df = restriction_df[
-                (restriction_df.participant_id == subject)
-                & (
-                    restriction_df.session_id
-                    == bids_copy_df.loc[(subject, session), "session_id"]
-                )
-            ]
-            if len(subject_qc_df) != 1:
-                bids_copy_df.drop((subject, session), inplace=True)
-                nb_subjects += 1
+        restriction_count = restriction_df.groupby(
+            ["participant_id", "session_id"]
+        ).size()
+        sessions = pd.MultiIndex.from_arrays(
+            [bids_df.index.get_level_values(0), bids_df["session_id"]]
+        )
+        restricted = (restriction_count.reindex(sessions) == 1).to_numpy()
+        nb_subjects = np.sum(~restricted)
+        bids_copy_df = bids_df[restricted].copy()
     logger.info(f"Dropped subjects (apply restriction): {nb_subjects}")
     return bids_copy_df
 
@@ -326,11 +294,9 @@ def get_labels(
 
     bids_df = pd.read_csv(merged_tsv, sep="\t", low_memory=False)
 
-    nb_drop_bad_session = 0
-    for index, row in bids_df.iterrows():
-        if not row["session_id"].startswith("ses-M"):
-            bids_df.drop(index, axis=0, inplace=True)
-            nb_drop_bad_session += 1
+    good_session = bids_df["session_id"].str.startswith("ses-M", na=False)
+    nb_drop_bad_session = np.sum(~good_session)
+    bids_df = bids_df[good_session]
     logger.info(
         f"Dropped subjects (bad session name, example ses-Nv): {nb_drop_bad_session}"
     )
@@ -394,14 +360,13 @@ def get_labels(
 
     # Adding the field baseline_diagnosis
     bids_copy_df = copy(bids_df)
-    bids_copy_df["baseline_diagnosis"] = pd.Series(
-        np.zeros(len(bids_df)), index=bids_df.index
+    sorted_diagnosis = bids_df["diagnosis"].sort_index()
+    baseline_diagnosis = sorted_diagnosis[
+        ~sorted_diagnosis.index.get_level_values(0).duplicated()
+    ].droplevel(1)
+    bids_copy_df["baseline_diagnosis"] = bids_df.index.get_level_values(0).map(
+        baseline_diagnosis
     )
-    for subject, subject_df in bids_df.groupby(level=0):
-        baseline_diagnosis = subject_df.loc[
-            (subject, first_session(subject_df)), "diagnosis"
-        ]
-        bids_copy_df.loc[subject, "baseline_diagnosis"] = baseline_diagnosis
 
     bids_df = copy(bids_copy_df)
     variables_list.append("baseline_diagnosis")
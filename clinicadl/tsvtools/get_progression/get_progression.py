@@ -2,15 +2,12 @@ from copy import copy
 from logging import getLogger
 from pathlib import Path
 
+import numpy as np
 import pandas as pd
 
 from clinicadl.tsvtools.get_labels import infer_or_drop_diagnosis
-from clinicadl.utils.tsvtools_utils import (
-    after_end_screening,
-    last_session,
-    merged_tsv_reader,
-    neighbour_session,
-)
+from clinicadl.utils.exceptions import ClinicaDLTSVError
+from clinicadl.utils.tsvtools_utils import merged_tsv_reader
 
 logger = getLogger("clinicadl.tsvtools.get_progression")
 
@@ -62,113 +59,79 @@ def get_progression(
     # We can also give two file.stv, one with unknown and unstable subjects and one without
 
     stability_dict = {"CN": 0, "MCI": 1, "AD": 2, "Dementia": 2}
-    nb_subjects = 0
     # if "group" is in bids_df.columns.values :
     #     diagnosis_str = "group"
     # elif "diagnosis" is in bids_df.columns.values :
     #     diagnosis_str = "diagnosis"
 
     # #bids_df["group"] = "UK"
-    bids_df["progression"] = "UK"
-    bids_copy_df = copy(bids_df)
 
     # Do not take into account the case of missing diag = nan
+    unknown_diagnoses = set(bids_df["diagnosis"]) - set(stability_dict)
+    if unknown_diagnoses:
+        raise ClinicaDLTSVError(
+            f"The diagnoses {unknown_diagnoses} are not handled by get-progression. "
+            f"Possible diagnoses are {list(stability_dict)}."
+        )
+
+    sorted_df = bids_df.sort_index()
+    subjects = sorted_df.index.get_level_values(0)
+    sessions = sorted_df.index.get_level_values(1)
+    stages = sorted_df["diagnosis"].map(stability_dict).to_numpy()
+
+    horizon_session_nb = sessions.str[5:].astype(int) + horizon_time
+    horizon_sessions = "ses-M" + horizon_session_nb.astype(str).str.zfill(3)
+
+    # Sessions are compared as strings, as in the session lists of the subjects.
+    # Sessions and horizon sessions of all the subjects are mapped to sortable integer keys
+    # to find the session at the horizon (or the sessions surrounding it) with a binary search.
+    session_names, session_ranks = np.unique(
+        np.concatenate([sessions, horizon_sessions]).astype(str), return_inverse=True
+    )
+    subject_codes = pd.factorize(subjects)[0]
+    keys = subject_codes * len(session_names) + session_ranks[: len(sessions)]
+    horizon_keys = subject_codes * len(session_names) + session_ranks[len(sessions) :]
+    horizon_pos = np.searchsorted(keys, horizon_keys)
+    next_pos = np.minimum(horizon_pos, len(keys) - 1)
+
+    # CASE 1 : if the  session after 'horizon_time' months is a session the subject has done
+    horizon_exists = (horizon_pos < len(keys)) & (keys[next_pos] == horizon_keys)
+    # CASE 2 : if the session after 'horizon_time' months doesn't exist because it is after the last session of the subject
+    # the diagnosis is compared to the one of the last session (previous one).
+    # CASE 3 : if the session after 'horizon_time' months doesn't exist but there are sessions before and after this time,
+    # the diagnosis is compared to the one of the previous session, then to the one of the next session if identical.
+    reference_pos = np.where(horizon_exists, horizon_pos, horizon_pos - 1)
+    change = np.sign(stages[reference_pos] - stages)
+    has_next = (
+        ~horizon_exists
+        & (horizon_pos < len(keys))
+        & (subject_codes[next_pos] == subject_codes)
+    )
+    change = np.where(
+        (change == 0) & has_next, np.sign(stages[next_pos] - stages), change
+    )
+    progression = pd.Series(
+        np.select([change > 0, change < 0], ["p", "r"], "s"),
+        index=sorted_df.index,
+        dtype=object,
+    )
+
+    # Add unstable session for subjects with multiple regression or conversion
+    # The subjects will be unstable only from the time of the conversion (if regression before) or regression (if conversion before)
+    conversion = (progression == "p").groupby(level=0, sort=False).transform("any")
+    regression = (progression == "r").groupby(level=0, sort=False).transform("any")
+    unstable = conversion & regression
+    nb_subjects = subjects[unstable.to_numpy()].nunique()
+    progression[unstable] = "us"
+
+    # Add unknown subgroup for each last_session
+    is_last_session = (
+        progression.groupby(level=0, sort=False).cumcount(ascending=False) == 0
+    )
+    progression[is_last_session & ~unstable] = "uk"
 
-    for subject, subject_df in bids_df.groupby(level=0):
-        session_list = [session for _, session in subject_df.index.values]
-        session_list.sort()
-        logger.debug(f"Getting progression for subject {subject}")
-        for _, session in subject_df.index.values:
-            diagnosis = subject_df.loc[(subject, session), "diagnosis"]
-            diagnosis_dict = stability_dict[diagnosis]
-            session_nb = int(session[5::])
-            horizon_session_nb = session_nb + horizon_time
-            if horizon_session_nb < 10:
-                horizon_session = "ses-M00" + str(horizon_session_nb)
-            elif 10 <= horizon_session_nb < 100:
-                horizon_session = "ses-M0" + str(horizon_session_nb)
-            else:
-                horizon_session = "ses-M" + str(horizon_session_nb)
-
-            # CASE 1 : if the  session after 'horizon_time' months is a session the subject has done
-            if horizon_session in session_list:
-                horizon_diagnosis = subject_df.loc[
-                    (subject, horizon_session), "diagnosis"
-                ]
-                horizon_diagnosis_dict = stability_dict[horizon_diagnosis]
-
-                if horizon_diagnosis_dict > diagnosis_dict:
-                    update_diagnosis = "p"
-                elif horizon_diagnosis_dict < diagnosis_dict:
-                    update_diagnosis = "r"
-                elif horizon_diagnosis_dict == diagnosis_dict:
-                    update_diagnosis = "s"
-
-            # CASE 2 : if the session after 'horizon_time' months doesn't exist because it is after the last session of the subject
-            elif after_end_screening(horizon_session, session_list):
-                last_diagnosis = subject_df.loc[
-                    (subject, last_session(session_list)), "diagnosis"
-                ]
-                # This section must be discussed --> removed in Jorge's paper
-                last_diagnosis_dict = stability_dict[last_diagnosis]
-                if last_diagnosis_dict > diagnosis_dict:
-                    update_diagnosis = "p"
-                elif last_diagnosis_dict < diagnosis_dict:
-                    update_diagnosis = "r"
-                elif last_diagnosis_dict == diagnosis_dict:
-                    update_diagnosis = "s"
-
-            # CASE 3 : if the session after 'horizon_time' months doesn't exist but there are sessions before and after this time.
-            else:
-                prev_session = neighbour_session(horizon_session, session_list, -1)
-                post_session = neighbour_session(horizon_session, session_list, +1)
-
-                prev_diagnosis = subject_df.loc[(subject, prev_session), "diagnosis"]
-                prev_diagnosis_dict = stability_dict[prev_diagnosis]
-
-                if prev_diagnosis_dict > diagnosis_dict:
-                    update_diagnosis = "p"
-                elif prev_diagnosis_dict < diagnosis_dict:
-                    update_diagnosis = "r"
-                elif prev_diagnosis_dict == diagnosis_dict:
-                    post_diagnosis = subject_df.loc[
-                        (subject, post_session), "diagnosis"
-                    ]
-                    post_diagnosis_dict = stability_dict[post_diagnosis]
-                    if post_diagnosis_dict > diagnosis_dict:
-                        update_diagnosis = "p"
-                    elif post_diagnosis_dict < diagnosis_dict:
-                        update_diagnosis = "r"
-                    elif post_diagnosis_dict == diagnosis_dict:
-                        update_diagnosis = "s"
-            bids_copy_df.loc[(subject, session), "progression"] = update_diagnosis
-
-        # Add unstable session for subjects with multiple regression or conversion
-        # The subjects will be unstable only from the time of the conversion (if regression before) or regression (if conversion before)
-
-        status = 0
-        unstable = False
-        for session_str in session_list:
-            subgroup_str = bids_copy_df.loc[(subject, session_str), "progression"]
-            if subgroup_str == "p":
-                if status < 0:
-                    unstable = True
-                status = 1
-            if subgroup_str == "r":
-                if status > 0:
-                    unstable = True
-                status = -1
-        if unstable:
-            nb_subjects += 1
-            for session_str in session_list:
-                bids_copy_df.loc[(subject, session_str), "progression"] = "us"
-
-        # Add unknown subgroup for each last_session
-        session_list = [session for _, session in subject_df.index.values]
-
-        last_session_str = last_session(session_list)
-        if bids_copy_df.loc[(subject, last_session_str), "progression"] != "us":
-            bids_copy_df.loc[(subject, last_session_str), "progression"] = "uk"
+    bids_copy_df = copy(bids_df)
+    bids_copy_df["progression"] = progression.reindex(bids_df.index)
 
     logger.info(f"Unstable subjects: {nb_subjects}")
 
@@ -9,12 +9,78 @@ from sklearn.model_selection import StratifiedKFold
 
 from clinicadl.utils.exceptions import ClinicaDLTSVError
 from clinicadl.utils.maps_manager.iotools import commandline_to_json
-from clinicadl.utils.tsvtools_utils import extract_baseline, retrieve_longitudinal
+from clinicadl.utils.tsvtools_utils import (
+    SPLIT_CANDIDATES_BATCH,
+    chi2_pvalues,
+    extract_baseline,
+    find_label,
+    retrieve_longitudinal,
+    stratified_fold_candidates,
+    ttest_pvalues,
+)
 
 sex_dict = {"M": 0, "F": 1}
 logger = getLogger("clinicadl.tsvtools.kfold")
 
 
+def select_balanced_folds(
+    baseline_df: pd.DataFrame, y: np.ndarray, n_splits: int, n_candidates: int
+) -> np.ndarray:
+    """
+    Draws n_candidates stratified k-fold splits and selects the one with the most balanced
+    age and sex distributions, i.e. the one maximizing the smallest p-value of the age T-tests
+    and sex chi2 tests between each fold and the others.
+
+    Parameters
+    ----------
+    baseline_df: DataFrame
+        Baseline sessions, columns must include age and sex.
+    y: array
+        Labels used for the stratification.
+    n_splits: int
+        Number of splits in the k-fold cross-validation.
+    n_candidates: int
+        Number of k-fold splits drawn.
+
+    Returns
+    -------
+    Array with the fold of each baseline session.
+    """
+    age = baseline_df[find_label(baseline_df.columns.values, "age")].to_numpy(
+        dtype=float
+    )
+    sex = np.array(
+        [
+            sex_dict[x]
+            for x in baseline_df[find_label(baseline_df.columns.values, "sex")]
+        ]
+    )
+    rng = np.random.default_rng(2)
+
+    best_score, best_folds = -np.inf, None
+    for start in range(0, n_candidates, SPLIT_CANDIDATES_BATCH):
+        batch_size = min(SPLIT_CANDIDATES_BATCH, n_candidates - start)
+        folds = stratified_fold_candidates(y, n_splits, batch_size, rng)
+        score = np.ones(batch_size)
+        for i in range(n_splits):
+            test_masks = folds == i
+            if len(set(age)) != 1:
+                p_age = ttest_pvalues(test_masks, age)
+                score = np.minimum(score, np.nan_to_num(p_age, nan=-1))
+            if len(set(sex)) != 1:
+                p_sex = chi2_pvalues(test_masks, sex)
+                score = np.minimum(score, np.nan_to_num(p_sex, nan=-1))
+        best_candidate = np.argmax(score)
+        if score[best_candidate] > best_score:
+            best_score = score[best_candidate]
+            best_folds = folds[best_candidate]
+
+    logger.info(
+        f"Smallest p-value of the age and sex tests between folds: {best_score:.4f}"
+    )
+    return best_folds
+
+
 def write_splits(
     diagnosis_df: pd.DataFrame,
     split_label: str,
@@ -22,6 +88,7 @@ def write_splits(
     subset_name: str,
     results_directory: Path,
     valid_longitudinal: bool = False,
+    n_candidates: int = 1,
 ):
     """
     Split data at the subject-level in training and test to have equivalent distributions in split_label.
@@ -39,6 +106,9 @@ def write_splits(
         Name of the subset split.
     results_directory: str (path)
         Path to the results directory.
+    n_candidates: int
+        If > 1, number of stratified k-fold splits drawn to select the one with the most balanced
+        age and sex distributions between folds.
 
     """
 
@@ -53,9 +123,17 @@ def write_splits(
         unique = list(set(stratification_list))
         y = np.array([unique.index(x) for x in stratification_list])
 
-    splits = StratifiedKFold(n_splits=int(n_splits), shuffle=True, random_state=2)
+    if n_candidates > 1:
+        folds = select_balanced_folds(baseline_df, y, int(n_splits), n_candidates)
+        split_indices = [
+            (np.flatnonzero(folds != i), np.flatnonzero(folds == i))
+            for i in range(int(n_splits))
+        ]
+    else:
+        splits = StratifiedKFold(n_splits=int(n_splits), shuffle=True, random_state=2)
+        split_indices = splits.split(np.zeros(len(y)), y)
 
-    for i, indices in enumerate(splits.split(np.zeros(len(y)), y)):
+    for i, indices in enumerate(split_indices):
         train_index, test_index = indices
 
         train_df = baseline_df.iloc[train_index]
@@ -104,6 +182,7 @@ def split_diagnoses(
     stratification: str = None,
     merged_tsv: Path = None,
     valid_longitudinal: bool = False,
+    n_candidates: int = 1,
 ):
     """
     Performs a k-fold split for each label independently on the subject level.
@@ -126,6 +205,9 @@ def split_diagnoses(
         Name of variable used to stratify k-fold.
     merged_tsv: str
         Path to the merged.tsv file, output of clinica iotools merge-tsv.
+    n_candidates: int
+        If > 1, number of stratified k-fold splits drawn to select the one with the most balanced
+        age and sex distributions between folds.
     """
 
     parents_path = data_tsv.parent
@@ -144,6 +226,7 @@ def split_diagnoses(
             "n_splits": n_splits,
             "subset_name": subset_name,
             "stratification": stratification,
+            "n_candidates": n_candidates,
         },
         filename="kfold.json",
     )
@@ -193,6 +276,7 @@ def split_diagnoses(
         subset_name,
         results_directory,
         valid_longitudinal=valid_longitudinal,
+        n_candidates=n_candidates,
     )
 
     logger.info(f"K-fold split is done.")
@@ -26,6 +26,14 @@ from clinicadl.utils import cli_param
     type=str,
     default=None,
 )
+@click.option(
+    "--n_candidates",
+    help="Number of stratified k-fold splits drawn to select the one with the most balanced "
+    "age and sex distributions between folds. If 1, a single stratified k-fold split is done.",
+    show_default=True,
+    type=int,
+    default=1,
+)
 @cli_param.option.valid_longitudinal
 def cli(
     data_tsv,
@@ -33,6 +41,7 @@ def cli(
     subset_name,
     stratification,
     merged_tsv,
+    n_candidates,
     valid_longitudinal,
 ):
     """Performs a k-fold split to prepare training.
@@ -50,6 +59,7 @@ def cli(
         stratification=stratification,
         merged_tsv=merged_tsv,
         valid_longitudinal=valid_longitudinal,
+        n_candidates=n_candidates,
     )
 
 
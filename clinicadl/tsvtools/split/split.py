@@ -5,20 +5,23 @@ from pathlib import Path
 
 import numpy as np
 import pandas as pd
-from scipy.stats import ks_2samp, ttest_ind
-from sklearn.model_selection import StratifiedShuffleSplit
+from scipy.stats import ks_2samp
 
 from clinicadl.utils.exceptions import ClinicaDLArgumentError, ClinicaDLTSVError
 from clinicadl.utils.maps_manager.iotools import commandline_to_json
 from clinicadl.utils.tsvtools_utils import (
+    SPLIT_CANDIDATES_BATCH,
     category_conversion,
-    chi2,
+    chi2_pvalues,
     complementary_list,
     df_to_tsv,
     extract_baseline,
     find_label,
+    ks_statistics,
     remove_unicity,
     retrieve_longitudinal,
+    stratified_test_masks,
+    ttest_pvalues,
 )
 
 sex_dict = {"M": 0, "F": 1}
@@ -39,46 +42,36 @@ def KStests(train_df, test_df, threshold=0.5):
 
 
 def shuffle_choice(df, n_shuffle=10):
-    p_min_max, n_col_min = 0, df.columns.size
-
-    for i in range(n_shuffle):
-        train_df = df.sample(frac=0.75)
-        test_df = df.drop(train_df.index)
-
-        p, col = KStests(train_df, test_df)
-
-        if p > p_min_max:
-            p_min_max = p
-            best_train_df, best_test_df = train_df, test_df
-
-    return (best_train_df, best_test_df, p_min_max)
-
-
-def KStests(train_df, test_df, threshold=0.5):
-    pmin = 1
-    column = ""
-    for col in train_df.columns:
-        if col == "session_id":
-            continue
-        _, pval = ks_2samp(train_df[col], test_df[col])
-        if pval < pmin:
-            pmin = pval
-            column = col
-    return (pmin, column)
-
-
-def shuffle_choice(df, n_shuffle=10):
-    p_min_max, n_col_min = 0, df.columns.size
-
-    for i in range(n_shuffle):
-        train_df = df.sample(frac=0.75)
-        test_df = df.drop(train_df.index)
+    """
+    Draws n_shuffle random splits of df (75% / 25% of the rows) and keeps the one for which
+    the smallest p-value of the KS tests over the columns is the largest.
 
-        p, col = KStests(train_df, test_df)
+    As all the candidates have the same number of rows in each set, the KS p-value is a decreasing
+    function of the KS statistic. The candidates are then compared with their largest statistic,
+    computed for all of them at once, and the KS tests are only run on the split selected.
+    """
+    n_train = round(0.75 * len(df))
+    columns = [
+        col for col in df.columns if col != "session_id" and not df[col].isna().any()
+    ]
+    rng = np.random.default_rng()
+
+    best_statistic, best_train_mask = np.inf, None
+    for start in range(0, n_shuffle, SPLIT_CANDIDATES_BATCH):
+        n_candidates = min(SPLIT_CANDIDATES_BATCH, n_shuffle - start)
+        train_masks = np.argsort(rng.random((n_candidates, len(df))), axis=1) < n_train
+        statistics = np.zeros(n_candidates)
+        for col in columns:
+            statistics = np.maximum(
+                statistics, ks_statistics(train_masks, df[col].to_numpy())
+            )
+        best_candidate = np.argmin(statistics)
+        if statistics[best_candidate] < best_statistic:
+            best_statistic = statistics[best_candidate]
+            best_train_mask = train_masks[best_candidate]
 
-        if p > p_min_max:
-            p_min_max = p
-            best_train_df, best_test_df = train_df, test_df
+    best_train_df, best_test_df = df[best_train_mask], df[~best_train_mask]
+    p_min_max, _ = KStests(best_train_df, best_test_df)
 
     return (best_train_df, best_test_df, p_min_max)
 
@@ -91,10 +84,16 @@ def create_split(
     p_sex_threshold=0.80,
     supplementary_train_df=None,
     ignore_demographics=False,
+    max_trials=100000,
 ):
     """
     Split data at the subject-level in training and test set with equivalent age, sex and split_label distributions.
 
+    Candidate stratified splits are drawn by batches and the age T-test and sex chi2 test are computed
+    for all the candidates of a batch at once. The best-balanced candidate of the first batch including
+    splits that satisfy the thresholds is kept. If none is found within max_trials candidates, the
+    best-balanced candidate found is kept.
+
     Parameters
     ----------
     diagnosis_df: DataFrame
@@ -113,6 +112,8 @@ def create_split(
     ignore_demographics: bool
         If True the diagnoses are split without taking into account the demographics
         distributions (age, sex).
+    max_trials: int
+        Maximum number of candidate splits evaluated.
 
     Returns
     -------
@@ -128,6 +129,11 @@ def create_split(
         sup_train_sex = []
         sup_train_age = []
 
+    if max_trials < 1:
+        raise ClinicaDLArgumentError(
+            f"The maximum number of trials must be positive, got {max_trials}."
+        )
+
     baseline_df = extract_baseline(diagnosis_df)
     if n_test >= 1:
         n_test = int(n_test)
@@ -157,41 +163,59 @@ def create_split(
         category = category_conversion(category)
         category = remove_unicity(category)
 
-        flag_selection = True
+        sex_values = np.array([sex_dict[x] for x in sex])
+        age_values = np.array(age, dtype=float)
+        rng = np.random.default_rng()
+        best_score, best_test_mask = -np.inf, None
         n_try = 0
 
-        while flag_selection:
-            splits = StratifiedShuffleSplit(n_splits=1, test_size=n_test)
-            for train_index, test_index in splits.split(category, category):
-                # Find the value for different demographics (age & sex)
-                if len(set(age)) != 1:
-                    age_test = [float(age[idx]) for idx in test_index]
-                    age_train = [float(age[idx]) for idx in train_index] + sup_train_age
-                    _, p_age = ttest_ind(age_test, age_train, nan_policy="omit")
-                else:
-                    p_age = 1
-
-                if len(set(sex)) != 1:
-                    sex_test = [sex_dict[sex[idx]] for idx in test_index]
-                    sex_train = [
-                        sex_dict[sex[idx]] for idx in train_index
-                    ] + sup_train_sex
-                    _, p_sex = chi2(sex_test, sex_train)
-                else:
-                    p_sex = 1
-
-                logger.info(f"p_age={p_age:.2f}, p_sex={p_sex:.4f}")
-
-                if p_sex >= p_sex_threshold and p_age >= p_age_threshold:
-                    flag_selection = False
-                    test_df = baseline_df.loc[test_index]
-                    train_df = baseline_df.loc[train_index]
-                    if supplementary_train_df is not None:
-                        train_df = pd.concat([train_df, supplementary_train_df])
-                        train_df.reset_index(drop=True, inplace=True)
-
-                n_try += 1
-        logger.info(f"Split was found after {n_try} trials.")
+        while n_try < max_trials:
+            n_candidates = min(SPLIT_CANDIDATES_BATCH, max_trials - n_try)
+            test_masks = stratified_test_masks(
+                np.array(category), n_test, n_candidates, rng
+            )
+            n_try += n_candidates
+
+            # Find the value for different demographics (age & sex)
+            if len(set(age)) != 1:
+                p_age = ttest_pvalues(test_masks, age_values, sup_train_age)
+            else:
+                p_age = np.ones(n_candidates)
+            if len(set(sex)) != 1:
+                p_sex = chi2_pvalues(test_masks, sex_values, sup_train_sex)
+            else:
+                p_sex = np.ones(n_candidates)
+
+            # The best-balanced candidate is the one with the largest minimal p-value,
+            # among the candidates satisfying the thresholds if there are some.
+            valid = (p_sex >= p_sex_threshold) & (p_age >= p_age_threshold)
+            score = np.nan_to_num(np.minimum(p_age, p_sex), nan=-1)
+            if valid.any():
+                score = np.where(valid, score, -np.inf)
+            best_candidate = np.argmax(score)
+            if valid.any() or score[best_candidate] > best_score:
+                best_score = score[best_candidate]
+                best_p_age = p_age[best_candidate]
+                best_p_sex = p_sex[best_candidate]
+                best_test_mask = test_masks[best_candidate]
+            if valid.any():
+                logger.info(f"Split was found after {n_try} trials.")
+                break
+        else:
+            logger.warning(
+                f"No split satisfying the thresholds p_age >= {p_age_threshold} and "
+                f"p_sex >= {p_sex_threshold} was found after {n_try} trials. "
+                f"The best-balanced split found is used."
+            )
+        logger.info(f"p_age={best_p_age:.2f}, p_sex={best_p_sex:.4f}")
+
+        test_index = np.flatnonzero(best_test_mask)
+        train_index = np.flatnonzero(~best_test_mask)
+        test_df = baseline_df.loc[test_index]
+        train_df = baseline_df.loc[train_index]
+        if supplementary_train_df is not None:
+            train_df = pd.concat([train_df, supplementary_train_df])
+            train_df.reset_index(drop=True, inplace=True)
 
     else:
         idx = np.arange(len(baseline_df))
@@ -214,6 +238,7 @@ def split_diagnoses(
     ignore_demographics=False,
     multi_diagnoses=False,
     valid_longitudinal=False,
+    max_trials=100000,
 ):
     """
     Performs a single split for each label independently on the subject level.
@@ -241,6 +266,8 @@ def split_diagnoses(
     ignore_demographics: bool
         If True the diagnoses are split without taking into account the demographics
         distributions (age, sex).
+    max_trials: int
+        Maximum number of candidate splits evaluated to find a split satisfying the thresholds.
     verbose: int
         Level of verbosity.
 
@@ -272,6 +299,7 @@ def split_diagnoses(
             "categorical_split_variable": categorical_split_variable,
             "ignore_demographics": ignore_demographics,
             "mullti_diagnoses": multi_diagnoses,
+            "max_trials": max_trials,
         },
         filename="split.json",
     )
@@ -289,6 +317,7 @@ def split_diagnoses(
     list_columns = diagnosis_df.columns.values
     if multi_diagnoses:
         train, test, p_min = shuffle_choice(diagnosis_df, n_shuffle=5000)
+        logger.info(f"Smallest p-value of the KS tests: {p_min:.4f}")
 
         train_df = extract_baseline(train)
         test_df = extract_baseline(test)
@@ -335,6 +364,7 @@ def split_diagnoses(
             p_age_threshold=p_age_threshold,
             p_sex_threshold=p_sex_threshold,
             ignore_demographics=ignore_demographics,
+            max_trials=max_trials,
         )
 
         # train_df= train_df[["participant_id", "session_id"]]
@@ -30,6 +30,14 @@ from clinicadl.utils import cli_param
     default=0.80,
     type=float,
 )
+@click.option(
+    "--max_trials",
+    help="Maximum number of candidate splits evaluated to find a split satisfying the thresholds. "
+    "If none is found, the best-balanced split is used.",
+    default=100000,
+    show_default=True,
+    type=int,
+)
 @click.option(
     "--ignore_demographics",
     help="If given do not use age and sex to balance the split.",
@@ -58,6 +66,7 @@ def cli(
     n_test,
     p_sex_threshold,
     p_age_threshold,
+    max_trials,
     ignore_demographics,
     categorical_split_variable,
     multi_diagnoses,
@@ -76,6 +85,7 @@ def cli(
         subset_name=subset_name,
         p_age_threshold=p_age_threshold,
         p_sex_threshold=p_sex_threshold,
+        max_trials=max_trials,
         ignore_demographics=ignore_demographics,
         categorical_split_variable=categorical_split_variable,
         multi_diagnoses=multi_diagnoses,
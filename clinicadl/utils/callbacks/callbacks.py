@@ -1,40 +1,50 @@
+import sys
+from collections import defaultdict
+from contextlib import contextmanager
 from logging import getLogger
+from time import perf_counter
+
+import pandas as pd
+import torch
 
 logger = getLogger("clinicadl.callbacks")
 
 
 class Callback:
+    # Set to True to stop the training at the end of the current epoch
+    stop_training: bool = False
+
     def __init__(self):
         pass
 
-    def on_train_begin(self):
+    def on_train_begin(self, parameters, **kwargs):
         pass
 
-    def on_train_end(self):
+    def on_train_end(self, parameters, **kwargs):
         pass
 
-    def on_epoch_begin(self):
+    def on_epoch_begin(self, parameters, **kwargs):
         pass
 
-    def on_epoch_end(self):
+    def on_epoch_end(self, parameters, **kwargs):
         pass
 
-    def on_batch_begin(self):
+    def on_batch_begin(self, parameters, **kwargs):
         pass
 
-    def on_batch_end(self):
+    def on_batch_end(self, parameters, **kwargs):
         pass
 
-    def on_loss_begin(self):
+    def on_loss_begin(self, parameters, **kwargs):
         pass
 
-    def on_loss_end(self):
+    def on_loss_end(self, parameters, **kwargs):
         pass
 
-    def on_step_begin(self):
+    def on_step_begin(self, parameters, **kwargs):
         pass
 
-    def on_step_end(self):
+    def on_step_end(self, parameters, **kwargs):
         pass
 
 
@@ -63,6 +73,11 @@ class CallbacksHandler:
     def callback_list(self):
         return "\n".join(cb.__class__.__name__ for cb in self.callbacks)
 
+    @property
+    def stop_training(self) -> bool:
+        """True if one of the callbacks asked to stop the training."""
+        return any(cb.stop_training for cb in self.callbacks)
+
     def on_train_begin(self, parameters, **kwargs):
         self.call_event("on_train_begin", parameters, **kwargs)
 
@@ -178,10 +193,11 @@ class LoggerCallback(Callback):
         logger.info(f"Beginning epoch {kwargs['epoch']}.")
 
     def on_epoch_end(self, parameters, **kwargs):
-        logger.info(
-            f"{kwargs['mode']} level training loss is {kwargs['metrics_train']['loss']} "
-            f"at the end of iteration {kwargs['i']}"
-        )
+        if parameters.get("train_metrics", "full") != "skip":
+            logger.info(
+                f"{kwargs['mode']} level training loss is {kwargs['metrics_train']['loss']} "
+                f"at the end of iteration {kwargs['i']}"
+            )
         logger.info(
             f"{kwargs['mode']} level validation loss is {kwargs['metrics_valid']['loss']} "
             f"at the end of iteration {kwargs['i']}"
@@ -191,6 +207,146 @@ class LoggerCallback(Callback):
         logger.info("tests")
 
 
+class PerformanceCounters:
+    """
+    Lightweight counters of the time spent in the different parts of a training epoch.
+
+    On GPU the kernels are run asynchronously, so the time of the computations is
+    attributed to the part of the loop where the CPU waits for the GPU.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        """Sets all the counters to 0 at the beginning of an epoch."""
+        self.times = defaultdict(float)
+        self.n_samples = 0
+        self.beginning_time = perf_counter()
+        if torch.cuda.is_available():
+            torch.cuda.reset_peak_memory_stats()
+
+    def add(self, name: str, duration: float):
+        """Adds duration (in seconds) to the counter name."""
+        self.times[name] += duration
+
+    @contextmanager
+    def timer(self, name: str):
+        """Adds the time spent in the context to the counter name."""
+        tic = perf_counter()
+        try:
+            yield
+        finally:
+            self.times[name] += perf_counter() - tic
+
+    def iterate(self, dataloader, name: str = "data"):
+        """Iterates over the dataloader and adds the time spent waiting for the batches to the counter name."""
+        iterator = iter(dataloader)
+        while True:
+            tic = perf_counter()
+            try:
+                data = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                self.times[name] += perf_counter() - tic
+            yield data
+
+    def summary(self, epoch: int) -> dict:
+        """
+        Returns the values of the counters for the current epoch.
+
+        Args:
+            epoch: index of the current epoch.
+        Returns:
+            a row of performance.tsv.
+        """
+        train_time = (
+            self.times["data"]
+            + self.times["forward_backward"]
+            + self.times["optimizer"]
+        )
+        row = {
+            "epoch": epoch,
+            "epoch_time": perf_counter() - self.beginning_time,
+            "data_time": self.times["data"],
+            "forward_backward_time": self.times["forward_backward"],
+            "optimizer_time": self.times["optimizer"],
+            "evaluation_time": self.times["evaluation"],
+            "evaluation_data_time": self.times["evaluation_data"],
+            "checkpoint_time": self.times["checkpoint"],
+            "samples_per_second": self.n_samples / train_time
+            if train_time > 0
+            else 0.0,
+            "peak_rss_mb": peak_rss_mb(),
+            "peak_cuda_mb": (
+                torch.cuda.max_memory_allocated() / 2**20
+                if torch.cuda.is_available()
+                else 0.0
+            ),
+        }
+        return row
+
+
+def peak_rss_mb() -> float:
+    """Returns the peak resident set size of the current process in MB (0 if it is unknown)."""
+    try:
+        import resource
+    except ImportError:  # Windows
+        return 0.0
+
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is given in bytes on macOS and in kilobytes on Linux
+    return max_rss / 2**20 if sys.platform == "darwin" else max_rss / 2**10
+
+
+class PerformanceCallback(Callback):
+    """
+    Writes the PerformanceCounters of each epoch in performance.tsv, next to training.tsv.
+
+    In a joint multi-network training, on_epoch_end is called for each network with
+    the same counters: they are written once per epoch.
+    """
+
+    def on_train_begin(self, parameters, **kwargs):
+        file_dir = kwargs["maps_path"] / f"split-{kwargs['split']}" / "training_logs"
+        if kwargs.get("network") is not None:
+            file_dir = file_dir / f"network-{kwargs['network']}"
+        file_dir.mkdir(parents=True, exist_ok=True)
+        self.tsv_path = file_dir / "performance.tsv"
+        self.last_epoch = None
+
+        # Rows of the epochs that will be trained again are removed
+        if kwargs.get("resume", False) and self.tsv_path.is_file():
+            performance_df = pd.read_csv(self.tsv_path, sep="\t")
+            performance_df = performance_df[
+                performance_df.epoch < kwargs.get("beginning_epoch", 0)
+            ]
+            performance_df.to_csv(self.tsv_path, index=False, sep="\t")
+        elif self.tsv_path.is_file():
+            self.tsv_path.unlink()
+
+    def on_epoch_end(self, parameters, **kwargs):
+        counters = kwargs.get("performance")
+        if counters is None or kwargs["epoch"] == self.last_epoch:
+            return
+        self.last_epoch = kwargs["epoch"]
+        row = counters.summary(kwargs["epoch"])
+        logger.info(
+            f"Training loop of epoch {row['epoch']}: {row['data_time']:.2f} s waiting for data "
+            f"and {row['forward_backward_time'] + row['optimizer_time']:.2f} s computing "
+            f"({row['samples_per_second']:.1f} samples/s)."
+        )
+        row_df = pd.DataFrame([row]).round(4)
+        row_df.to_csv(
+            self.tsv_path,
+            mode="a",
+            header=not self.tsv_path.is_file(),
+            index=False,
+            sep="\t",
+        )
+
+
 # class ProfilerHandler(Callback):
 #     def on_train_begin(self, parameters, **kwargs):
 #         if self.profiler:
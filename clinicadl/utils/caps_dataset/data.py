@@ -1,6 +1,8 @@
 # coding: utf8
 
 import abc
+import os
+from collections import OrderedDict
 from logging import getLogger
 from pathlib import Path
 from typing import Any, Callable, Dict, List, Optional, Tuple, Union
@@ -10,7 +12,7 @@ import pandas as pd
 import torch
 import torchio as tio
 import torchvision.transforms as transforms
-from torch.utils.data import Dataset
+from torch.utils.data import Dataset, get_worker_info
 
 from clinicadl.prepare_data.prepare_data_utils import (
     PATTERN_DICT,
@@ -25,6 +27,7 @@ from clinicadl.prepare_data.prepare_data_utils import (
     extract_slice_tensor,
     find_mask_path,
 )
+from clinicadl.utils.caps_dataset.packed_store import open_packed_store
 from clinicadl.utils.exceptions import (
     ClinicaDLArgumentError,
     ClinicaDLCAPSError,
@@ -34,6 +37,9 @@ from clinicadl.utils.exceptions import (
 
 logger = getLogger("clinicadl")
 
+# Number of rows of the image cache counters, one per DataLoader worker
+IMAGE_CACHE_COUNTER_ROWS = 64
+
 
 #################################
 # Datasets loaders
@@ -52,16 +58,32 @@ class CapsDataset(Dataset):
         label_code: Dict[Any, int] = None,
         augmentation_transformations: Optional[Callable] = None,
         multi_cohort: bool = False,
+        n_proc: int = 1,
+        image_cache_size: int = 0,
     ):
         self.caps_directory = caps_directory
         self.caps_dict = self.create_caps_dict(caps_directory, multi_cohort)
-        self.transformations = transformations
+        self.transformations = self._remove_baked_transforms(
+            transformations, preprocessing_dict
+        )
         self.augmentation_transformations = augmentation_transformations
-        self.eval_mode = False
+        # In shared memory so that persistent DataLoader workers see the changes of mode
+        self._eval_mode = torch.zeros(1, dtype=torch.bool).share_memory_()
         self.label_presence = label_presence
         self.label = label
         self.label_code = label_code
         self.preprocessing_dict = preprocessing_dict
+        self.n_proc = n_proc
+        self.image_cache_size = image_cache_size
+        self._image_cache = OrderedDict()
+        # (hits, misses) of each worker, in shared memory to be summed by the main process
+        self._image_cache_counts = torch.zeros(
+            (IMAGE_CACHE_COUNTER_ROWS, 2), dtype=torch.int64
+        ).share_memory_()
+        self.packed_stores = {
+            cohort: open_packed_store(caps_path, preprocessing_dict)
+            for cohort, caps_path in self.caps_dict.items()
+        }
 
         if not hasattr(self, "elem_index"):
             raise AttributeError(
@@ -70,7 +92,6 @@ class CapsDataset(Dataset):
         if not hasattr(self, "mode"):
             raise AttributeError("Child class of CapsDataset, must set mode attribute.")
 
-        self.df = data_df
         mandatory_col = {
             "participant_id",
             "session_id",
@@ -79,11 +100,13 @@ class CapsDataset(Dataset):
         if self.label_presence and self.label is not None:
             mandatory_col.add(self.label)
 
-        if not mandatory_col.issubset(set(self.df.columns.values)):
+        if not mandatory_col.issubset(set(data_df.columns.values)):
             raise Exception(
                 f"the data file is not in the correct format."
                 f"Columns should include {mandatory_col}"
             )
+        self.df = data_df
+        self.image_paths = self._build_image_path_index()
         self.elem_per_image = self.num_elem_per_image()
         self.size = self[0]["image"].size()
 
@@ -92,6 +115,54 @@ class CapsDataset(Dataset):
     def elem_index(self):
         pass
 
+    @property
+    def df(self) -> pd.DataFrame:
+        return self._df
+
+    @df.setter
+    def df(self, data_df: pd.DataFrame):
+        self._df = data_df
+        self._encode_meta_data()
+
+    def _encode_meta_data(self):
+        """
+        Converts the columns of self.df read by _get_meta_data into NumPy arrays, so that
+        the meta data of an element is found by array indexing instead of DataFrame lookups.
+
+        Participants, sessions and cohorts are stored as categorical codes. Labels and domains
+        are encoded once with label_fn and domain_fn. The values that cannot be encoded
+        are set to NaN and encoded again by _get_meta_data, which then raises the same error
+        as label_fn or domain_fn.
+        """
+        self._meta_codes = {}
+        self._meta_categories = {}
+        for column in ["participant_id", "session_id", "cohort"]:
+            codes, categories = pd.factorize(self._df[column])
+            self._meta_codes[column] = codes.astype(np.int32)
+            self._meta_categories[column] = categories.to_numpy()
+
+        self._labels = None
+        if self.label_presence and self.label is not None:
+            target = self._df[self.label]
+            if self.label_code is None:
+                # Regression case: shape (n, 1) to get the same value as label_fn
+                self._labels = (
+                    pd.to_numeric(target, errors="coerce")
+                    .to_numpy(np.float32)
+                    .reshape(-1, 1)
+                )
+            else:
+                self._labels = (
+                    target.astype(str).map(self.label_code).to_numpy(np.float64)
+                )
+
+        self._domains = None
+        if "domain" in self._df.columns:
+            domain_code = {"t1": 0, "flair": 1}
+            self._domains = (
+                self._df["domain"].astype(str).map(domain_code).to_numpy(np.float64)
+            )
+
     def label_fn(self, target: Union[str, float, int]) -> Union[float, int]:
         """
         Returns the label value usable in criterion.
@@ -152,7 +223,24 @@ class CapsDataset(Dataset):
 
     def _get_image_path(self, participant: str, session: str, cohort: str) -> Path:
         """
-        Gets the path to the tensor image (*.pt)
+        Gets the path to the tensor image (*.pt) from the index built at initialization.
+        The CAPS is only explored if the session is absent from the index.
+
+        Args:
+            participant: ID of the participant.
+            session: ID of the session.
+            cohort: Name of the cohort.
+        Returns:
+            image_path: path to the tensor containing the whole image.
+        """
+        image_path = self.image_paths.get((cohort, participant, session))
+        if image_path is None:
+            image_path = self._find_image_path(participant, session, cohort)
+        return image_path
+
+    def _find_image_path(self, participant: str, session: str, cohort: str) -> Path:
+        """
+        Finds the path to the tensor image (*.pt) in the CAPS.
 
         Args:
             participant: ID of the participant.
@@ -186,7 +274,7 @@ class CapsDataset(Dataset):
             image_path = image_dir / image_filename
         # Try to find .pt file
         except ClinicaDLCAPSError:
-            file_type = self.preprocessing_dict["file_type"]
+            file_type = dict(self.preprocessing_dict["file_type"])
             file_type["pattern"] = file_type["pattern"].replace(".nii.gz", ".pt")
             results = clinicadl_file_reader(
                 [participant], [session], self.caps_dict[cohort], file_type
@@ -196,6 +284,205 @@ class CapsDataset(Dataset):
 
         return image_path
 
+    def _build_image_path_index(self) -> Dict[Tuple[str, str, str], Path]:
+        """
+        Resolves the paths of the tensor images of all the sessions of the dataset.
+
+        The index of each CAPS is persisted in its tensor_extraction folder, keyed by the
+        fields of the preprocessing dict used to find the images. Only the sessions absent
+        from this index are searched in the CAPS, using n_proc threads, and are then
+        added to the persisted index.
+
+        Returns:
+            dictionary linking (cohort, participant_id, session_id) to the path of the image tensor.
+        """
+        from joblib import Parallel, delayed
+
+        from clinicadl.utils.caps_dataset.path_index import (
+            compute_path_index_key,
+            read_path_index,
+            write_path_index,
+        )
+
+        def find_or_none(participant, session, cohort):
+            try:
+                return self._find_image_path(participant, session, cohort)
+            except (ClinicaDLCAPSError, IndexError):
+                # The error will be raised again if the session is accessed
+                return None
+
+        key = compute_path_index_key(self.preprocessing_dict)
+        sessions_df = self.df[["participant_id", "session_id", "cohort"]]
+        image_paths = dict()
+        for cohort, cohort_df in sessions_df.groupby("cohort", sort=False):
+            caps_path = self.caps_dict[cohort]
+            cohort_index = read_path_index(caps_path, key)
+            missing_sessions = [
+                (participant, session)
+                for participant, session in zip(
+                    cohort_df.participant_id, cohort_df.session_id
+                )
+                if (participant, session) not in cohort_index
+            ]
+            if len(missing_sessions) > 0:
+                logger.debug(
+                    f"Finding {len(missing_sessions)} image paths in CAPS {caps_path}."
+                )
+                found_paths = Parallel(n_jobs=self.n_proc, prefer="threads")(
+                    delayed(find_or_none)(participant, session, cohort)
+                    for participant, session in missing_sessions
+                )
+                new_paths = {
+                    sub_ses: image_path
+                    for sub_ses, image_path in zip(missing_sessions, found_paths)
+                    if image_path is not None
+                }
+                if len(new_paths) > 0:
+                    cohort_index.update(new_paths)
+                    write_path_index(caps_path, key, cohort_index)
+
+            for participant, session in zip(
+                cohort_df.participant_id, cohort_df.session_id
+            ):
+                if (participant, session) in cohort_index:
+                    image_paths[(cohort, participant, session)] = cohort_index[
+                        (participant, session)
+                    ]
+
+        return image_paths
+
+    @staticmethod
+    def _remove_baked_transforms(
+        transformations: Optional[Callable], preprocessing_dict: Dict[str, Any]
+    ) -> Optional[Callable]:
+        """
+        Removes the NaN removal, the normalization and the size reduction from the
+        transformations if they were already applied by prepare_data when the tensors
+        were saved, in this order, as done during training.
+
+        Args:
+            transformations: transformations applied during training and evaluation.
+            preprocessing_dict: preprocessing dict contained in the JSON file of prepare_data.
+        Returns:
+            the transformations to apply to the tensors.
+        """
+        factor = preprocessing_dict.get("size_reduction_factor")
+        if factor is None:
+            return transformations
+
+        baked_error = (
+            f"The tensors were normalized and reduced by a factor {factor} during "
+            f"prepare_data, please train with normalization and with the size "
+            f"reduction option set to a factor {factor}."
+        )
+        if not isinstance(transformations, transforms.Compose):
+            raise ClinicaDLConfigurationError(baked_error)
+        if not any(
+            isinstance(transformation, MinMaxNormalization)
+            for transformation in transformations.transforms
+        ):
+            raise ClinicaDLConfigurationError(baked_error)
+        reduction_factors = [
+            transformation.size_reduction_factor
+            for transformation in transformations.transforms
+            if isinstance(transformation, SizeReduction)
+        ]
+        if reduction_factors != [factor]:
+            raise ClinicaDLConfigurationError(baked_error)
+
+        logger.debug(
+            "The normalization and the size reduction were already applied "
+            "by prepare_data."
+        )
+        return transforms.Compose(
+            [
+                transformation
+                for transformation in transformations.transforms
+                if not isinstance(
+                    transformation, (NanRemoval, MinMaxNormalization, SizeReduction)
+                )
+            ]
+        )
+
+    def _load_tensor(self, tensor_path: Path, cohort: str) -> torch.Tensor:
+        """
+        Loads a tensor saved by prepare_data.
+
+        If the tensors were packed, the tensor is read from the packed store of the CAPS
+        without copy, otherwise it is loaded from its .pt file. Tensors saved in float16
+        are converted to float32.
+
+        Args:
+            tensor_path: path at which the tensor is saved in pt storage format.
+            cohort: Name of the cohort.
+        Returns:
+            the tensor.
+        """
+        packed_store = self.packed_stores[cohort]
+        tensor = None
+        if packed_store is not None:
+            key = Path(os.path.relpath(tensor_path, self.caps_dict[cohort])).as_posix()
+            if key in packed_store:
+                tensor = packed_store.load(key)
+        if tensor is None:
+            tensor = torch.load(tensor_path)
+        if tensor.dtype == torch.float16:
+            tensor = tensor.float()
+        return tensor
+
+    def _load_full_image(self, image_path: Path, cohort: str) -> torch.Tensor:
+        """
+        Loads the full image from which elements are extracted on-the-fly.
+
+        The last image_cache_size images prepared with _prepare_full_image are kept in memory,
+        so that the image is not loaded again for each of its elements. As each DataLoader
+        worker holds its own copy of the dataset, the cache is local to each worker.
+
+        Args:
+            image_path: path to the tensor containing the whole image.
+            cohort: Name of the cohort.
+        Returns:
+            the prepared image.
+        """
+        if self.image_cache_size <= 0:
+            return self._prepare_full_image(self._load_tensor(image_path, cohort))
+
+        worker_info = get_worker_info()
+        row = 0 if worker_info is None else worker_info.id + 1
+        row = row % IMAGE_CACHE_COUNTER_ROWS
+
+        key = (cohort, image_path.as_posix())
+        if key in self._image_cache:
+            self._image_cache.move_to_end(key)
+            self._image_cache_counts[row, 0] += 1
+            return self._image_cache[key]
+
+        self._image_cache_counts[row, 1] += 1
+        image = self._prepare_full_image(self._load_tensor(image_path, cohort))
+        self._image_cache[key] = image
+        if len(self._image_cache) > self.image_cache_size:
+            self._image_cache.popitem(last=False)
+        return image
+
+    def _prepare_full_image(self, image: torch.Tensor) -> torch.Tensor:
+        """Transforms the full image once before its elements are extracted."""
+        return image
+
+    def image_cache_info(self) -> Dict[str, int]:
+        """Returns the number of hits and misses of the image cache of all workers."""
+        hits, misses = self._image_cache_counts.sum(dim=0).tolist()
+        return {"hits": hits, "misses": misses}
+
+    def reset_image_cache_info(self):
+        """Resets the counters of the image cache."""
+        self._image_cache_counts.zero_()
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # Cached images are not copied to the DataLoader workers
+        state = self.__dict__.copy()
+        state["_image_cache"] = OrderedDict()
+        return state
+
     def _get_meta_data(self, idx: int) -> Tuple[str, str, str, int, int]:
         """
         Gets all meta data necessary to compute the path with _get_image_path
@@ -210,25 +497,30 @@ class CapsDataset(Dataset):
             label (str or float or int): value of the label to be used in criterion.
         """
         image_idx = idx // self.elem_per_image
-        participant = self.df.loc[image_idx, "participant_id"]
-        session = self.df.loc[image_idx, "session_id"]
-        cohort = self.df.loc[image_idx, "cohort"]
+        participant, session, cohort = (
+            self._meta_categories[column][self._meta_codes[column][image_idx]]
+            for column in ["participant_id", "session_id", "cohort"]
+        )
 
         if self.elem_index is None:
             elem_idx = idx % self.elem_per_image
         else:
             elem_idx = self.elem_index
-        if self.label_presence and self.label is not None:
-            target = self.df.loc[image_idx, self.label]
-            label = self.label_fn(target)
-        else:
+        if self._labels is None:
             label = -1
-
-        if "domain" in self.df.columns:
-            domain = self.df.loc[image_idx, "domain"]
-            domain = self.domain_fn(domain)
+        elif np.isnan(self._labels[image_idx]).any():
+            label = self.label_fn(self.df.iloc[image_idx][self.label])
+        elif self.label_code is None:
+            label = self._labels[image_idx].copy()
         else:
+            label = int(self._labels[image_idx])
+
+        if self._domains is None:
             domain = ""  # TO MODIFY
+        elif np.isnan(self._domains[image_idx]):
+            domain = self.domain_fn(self.df.iloc[image_idx]["domain"])
+        else:
+            domain = int(self._domains[image_idx])
         return participant, session, cohort, elem_idx, label, domain
 
     def _get_full_image(self) -> torch.Tensor:
@@ -249,13 +541,14 @@ class CapsDataset(Dataset):
 
         try:
             image_path = self._get_image_path(participant_id, session_id, cohort)
-            image = torch.load(image_path)
-        except IndexError:
+            image = self._load_tensor(image_path, cohort)
+        except (IndexError, FileNotFoundError):
+            # The image tensor may not be saved, for example if only the patches were packed
             file_type = self.preprocessing_dict["file_type"]
             results = clinicadl_file_reader(
                 [participant_id], [session_id], self.caps_dict[cohort], file_type
             )
-            image_nii = nib.load(results[0])
+            image_nii = nib.load(results[0][0])
             image_np = image_nii.get_fdata()
             image = ToTensor()(image_np)
 
@@ -285,6 +578,14 @@ class CapsDataset(Dataset):
         """Computes the number of elements per image based on the full image."""
         pass
 
+    @property
+    def eval_mode(self) -> bool:
+        return bool(self._eval_mode.item())
+
+    @eval_mode.setter
+    def eval_mode(self, value: bool):
+        self._eval_mode.fill_(value)
+
     def eval(self):
         """Put the dataset on evaluation mode (data augmentation is not performed)."""
         self.eval_mode = True
@@ -310,6 +611,7 @@ class CapsDatasetImage(CapsDataset):
         label_code: Dict[str, int] = None,
         all_transformations: Optional[Callable] = None,
         multi_cohort: bool = False,
+        n_proc: int = 1,
     ):
         """
         Args:
@@ -322,6 +624,7 @@ class CapsDatasetImage(CapsDataset):
             label_code: label code that links the output node number to label value.
             all_transformations: Optional transform to be applied during training and evaluation.
             multi_cohort: If True caps_directory is the path to a TSV file linking cohort names and paths.
+            n_proc: number of threads used to find the image paths absent from the path index.
 
         """
 
@@ -337,6 +640,7 @@ class CapsDatasetImage(CapsDataset):
             label_code=label_code,
             transformations=all_transformations,
             multi_cohort=multi_cohort,
+            n_proc=n_proc,
         )
 
     @property
@@ -347,7 +651,7 @@ class CapsDatasetImage(CapsDataset):
         participant, session, cohort, _, label, domain = self._get_meta_data(idx)
 
         image_path = self._get_image_path(participant, session, cohort)
-        image = torch.load(image_path)
+        image = self._load_tensor(image_path, cohort)
 
         if self.transformations:
             image = self.transformations(image)
@@ -384,6 +688,8 @@ class CapsDatasetPatch(CapsDataset):
         label_code: Dict[str, int] = None,
         all_transformations: Optional[Callable] = None,
         multi_cohort: bool = False,
+        n_proc: int = 1,
+        image_cache_size: int = 0,
     ):
         """
         Args:
@@ -398,6 +704,9 @@ class CapsDatasetPatch(CapsDataset):
             label_code: label code that links the output node number to label value.
             all_transformations: Optional transform to be applied during training and evaluation.
             multi_cohort: If True caps_directory is the path to a TSV file linking cohort names and paths.
+            n_proc: number of threads used to find the image paths absent from the path index.
+            image_cache_size: number of full images kept in memory by each worker when
+                elements are extracted on-the-fly.
 
         """
         self.patch_size = preprocessing_dict["patch_size"]
@@ -415,6 +724,8 @@ class CapsDatasetPatch(CapsDataset):
             label_code=label_code,
             transformations=all_transformations,
             multi_cohort=multi_cohort,
+            n_proc=n_proc,
+            image_cache_size=image_cache_size,
         )
 
     @property
@@ -434,12 +745,16 @@ class CapsDatasetPatch(CapsDataset):
             patch_filename = extract_patch_path(
                 image_path, self.patch_size, self.stride_size, patch_idx
             )
-            patch_tensor = torch.load(Path(patch_dir).resolve() / patch_filename)
+            patch_tensor = self._load_tensor(Path(patch_dir) / patch_filename, cohort)
 
         else:
-            image = torch.load(image_path)
+            patches_tensor = self._load_full_image(image_path, cohort)
             patch_tensor = extract_patch_tensor(
-                image, self.patch_size, self.stride_size, patch_idx
+                None,
+                self.patch_size,
+                self.stride_size,
+                patch_idx,
+                patches_tensor=patches_tensor,
             )
 
         if self.transformations:
@@ -463,18 +778,20 @@ class CapsDatasetPatch(CapsDataset):
             return 1
 
         image = self._get_full_image()
+        num_patches = self._prepare_full_image(image).shape[0]
+        return num_patches
 
+    def _prepare_full_image(self, image):
+        # Patches are unfolded once, then extracting a patch only requires indexing
         patches_tensor = (
             image.unfold(1, self.patch_size, self.stride_size)
             .unfold(2, self.patch_size, self.stride_size)
             .unfold(3, self.patch_size, self.stride_size)
             .contiguous()
         )
-        patches_tensor = patches_tensor.view(
+        return patches_tensor.view(
             -1, self.patch_size, self.patch_size, self.patch_size
         )
-        num_patches = patches_tensor.shape[0]
-        return num_patches
 
 
 class CapsDatasetRoi(CapsDataset):
@@ -490,6 +807,8 @@ class CapsDatasetRoi(CapsDataset):
         label_code: Dict[str, int] = None,
         all_transformations: Optional[Callable] = None,
         multi_cohort: bool = False,
+        n_proc: int = 1,
+        image_cache_size: int = 0,
     ):
         """
         Args:
@@ -504,6 +823,9 @@ class CapsDatasetRoi(CapsDataset):
             label_code: label code that links the output node number to label value.
             all_transformations: Optional transform to be applied during training and evaluation.
             multi_cohort: If True caps_directory is the path to a TSV file linking cohort names and paths.
+            n_proc: number of threads used to find the image paths absent from the path index.
+            image_cache_size: number of full images kept in memory by each worker when
+                elements are extracted on-the-fly.
 
         """
         self.roi_index = roi_index
@@ -524,6 +846,8 @@ class CapsDatasetRoi(CapsDataset):
             label_code=label_code,
             transformations=all_transformations,
             multi_cohort=multi_cohort,
+            n_proc=n_proc,
+            image_cache_size=image_cache_size,
         )
 
     @property
@@ -546,10 +870,10 @@ class CapsDatasetRoi(CapsDataset):
                 "image_based", f"{self.mode}_based"
             )
             roi_filename = extract_roi_path(image_path, mask_path, self.uncropped_roi)
-            roi_tensor = torch.load(Path(roi_dir) / roi_filename)
+            roi_tensor = self._load_tensor(Path(roi_dir) / roi_filename, cohort)
 
         else:
-            image = torch.load(image_path)
+            image = self._load_full_image(image_path, cohort)
             mask_array = self.mask_arrays[roi_idx]
             roi_tensor = extract_roi_tensor(image, mask_array, self.uncropped_roi)
 
@@ -652,6 +976,8 @@ class CapsDatasetSlice(CapsDataset):
         label_code: Dict[str, int] = None,
         all_transformations: Optional[Callable] = None,
         multi_cohort: bool = False,
+        n_proc: int = 1,
+        image_cache_size: int = 0,
     ):
         """
         Args:
@@ -666,6 +992,9 @@ class CapsDatasetSlice(CapsDataset):
             label_code: label code that links the output node number to label value.
             all_transformations: Optional transform to be applied during training and evaluation.
             multi_cohort: If True caps_directory is the path to a TSV file linking cohort names and paths.
+            n_proc: number of threads used to find the image paths absent from the path index.
+            image_cache_size: number of full images kept in memory by each worker when
+                elements are extracted on-the-fly.
         """
         self.slice_index = slice_index
         self.slice_direction = preprocessing_dict["slice_direction"]
@@ -689,6 +1018,8 @@ class CapsDatasetSlice(CapsDataset):
             label_code=label_code,
             transformations=all_transformations,
             multi_cohort=multi_cohort,
+            n_proc=n_proc,
+            image_cache_size=image_cache_size,
         )
 
     @property
@@ -709,11 +1040,10 @@ class CapsDatasetSlice(CapsDataset):
             slice_filename = extract_slice_path(
                 image_path, self.slice_direction, self.slice_mode, slice_idx
             )
-            slice_tensor = torch.load(Path(slice_dir) / slice_filename)
+            slice_tensor = self._load_tensor(Path(slice_dir) / slice_filename, cohort)
 
         else:
-            image_path = self._get_image_path(participant, session, cohort)
-            image = torch.load(image_path)
+            image = self._load_full_image(image_path, cohort)
             slice_tensor = extract_slice_tensor(
                 image, self.slice_direction, self.slice_mode, slice_idx
             )
@@ -749,6 +1079,121 @@ class CapsDatasetSlice(CapsDataset):
         )
 
 
+class CapsDatasetAllElements(Dataset):
+    """
+    Wraps a patch, roi or slice CapsDataset so that a sample gathers all the elements of an image.
+
+    It is used to train all the networks of a multi-network framework in the same data pass:
+    the full image is loaded once and each network is fed with its own element
+    (see get_element_batch).
+    """
+
+    def __init__(self, dataset: CapsDataset):
+        """
+        Args:
+            dataset: dataset returning all the elements of the images (elem_index is None).
+        """
+        if dataset.elem_index is not None:
+            raise ClinicaDLArgumentError(
+                "The dataset wrapped by CapsDatasetAllElements must return all the elements "
+                f"of the images, but it only returns the element {dataset.elem_index}."
+            )
+        self.dataset = dataset
+        # Elements are extracted one after the other from the same full image
+        self.dataset.image_cache_size = max(self.dataset.image_cache_size, 1)
+        self.num_elements = dataset.elem_per_image
+        # One sample per image, used by the samplers
+        self.elem_per_image = 1
+
+    @property
+    def df(self) -> pd.DataFrame:
+        return self.dataset.df
+
+    @property
+    def mode(self) -> str:
+        return self.dataset.mode
+
+    @property
+    def label(self) -> str:
+        return self.dataset.label
+
+    @property
+    def label_code(self) -> Dict[Any, int]:
+        return self.dataset.label_code
+
+    @property
+    def caps_dict(self) -> Dict[str, Path]:
+        return self.dataset.caps_dict
+
+    @property
+    def size(self) -> torch.Size:
+        return self.dataset.size
+
+    def label_fn(self, target: Union[str, float, int]) -> Union[float, int]:
+        return self.dataset.label_fn(target)
+
+    def image_cache_info(self) -> Dict[str, int]:
+        return self.dataset.image_cache_info()
+
+    def reset_image_cache_info(self):
+        self.dataset.reset_image_cache_info()
+
+    def __len__(self) -> int:
+        return len(self.dataset.df)
+
+    def __getitem__(self, idx: int) -> Dict[str, Any]:
+        """
+        Gets all the elements of an image.
+
+        Args:
+            idx: row number of the meta-data contained in self.df
+        Returns:
+            the same dictionary as the wrapped dataset, in which "image" stacks the elements
+            of the image and f"{self.mode}_id" is the tensor of their indices.
+        """
+        samples = [
+            self.dataset[idx * self.num_elements + elem_idx]
+            for elem_idx in range(self.num_elements)
+        ]
+        return {
+            "image": torch.stack([sample["image"] for sample in samples]),
+            "label": samples[0]["label"],
+            "participant_id": samples[0]["participant_id"],
+            "session_id": samples[0]["session_id"],
+            f"{self.mode}_id": torch.tensor(
+                [sample[f"{self.mode}_id"] for sample in samples]
+            ),
+        }
+
+    def eval(self):
+        """Put the dataset on evaluation mode (data augmentation is not performed)."""
+        self.dataset.eval()
+        return self
+
+    def train(self):
+        """Put the dataset on training mode (data augmentation is performed)."""
+        self.dataset.train()
+        return self
+
+
+def get_element_batch(data: Dict[str, Any], elem_idx: int, mode: str) -> Dict[str, Any]:
+    """
+    Selects one element of each image in a batch generated by a DataLoader on a CapsDatasetAllElements.
+
+    Args:
+        data: input batch in which the elements of each image are stacked.
+        elem_idx: index of the element selected.
+        mode: mode of the dataset (patch, roi or slice).
+    Returns:
+        the batch of the selected elements, as it would be generated on a CapsDataset
+        restricted to this element.
+    """
+    element_data = dict(data)
+    element_data["image"] = data["image"][:, elem_idx]
+    element_data[f"{mode}_id"] = data[f"{mode}_id"][:, elem_idx]
+    return element_data
+
+
 def return_dataset(
     input_dir: Path,
     data_df: pd.DataFrame,
@@ -760,6 +1205,8 @@ def return_dataset(
     cnn_index: int = None,
     label_presence: bool = True,
     multi_cohort: bool = False,
+    n_proc: int = 1,
+    image_cache_size: int = 0,
 ) -> CapsDataset:
     """
     Return appropriate Dataset according to given options.
@@ -774,15 +1221,35 @@ def return_dataset(
         cnn_index: Index of the CNN in a multi-CNN paradigm (optional).
         label_presence: If True the diagnosis will be extracted from the given DataFrame.
         multi_cohort: If True caps_directory is the path to a TSV file linking cohort names and paths.
+        n_proc: number of threads used to find the image paths absent from the path index.
+        image_cache_size: number of full images kept in memory by each worker when
+            elements are extracted on-the-fly (patch, roi and slice modes).
 
     Returns:
          the corresponding dataset.
+         If the preprocessing is 'synthetic', the images are generated in memory instead
+         of being read in input_dir (see clinicadl.utils.caps_dataset.synthetic).
     """
     if cnn_index is not None and preprocessing_dict["mode"] == "image":
         raise NotImplementedError(
             f"Multi-CNN is not implemented for {preprocessing_dict['mode']} mode."
         )
 
+    if preprocessing_dict.get("preprocessing") == "synthetic":
+        from clinicadl.utils.caps_dataset.synthetic import return_synthetic_dataset
+
+        return return_synthetic_dataset(
+            data_df,
+            preprocessing_dict,
+            all_transformations=all_transformations,
+            label=label,
+            label_code=label_code,
+            train_transformations=train_transformations,
+            cnn_index=cnn_index,
+            label_presence=label_presence,
+            image_cache_size=image_cache_size,
+        )
+
     if preprocessing_dict["mode"] == "image":
         return CapsDatasetImage(
             input_dir,
@@ -794,6 +1261,7 @@ def return_dataset(
             label=label,
             label_code=label_code,
             multi_cohort=multi_cohort,
+            n_proc=n_proc,
         )
     elif preprocessing_dict["mode"] == "patch":
         return CapsDatasetPatch(
@@ -807,6 +1275,8 @@ def return_dataset(
             label=label,
             label_code=label_code,
             multi_cohort=multi_cohort,
+            n_proc=n_proc,
+            image_cache_size=image_cache_size,
         )
     elif preprocessing_dict["mode"] == "roi":
         return CapsDatasetRoi(
@@ -820,6 +1290,8 @@ def return_dataset(
             label=label,
             label_code=label_code,
             multi_cohort=multi_cohort,
+            n_proc=n_proc,
+            image_cache_size=image_cache_size,
         )
     elif preprocessing_dict["mode"] == "slice":
         return CapsDatasetSlice(
@@ -833,6 +1305,8 @@ def return_dataset(
             label=label,
             label_code=label_code,
             multi_cohort=multi_cohort,
+            n_proc=n_proc,
+            image_cache_size=image_cache_size,
         )
     else:
         raise NotImplementedError(
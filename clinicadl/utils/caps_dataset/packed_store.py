@@ -0,0 +1,218 @@
+# coding: utf8
+
+import os
+from logging import getLogger
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import torch
+
+logger = getLogger("clinicadl")
+
+PACKED_INDEX_COLUMNS = ["tensor_path", "shard", "offset", "shape", "dtype"]
+DEFAULT_SHARD_SIZE = 2**30  # 1 GiB
+
+
+def get_packed_directory(caps_directory: Path, extract_json: str) -> Path:
+    """
+    Returns the folder of the packed tensor store associated to a preprocessing JSON file.
+
+    Args:
+        caps_directory: path to the CAPS folder.
+        extract_json: name of the JSON file of prepare_data.
+    Returns:
+        path to the folder containing the shards and the index of the store.
+    """
+    return caps_directory / "tensor_extraction" / "packed" / Path(extract_json).stem
+
+
+def _shard_filename(shard: int) -> str:
+    return f"shard-{shard:05d}.bin"
+
+
+class PackedTensorWriter:
+    """
+    Writes tensors contiguously in a few large shard files.
+
+    Each tensor is identified by the path, relative to the CAPS, at which it would have been
+    saved by prepare_data in the pt storage format. The position of each tensor in the shards
+    is written in index.tsv when the writer is closed. When the writer is used as a context
+    manager and an exception is raised, the shards are removed and no index is written.
+    """
+
+    def __init__(self, packed_directory: Path, shard_size: int = DEFAULT_SHARD_SIZE):
+        """
+        Args:
+            packed_directory: folder in which the store is written.
+            shard_size: size in bytes from which a new shard is started.
+        """
+        if (packed_directory / "index.tsv").is_file():
+            raise FileExistsError(
+                f"A packed tensor store already exists at {packed_directory}. "
+                f"Please choose another name for your preprocessing file."
+            )
+        packed_directory.mkdir(parents=True, exist_ok=True)
+        self.packed_directory = packed_directory
+        self.shard_size = shard_size
+        self.rows = list()
+        self.shard = -1
+        self.offset = 0
+        self.shard_file = None
+
+    def _open_next_shard(self):
+        if self.shard_file is not None:
+            self.shard_file.close()
+        self.shard += 1
+        self.offset = 0
+        self.shard_file = (self.packed_directory / _shard_filename(self.shard)).open(
+            "wb"
+        )
+
+    def write(self, tensor_path: str, tensor: torch.Tensor):
+        """
+        Appends a tensor to the current shard.
+
+        Args:
+            tensor_path: path of the tensor relative to the CAPS.
+            tensor: tensor to store.
+        """
+        array = np.ascontiguousarray(tensor.numpy())
+        if self.shard_file is None or (
+            self.offset > 0 and self.offset + array.nbytes > self.shard_size
+        ):
+            self._open_next_shard()
+
+        self.shard_file.write(array.tobytes())
+        self.rows.append(
+            [
+                tensor_path,
+                self.shard,
+                self.offset,
+                "x".join(str(dim) for dim in array.shape),
+                array.dtype.str,
+            ]
+        )
+        self.offset += array.nbytes
+
+    def close(self):
+        """Closes the current shard and writes the index of the store."""
+        if self.shard_file is not None:
+            self.shard_file.close()
+            self.shard_file = None
+
+        index_df = pd.DataFrame(self.rows, columns=PACKED_INDEX_COLUMNS)
+        index_path = self.packed_directory / "index.tsv"
+        tmp_path = index_path.with_name(f".{index_path.name}.{os.getpid()}")
+        index_df.to_csv(tmp_path, sep="\t", index=False)
+        os.replace(tmp_path, index_path)
+        logger.debug(
+            f"{len(self.rows)} tensors packed in {self.shard + 1} shards "
+            f"at {self.packed_directory}."
+        )
+
+    def _remove_shards(self):
+        """Removes the shards written so far, without writing the index."""
+        if self.shard_file is not None:
+            self.shard_file.close()
+            self.shard_file = None
+        for shard in range(self.shard + 1):
+            (self.packed_directory / _shard_filename(shard)).unlink(missing_ok=True)
+        if not any(self.packed_directory.iterdir()):
+            self.packed_directory.rmdir()
+        logger.debug(
+            f"The partial packed tensor store {self.packed_directory} was removed."
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self._remove_shards()
+
+
+class PackedTensorStore:
+    """
+    Reads the tensors written by PackedTensorWriter.
+
+    Each tensor is memory-mapped from its shard when it is loaded, so that it is not copied
+    and each DataLoader worker maps the shards on its own.
+    """
+
+    def __init__(self, packed_directory: Path):
+        """
+        Args:
+            packed_directory: folder in which the store was written.
+        """
+        index_path = packed_directory / "index.tsv"
+        if not index_path.is_file():
+            raise FileNotFoundError(
+                f"No packed tensor store was found at {packed_directory}. "
+                f"Please run prepare-data with the packed storage format first."
+            )
+        index_df = pd.read_csv(index_path, sep="\t", dtype={"tensor_path": str})
+        self.packed_directory = packed_directory
+        self.index: Dict[str, Tuple[int, int, Tuple[int, ...], str]] = {
+            tensor_path: (
+                int(shard),
+                int(offset),
+                tuple(int(dim) for dim in shape.split("x")),
+                dtype,
+            )
+            for tensor_path, shard, offset, shape, dtype in index_df[
+                PACKED_INDEX_COLUMNS
+            ].itertuples(index=False)
+        }
+
+    def __contains__(self, tensor_path: str) -> bool:
+        return tensor_path in self.index
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def keys(self) -> Iterable[str]:
+        return self.index.keys()
+
+    def load(self, tensor_path: str) -> torch.Tensor:
+        """
+        Args:
+            tensor_path: path of the tensor relative to the CAPS.
+        Returns:
+            the tensor.
+        """
+        shard, offset, shape, dtype = self.index[tensor_path]
+        # The mapping is copy-on-write, as transforms may work in place: the pages
+        # modified are private to the tensor and the shard is left untouched.
+        array = np.memmap(
+            self.packed_directory / _shard_filename(shard),
+            dtype=np.dtype(dtype),
+            mode="c",
+            offset=offset,
+            shape=shape,
+        )
+        return torch.from_numpy(array)
+
+
+def open_packed_store(
+    caps_directory: Path, preprocessing_dict: Dict[str, Any]
+) -> Optional[PackedTensorStore]:
+    """
+    Opens the packed tensor store of a CAPS if the preprocessing used the packed storage format.
+
+    Args:
+        caps_directory: path to the CAPS folder.
+        preprocessing_dict: preprocessing dict contained in the JSON file of prepare_data.
+    Returns:
+        the store, or None if the tensors were saved in individual .pt files.
+    """
+    if preprocessing_dict.get("storage_format", "pt") != "packed":
+        return None
+    packed_directory = get_packed_directory(
+        caps_directory, preprocessing_dict["extract_json"]
+    )
+    logger.debug(f"Reading tensors from the packed store at {packed_directory}.")
+    return PackedTensorStore(packed_directory)
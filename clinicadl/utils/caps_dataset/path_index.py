@@ -0,0 +1,115 @@
+# coding: utf8
+
+import hashlib
+import json
+import os
+from logging import getLogger
+from pathlib import Path
+from typing import Any, Dict, Tuple
+
+import pandas as pd
+
+logger = getLogger("clinicadl")
+
+PATH_INDEX_COLUMNS = ["participant_id", "session_id", "image_path"]
+
+
+def compute_path_index_key(preprocessing_dict: Dict[str, Any]) -> str:
+    """
+    Computes the key identifying the path index of a preprocessing.
+
+    Only the fields used to find the image tensors in the CAPS are taken into account,
+    so that all the preprocessing JSON files pointing to the same images share their index.
+
+    Args:
+        preprocessing_dict: preprocessing dict contained in the JSON file of prepare_data.
+    Returns:
+        the hexadecimal key of the index.
+    """
+    from clinicadl.prepare_data.prepare_data_utils import compute_folder_and_file_type
+
+    folder, _ = compute_folder_and_file_type(preprocessing_dict)
+    content = {
+        "folder": folder,
+        "pattern": preprocessing_dict["file_type"]["pattern"],
+    }
+    return hashlib.sha256(
+        json.dumps(content, sort_keys=True).encode("utf-8")
+    ).hexdigest()[:16]
+
+
+def get_path_index_path(caps_directory: Path, key: str) -> Path:
+    """Returns the location of the path index of key in caps_directory."""
+    return caps_directory / "tensor_extraction" / "path_index" / f"{key}.tsv"
+
+
+def read_path_index(caps_directory: Path, key: str) -> Dict[Tuple[str, str], Path]:
+    """
+    Reads the path index stored in a CAPS.
+
+    Args:
+        caps_directory: path to the CAPS folder.
+        key: key of the index computed with compute_path_index_key.
+    Returns:
+        dictionary linking (participant_id, session_id) to the path of the image tensor.
+        It is empty if no index was written before.
+    """
+    index_path = get_path_index_path(caps_directory, key)
+    if not index_path.is_file():
+        return dict()
+
+    index_df = pd.read_csv(index_path, sep="\t", dtype=str)
+    if not set(PATH_INDEX_COLUMNS).issubset(index_df.columns.values):
+        logger.warning(f"The path index {index_path} is corrupted and will be ignored.")
+        return dict()
+
+    logger.debug(f"Path index read at {index_path}.")
+    return {
+        (participant, session): caps_directory / image_path
+        for participant, session, image_path in zip(
+            index_df.participant_id, index_df.session_id, index_df.image_path
+        )
+    }
+
+
+def write_path_index(
+    caps_directory: Path, key: str, path_index: Dict[Tuple[str, str], Path]
+) -> None:
+    """
+    Writes the path index in a CAPS. Paths are written relatively to the CAPS
+    so that the index remains valid if the CAPS is moved.
+
+    The file is first written in a temporary file and then renamed, so that concurrent
+    processes never read a partially written index.
+    If the CAPS is not writable the index is not persisted.
+
+    Args:
+        caps_directory: path to the CAPS folder.
+        key: key of the index computed with compute_path_index_key.
+        path_index: dictionary linking (participant_id, session_id) to the path of the image tensor.
+    """
+    index_path = get_path_index_path(caps_directory, key)
+    rows = [
+        [
+            participant,
+            session,
+            Path(os.path.relpath(image_path, caps_directory)).as_posix(),
+        ]
+        for (participant, session), image_path in path_index.items()
+    ]
+    index_df = pd.DataFrame(rows, columns=PATH_INDEX_COLUMNS)
+    index_df.sort_values(["participant_id", "session_id"], inplace=True)
+
+    tmp_path = index_path.with_name(f".{index_path.name}.{os.getpid()}")
+    try:
+        index_path.parent.mkdir(parents=True, exist_ok=True)
+        index_df.to_csv(tmp_path, sep="\t", index=False)
+        os.replace(tmp_path, index_path)
+    except OSError as e:
+        logger.warning(
+            f"The path index could not be written at {index_path} ({e}). "
+            f"Image paths will be found again at the next run."
+        )
+        return
+
+    logger.debug(f"Path index written at {index_path}.")
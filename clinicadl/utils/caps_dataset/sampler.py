@@ -0,0 +1,71 @@
+# coding: utf8
+
+import math
+from typing import Iterator, Optional
+
+import torch
+from torch.utils.data import Sampler
+
+from clinicadl.utils.caps_dataset.data import CapsDataset
+
+
+class ImageGroupedSampler(Sampler):
+    """
+    Samples all the elements of an image consecutively.
+
+    The order of the images and the order of the elements inside each image are shuffled,
+    but the elements of one image are never interleaved with those of another one.
+    Consecutive indices then hit the image cache of the dataset when elements are extracted
+    on-the-fly.
+
+    As for DistributedSampler, the images are split between the processes of data parallelism,
+    and set_epoch must be called at the beginning of each epoch to change the order.
+    """
+
+    def __init__(
+        self,
+        dataset: CapsDataset,
+        num_replicas: Optional[int] = None,
+        rank: Optional[int] = None,
+        seed: int = 0,
+    ):
+        """
+        Args:
+            dataset: the dataset to sample from.
+            num_replicas: the degree of data parallelism.
+            rank: process id within the data parallelism communicator.
+            seed: seed of the random permutations, shared by all the processes.
+        """
+        self.n_images = len(dataset.df)
+        self.elem_per_image = dataset.elem_per_image
+        self.num_replicas = 1 if num_replicas is None else num_replicas
+        self.rank = 0 if rank is None else rank
+        self.seed = seed
+        self.epoch = 0
+        # All processes must sample the same number of images
+        self.images_per_replica = math.ceil(self.n_images / self.num_replicas)
+
+    def __iter__(self) -> Iterator[int]:
+        generator = torch.Generator()
+        generator.manual_seed(self.seed + self.epoch)
+
+        image_indices = torch.randperm(self.n_images, generator=generator).tolist()
+        total_size = self.images_per_replica * self.num_replicas
+        padding_size = total_size - len(image_indices)
+        image_indices += (
+            image_indices * math.ceil(padding_size / max(len(image_indices), 1))
+        )[:padding_size]
+        image_indices = image_indices[self.rank : total_size : self.num_replicas]
+
+        for image_idx in image_indices:
+            for elem_idx in torch.randperm(
+                self.elem_per_image, generator=generator
+            ).tolist():
+                yield image_idx * self.elem_per_image + elem_idx
+
+    def __len__(self) -> int:
+        return self.images_per_replica * self.elem_per_image
+
+    def set_epoch(self, epoch: int):
+        """Sets the epoch used to compute the permutations."""
+        self.epoch = epoch
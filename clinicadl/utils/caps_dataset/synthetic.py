@@ -0,0 +1,418 @@
+# coding: utf8
+
+"""
+Synthetic datasets generated in memory.
+
+The images are never written on disk: each image is generated on the fly from the seed
+of the dataset and its index, so that two loadings of the same image give the same tensor
+whatever the DataLoader worker, the order of the iteration or the split in which it is
+loaded. These datasets allow to measure the speed of the data pipeline and of the models
+without the cost of the generation and of the reading of a CAPS.
+"""
+
+import random
+from functools import lru_cache
+from logging import getLogger
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+import torch
+
+from clinicadl.utils.caps_dataset.data import (
+    CapsDataset,
+    CapsDatasetImage,
+    CapsDatasetPatch,
+    CapsDatasetRoi,
+    CapsDatasetSlice,
+)
+from clinicadl.utils.exceptions import ClinicaDLArgumentError
+
+logger = getLogger("clinicadl.synthetic")
+
+SYNTHETIC_GENERATORS = ["random", "trivial", "shepplogan"]
+SYNTHETIC_REGIONS = ["left", "right", "center"]
+SYNTHETIC_FOLDER = Path("synthetic")
+# Diagnoses of the synthetic images, the diagnosis of an image is given by its index
+SYNTHETIC_DIAGNOSES = ["AD", "CN"]
+
+
+def synthetic_preprocessing_dict(
+    mode: str,
+    generator: str = "trivial",
+    image_size: Sequence[int] = (169, 208, 179),
+    seed: int = 0,
+    atrophy_percent: float = 60,
+    noise_std: float = 0.05,
+    patch_size: int = 50,
+    stride_size: int = 50,
+    slice_direction: int = 0,
+    slice_mode: str = "rgb",
+    discarded_slices: Sequence[int] = (0, 0),
+    roi_list: Sequence[str] = ("left", "right"),
+    uncropped_roi: bool = False,
+) -> Dict[str, Any]:
+    """
+    Builds the preprocessing dict of a synthetic dataset, which replaces the JSON file
+    written by prepare_data.
+
+    Args:
+        mode: type of the elements of the dataset (image, patch, roi or slice).
+        generator: type of the synthetic images (random, trivial or shepplogan).
+        image_size: spatial shape of the images (D, H, W).
+        seed: seed of the dataset, from which the seed of each image is derived.
+        atrophy_percent: percentage of atrophy of the trivial images.
+        noise_std: standard deviation of the Gaussian noise added to the images.
+        patch_size: size of the patches (patch mode).
+        stride_size: stride between the patches (patch mode).
+        slice_direction: axis along which the slices are extracted (slice mode).
+        slice_mode: 'rgb' or 'single' (slice mode).
+        discarded_slices: number of slices discarded at the beginning and end of the
+            image (slice mode).
+        roi_list: regions extracted from the images, among left, right and center (roi mode).
+        uncropped_roi: if True the regions are not cropped (roi mode).
+    Returns:
+        the preprocessing dict.
+    Raises:
+        ClinicaDLArgumentError: if the generator, the size of the images or a region is not valid.
+    """
+    if generator not in SYNTHETIC_GENERATORS:
+        raise ClinicaDLArgumentError(
+            f"Synthetic generator {generator} does not exist. "
+            f"Please choose among {SYNTHETIC_GENERATORS}."
+        )
+    if len(image_size) != 3 or min(image_size) < 1:
+        raise ClinicaDLArgumentError(
+            f"The size of the synthetic images must be 3 positive integers, got {image_size}."
+        )
+
+    preprocessing_dict = {
+        "preprocessing": "synthetic",
+        "mode": mode,
+        "prepare_dl": False,
+        "synthetic": {
+            "generator": generator,
+            "image_size": [int(size) for size in image_size],
+            "seed": seed,
+            "atrophy_percent": atrophy_percent,
+            "noise_std": noise_std,
+        },
+    }
+    if mode == "patch":
+        preprocessing_dict.update(patch_size=patch_size, stride_size=stride_size)
+    elif mode == "slice":
+        preprocessing_dict.update(
+            slice_direction=slice_direction,
+            slice_mode=slice_mode,
+            discarded_slices=list(discarded_slices),
+        )
+    elif mode == "roi":
+        unknown_regions = set(roi_list) - set(SYNTHETIC_REGIONS)
+        if len(unknown_regions) > 0:
+            raise ClinicaDLArgumentError(
+                f"Synthetic regions {sorted(unknown_regions)} do not exist. "
+                f"Please choose among {SYNTHETIC_REGIONS}."
+            )
+        preprocessing_dict.update(roi_list=list(roi_list), uncropped_roi=uncropped_roi)
+    elif mode != "image":
+        raise ClinicaDLArgumentError(f"Mode {mode} is not implemented.")
+
+    return preprocessing_dict
+
+
+def synthetic_data_df(n_images: int) -> pd.DataFrame:
+    """
+    Builds the list of the sessions of a synthetic dataset.
+
+    The images of even index are AD and the others are CN, the age is only used as label
+    of regression tasks. The index of each image is kept in the synthetic_index column,
+    so that the images do not change when the DataFrame is split.
+
+    Args:
+        n_images: number of images of the dataset.
+    Returns:
+        DataFrame with columns participant_id, session_id, cohort, diagnosis, age
+        and synthetic_index.
+    """
+    indices = np.arange(n_images)
+    return pd.DataFrame(
+        {
+            "participant_id": [f"sub-SYN{index:05d}" for index in indices],
+            "session_id": "ses-M000",
+            "cohort": "single",
+            "diagnosis": [SYNTHETIC_DIAGNOSES[index % 2] for index in indices],
+            "age": 60.0 + (indices * 7) % 30,
+            "synthetic_index": indices,
+        }
+    )
+
+
+@lru_cache(maxsize=4)
+def _brain_template(image_size: Tuple[int, int, int]) -> np.ndarray:
+    """Smooth ellipsoid standing for the brain of the trivial images, built once per size."""
+    from scipy.ndimage import gaussian_filter
+
+    grids = np.ogrid[tuple(slice(0, size) for size in image_size)]
+    distance = sum(
+        ((grid - (size - 1) / 2) / (0.4 * size)) ** 2
+        for grid, size in zip(grids, image_size)
+    )
+    template = (distance <= 1).astype(np.float32)
+    # Inner structure darker than the rest of the brain
+    template[distance <= 0.2] = 0.5
+    template = gaussian_filter(template, sigma=1)
+    template.setflags(write=False)
+    return template
+
+
+def synthetic_region_mask(region: str, image_size: Sequence[int]) -> np.ndarray:
+    """
+    Builds the binary mask of a region of the synthetic images.
+
+    Args:
+        region: left (first half of the first axis), right (second half of the first axis)
+            or center (central half of the first axis). The cropped regions are of the same
+            size, so that they can be batched together.
+        image_size: spatial shape of the images (D, H, W).
+    Returns:
+        the mask as a float array of shape image_size.
+    """
+    mask = np.zeros(image_size, dtype=np.float32)
+    half = image_size[0] // 2
+    if region == "left":
+        mask[:half] = 1
+    elif region == "right":
+        mask[half:] = 1
+    elif region == "center":
+        mask[half // 2 : half // 2 + half] = 1
+    else:
+        raise ClinicaDLArgumentError(
+            f"Synthetic region {region} does not exist. "
+            f"Please choose among {SYNTHETIC_REGIONS}."
+        )
+    return mask
+
+
+@lru_cache(maxsize=8)
+def _trivial_template(
+    image_size: Tuple[int, int, int], region: str, atrophy_percent: float
+) -> np.ndarray:
+    """Brain template atrophied in region, built once per class."""
+    mask = synthetic_region_mask(region, image_size)
+    template = _brain_template(image_size) * (1 - atrophy_percent / 100 * mask)
+    template.setflags(write=False)
+    return template
+
+
+def _shepplogan_volume(
+    image_size: Tuple[int, int, int], subtype: int, seed: int
+) -> np.ndarray:
+    """
+    Stacks a Shepp-Logan phantom along the last axis, so that the axial slices
+    (slice_direction 2) are the phantoms of clinicadl generate shepplogan.
+    """
+    from clinicadl.generate.generate_utils import generate_shepplogan_phantom
+
+    # The phantoms are drawn with the global generators of random and NumPy,
+    # their states are restored after the drawing
+    state, np_state = random.getstate(), np.random.get_state()
+    random.seed(seed)
+    np.random.seed(seed)
+    try:
+        phantom_size = min(image_size[:2])
+        phantom = generate_shepplogan_phantom(phantom_size, label=subtype)
+    finally:
+        random.setstate(state)
+        np.random.set_state(np_state)
+
+    plane = np.zeros(image_size[:2], dtype=np.float32)
+    offsets = [(size - phantom_size) // 2 for size in image_size[:2]]
+    plane[
+        offsets[0] : offsets[0] + phantom_size, offsets[1] : offsets[1] + phantom_size
+    ] = phantom
+    return np.repeat(plane[:, :, np.newaxis], image_size[2], axis=2)
+
+
+def generate_synthetic_image(
+    synthetic_dict: Dict[str, Any], index: int
+) -> torch.Tensor:
+    """
+    Generates a synthetic image. The image only depends on the parameters and on its index.
+
+    - random: Gaussian noise,
+    - trivial: smooth ellipsoid in which one half is atrophied, the left half for AD images
+      (even index) and the right half for CN images (odd index), as in clinicadl generate trivial,
+    - shepplogan: Shepp-Logan phantom of clinicadl generate shepplogan. CN images are of
+      subtype 0, and AD images alternate between subtypes 1 and 2.
+
+    Args:
+        synthetic_dict: 'synthetic' item of the preprocessing dict.
+        index: index of the image.
+    Returns:
+        the image as a float tensor of shape (1, D, H, W).
+    """
+    generator = synthetic_dict["generator"]
+    image_size = tuple(synthetic_dict["image_size"])
+    rng = np.random.default_rng([synthetic_dict["seed"], index])
+    label = index % 2
+
+    if generator == "random":
+        image = rng.standard_normal(image_size, dtype=np.float32)
+    elif generator == "trivial":
+        region = "left" if label == 0 else "right"
+        image = _trivial_template(
+            image_size, region, synthetic_dict["atrophy_percent"]
+        ) + synthetic_dict["noise_std"] * rng.standard_normal(
+            image_size, dtype=np.float32
+        )
+    elif generator == "shepplogan":
+        subtype = 0 if label == 1 else 1 + (index // 2) % 2
+        phantom_seed = int(rng.integers(2**32))
+        image = _shepplogan_volume(image_size, subtype, phantom_seed)
+        image += synthetic_dict["noise_std"] * rng.standard_normal(
+            image_size, dtype=np.float32
+        )
+    else:
+        raise ClinicaDLArgumentError(
+            f"Synthetic generator {generator} does not exist. "
+            f"Please choose among {SYNTHETIC_GENERATORS}."
+        )
+
+    return torch.from_numpy(image).unsqueeze(0)
+
+
+class SyntheticMixin:
+    """
+    Replaces the reading of the CAPS of a CapsDataset by the generation of synthetic images.
+
+    The image path of a session is synthetic/<index>, where index is read from the
+    synthetic_index column of the DataFrame if it exists, else it is the row of the session.
+    """
+
+    @staticmethod
+    def create_caps_dict(caps_directory: Path, multi_cohort: bool) -> Dict[str, Path]:
+        if caps_directory is None:
+            caps_directory = SYNTHETIC_FOLDER
+        return {"single": Path(caps_directory)}
+
+    def _build_image_path_index(self) -> Dict[Tuple[str, str, str], Path]:
+        if "synthetic_index" in self.df.columns:
+            indices = self.df.synthetic_index
+        else:
+            indices = range(len(self.df))
+        return {
+            (cohort, participant, session): SYNTHETIC_FOLDER / str(int(index))
+            for cohort, participant, session, index in zip(
+                self.df.cohort, self.df.participant_id, self.df.session_id, indices
+            )
+        }
+
+    def _find_image_path(self, participant: str, session: str, cohort: str) -> Path:
+        raise IndexError(
+            f"Session {participant} {session} of cohort {cohort} is not in the synthetic dataset."
+        )
+
+    def _load_tensor(self, tensor_path: Path, cohort: str) -> torch.Tensor:
+        return generate_synthetic_image(
+            self.preprocessing_dict["synthetic"], int(tensor_path.name)
+        )
+
+    def _get_mask_paths_and_tensors(
+        self,
+        caps_directory: Path,
+        multi_cohort: bool,
+        preprocessing_dict: Dict[str, Any],
+    ) -> Tuple[List[Path], List[np.ndarray]]:
+        image_size = preprocessing_dict["synthetic"]["image_size"]
+        mask_paths, mask_arrays = list(), list()
+        for roi in self.roi_list:
+            mask_paths.append(SYNTHETIC_FOLDER / f"mask-{roi}")
+            mask_arrays.append(synthetic_region_mask(roi, image_size))
+        return mask_paths, mask_arrays
+
+
+class SyntheticCapsDatasetImage(SyntheticMixin, CapsDatasetImage):
+    """Dataset of synthetic images."""
+
+
+class SyntheticCapsDatasetPatch(SyntheticMixin, CapsDatasetPatch):
+    """Dataset of patches extracted from synthetic images."""
+
+
+class SyntheticCapsDatasetRoi(SyntheticMixin, CapsDatasetRoi):
+    """Dataset of regions extracted from synthetic images."""
+
+
+class SyntheticCapsDatasetSlice(SyntheticMixin, CapsDatasetSlice):
+    """Dataset of slices extracted from synthetic images."""
+
+
+def return_synthetic_dataset(
+    data_df: pd.DataFrame,
+    preprocessing_dict: Dict[str, Any],
+    all_transformations: Optional[Any] = None,
+    label: str = None,
+    label_code: Dict[str, int] = None,
+    train_transformations: Optional[Any] = None,
+    cnn_index: int = None,
+    label_presence: bool = True,
+    image_cache_size: int = 0,
+) -> CapsDataset:
+    """
+    Returns the synthetic dataset corresponding to the mode of preprocessing_dict.
+    It is called by return_dataset when the preprocessing is 'synthetic'.
+
+    Args:
+        data_df: List subjects, sessions and diagnoses (see synthetic_data_df).
+        preprocessing_dict: preprocessing dict built with synthetic_preprocessing_dict.
+        all_transformations: Optional transform to be applied during training and evaluation.
+        label: Name of the column in data_df containing the label.
+        label_code: label code that links the output node number to label value.
+        train_transformations: Optional transform to be applied during training only.
+        cnn_index: Index of the CNN in a multi-CNN paradigm (optional).
+        label_presence: If True the diagnosis will be extracted from the given DataFrame.
+        image_cache_size: number of full images kept in memory by each worker when
+            elements are extracted on-the-fly (patch, roi and slice modes).
+    Returns:
+        the corresponding dataset.
+    """
+    mode = preprocessing_dict["mode"]
+    kwargs = dict(
+        train_transformations=train_transformations,
+        all_transformations=all_transformations,
+        label_presence=label_presence,
+        label=label,
+        label_code=label_code,
+    )
+    if mode == "image":
+        return SyntheticCapsDatasetImage(None, data_df, preprocessing_dict, **kwargs)
+    elif mode == "patch":
+        return SyntheticCapsDatasetPatch(
+            None,
+            data_df,
+            preprocessing_dict,
+            patch_index=cnn_index,
+            image_cache_size=image_cache_size,
+            **kwargs,
+        )
+    elif mode == "roi":
+        return SyntheticCapsDatasetRoi(
+            None,
+            data_df,
+            preprocessing_dict,
+            roi_index=cnn_index,
+            image_cache_size=image_cache_size,
+            **kwargs,
+        )
+    elif mode == "slice":
+        return SyntheticCapsDatasetSlice(
+            None,
+            data_df,
+            preprocessing_dict,
+            slice_index=cnn_index,
+            image_cache_size=image_cache_size,
+            **kwargs,
+        )
+    else:
+        raise ClinicaDLArgumentError(f"Mode {mode} is not implemented.")
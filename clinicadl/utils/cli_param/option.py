@@ -116,6 +116,20 @@ amp = click.option(
     type=bool,
     help="Enables automatic mixed precision during training and inference.",
 )
+pin_memory = click.option(
+    "--pin_memory/--no-pin_memory",
+    type=bool,
+    default=None,
+    help="Copy the batches in page-locked memory to speed up their transfer to the GPU. "
+    "Default uses the same value as in training step.",
+)
+prefetch_factor = click.option(
+    "--prefetch_factor",
+    type=int,
+    default=None,
+    help="Number of batches loaded in advance by each data loading worker. "
+    "Default uses the same value as in training step.",
+)
 
 # Extract
 save_features = click.option(
@@ -126,6 +140,38 @@ save_features = click.option(
     help="""Extract the selected mode to save the tensor. By default, the pipeline only save images and the mode extraction
             is done when images are loaded in the train.""",
 )
+storage_format = click.option(
+    "--storage_format",
+    type=click.Choice(["pt", "packed"]),
+    default="pt",
+    show_default=True,
+    help="""Format used to save the tensors. `pt` saves each tensor in its own .pt file in the CAPS
+            subjects folders, `packed` writes all the tensors in a few large memory-mapped shards in
+            the tensor_extraction folder of the CAPS.""",
+)
+size_reduction_factor = click.option(
+    "--size_reduction_factor",
+    type=click.IntRange(2, 5),
+    default=None,
+    help="""Normalize, crop and downsample the images by this factor before saving them, as done by
+            the size_reduction option of train. These steps are then skipped during training.""",
+)
+tensor_dtype = click.option(
+    "--tensor_dtype",
+    type=click.Choice(["float32", "float16"]),
+    default="float32",
+    show_default=True,
+    help="""Type of the saved tensors. float16 halves the size of the tensors, which are converted
+            back to float32 when they are loaded.""",
+)
+skip_existing = click.option(
+    "--skip_existing",
+    is_flag=True,
+    default=False,
+    help="""Skip the images whose tensors were already extracted with the same parameters
+            from an unchanged NIfTI file (same size and modification time). Only available
+            with the pt storage format.""",
+)
 subjects_sessions_tsv = click.option(
     "-tsv",
     "--subjects_sessions_tsv",
@@ -3,6 +3,9 @@ from click_option_group import OptionGroup
 computational_group = OptionGroup(
     "Computational options", help="Context for runtime execution."
 )
+dataloader_group = OptionGroup(
+    "DataLoader options", help="Options related to the performance of data loading."
+)
 reproducibility_group = OptionGroup(
     "Reproducibility options", help="Allow to setup a deterministic setting."
 )
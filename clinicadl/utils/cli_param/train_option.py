@@ -55,11 +55,60 @@ fully_sharded_data_parallel = cli_param.option_group.computational_group.option(
     default=False,
 )
 
+train_metrics = cli_param.option_group.computational_group.option(
+    "--train_metrics",
+    type=click.Choice(["full", "running", "subset", "skip"]),
+    # default="full",
+    help="Method used to compute the metrics on the training set at each evaluation. "
+    "`full` evaluates the whole training set, `running` uses the predictions made during the epoch, "
+    "`subset` evaluates a random subset of the training set fixed for all the epochs "
+    "and `skip` does not compute them.",
+)
+train_metrics_subset_size = cli_param.option_group.computational_group.option(
+    "--train_metrics_subset_size",
+    type=int,
+    # default=1000,
+    help="Number of elements of the training set evaluated when train_metrics is `subset`.",
+)
+image_cache_size = cli_param.option_group.computational_group.option(
+    "--image_cache_size",
+    type=int,
+    # default=0,
+    help="Number of full images kept in memory by each data loading worker when patches, "
+    "slices or regions are extracted on-the-fly. Default does not cache images.",
+)
+parallel_splits = cli_param.option_group.computational_group.option(
+    "--parallel_splits",
+    type=int,
+    # default=1,
+    help="Number of splits trained at the same time in separate processes on CPU. "
+    "The CPU cores are shared between the splits. Default trains the splits one after the other.",
+)
 amp = cli_param.option_group.computational_group.option(
     "--amp/--no-amp",
     type=bool,
     help="Enables automatic mixed precision during training and inference.",
 )
+# DataLoader
+pin_memory = cli_param.option_group.dataloader_group.option(
+    "--pin_memory/--no-pin_memory",
+    type=bool,
+    default=None,
+    help="Copy the batches in page-locked memory to speed up their transfer to the GPU.",
+)
+persistent_workers = cli_param.option_group.dataloader_group.option(
+    "--persistent_workers/--no-persistent_workers",
+    type=bool,
+    default=None,
+    help="Keep the data loading workers alive between epochs and evaluations "
+    "instead of spawning new ones each time the data is read.",
+)
+prefetch_factor = cli_param.option_group.dataloader_group.option(
+    "--prefetch_factor",
+    type=int,
+    # default=2,
+    help="Number of batches loaded in advance by each data loading worker. Only used if n_proc > 0.",
+)
 # Reproducibility
 seed = cli_param.option_group.reproducibility_group.option(
     "--seed",
@@ -101,6 +150,14 @@ multi_network = cli_param.option_group.model_group.option(
     default=None,
     help="If provided uses a multi-network framework.",
 )
+joint_multi_network = cli_param.option_group.model_group.option(
+    "--joint_multi_network/--sequential_multi_network",
+    type=bool,
+    default=None,
+    help="If provided, all the networks of a multi-network framework are trained in the "
+    "same data pass: each image is loaded once per epoch and each of its elements is fed "
+    "to its own network. Otherwise the networks are trained one after the other.",
+)
 ssda_network = cli_param.option_group.model_group.option(
     "--ssda_network/--single_network",
     type=bool,
@@ -220,9 +277,10 @@ data_augmentation = cli_param.option_group.data_group.option(
 sampler = cli_param.option_group.data_group.option(
     "--sampler",
     "-s",
-    type=click.Choice(["random", "weighted"]),
+    type=click.Choice(["random", "weighted", "grouped"]),
     # default="random",
-    help="Sampler used to load the training data set.",
+    help="Sampler used to load the training data set. "
+    "`grouped` loads all the elements of an image consecutively.",
 )
 caps_target = cli_param.option_group.data_group.option(
     "--caps_target",
@@ -347,6 +405,13 @@ profiler = cli_param.option_group.optimization_group.option(
     help="Use `--profiler` to enable Pytorch profiler for the first 30 steps after a short warmup. "
     "It will make an execution trace and some statistics about the CPU and GPU usage.",
 )
+checkpoint_frequency = cli_param.option_group.optimization_group.option(
+    "--checkpoint_frequency",
+    type=int,
+    # default=1,
+    help="Number of epochs between two writings of the checkpoint used to resume the training. "
+    "The checkpoint of the last epoch and the best models are always written.",
+)
 track_exp = cli_param.option_group.optimization_group.option(
     "--track_exp",
     "-te",
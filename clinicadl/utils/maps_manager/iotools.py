@@ -1,6 +1,9 @@
 # coding: utf8
 import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path, PosixPath
+from typing import List
 
 from clinicadl.utils.exceptions import ClinicaDLArgumentError
 
@@ -10,6 +13,99 @@ LOG_LEVELS = [logging.WARNING, logging.INFO, logging.DEBUG]
 computational_list = ["gpu", "batch_size", "n_proc", "evaluation_steps"]
 
 
+class AsyncWriter:
+    """
+    Runs writing functions (torch.save, nib.save...) in a pool of background threads,
+    so that disk writes overlap with the computations of the main thread.
+
+    The number of pending writes is bounded to limit the memory held by the objects
+    waiting to be written. Exceptions raised by a write are raised again in the main
+    thread by the next call to submit or wait.
+    """
+
+    def __init__(self, n_threads: int = 4, max_pending: int = None):
+        """
+        Args:
+            n_threads: number of writing threads.
+            max_pending: maximum number of pending writes. Default is 4 per thread.
+        """
+        self.executor = ThreadPoolExecutor(max_workers=n_threads)
+        self.max_pending = 4 * n_threads if max_pending is None else max_pending
+        self.futures = deque()
+
+    def submit(self, write_fn, *args, **kwargs):
+        """Schedules write_fn(*args, **kwargs), waits first if too many writes are pending."""
+        while len(self.futures) >= self.max_pending:
+            self.futures.popleft().result()
+        self.futures.append(self.executor.submit(write_fn, *args, **kwargs))
+
+    def wait(self):
+        """Waits for all the pending writes."""
+        while self.futures:
+            self.futures.popleft().result()
+
+    def close(self):
+        self.wait()
+        self.executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            # Do not hide the original exception with a writing one
+            self.executor.shutdown(cancel_futures=True)
+
+
+def snapshot_to_cpu(obj):
+    """
+    Copies all the tensors of a (nested) state dictionary to CPU, so that the copy is
+    not modified by the following training steps while it is being written.
+    """
+    import torch
+
+    if isinstance(obj, torch.Tensor):
+        return obj.detach().to("cpu", copy=True)
+    if isinstance(obj, dict):
+        return {key: snapshot_to_cpu(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(snapshot_to_cpu(value) for value in obj)
+    return obj
+
+
+def save_and_link(obj, paths: List[Path]):
+    """
+    Saves obj with torch.save in the first path, the other paths are hard links to this file
+    (or copies if the file system does not support hard links).
+
+    Each file is written under a temporary name then renamed, so an interrupted write never
+    leaves a corrupted file and files linked to a previous version are not modified.
+
+    Args:
+        obj: object saved.
+        paths: paths of the files written.
+    """
+    import os
+    import shutil
+
+    import torch
+
+    for i, path in enumerate(paths):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f".{path.name}.tmp")
+        tmp_path.unlink(missing_ok=True)
+        if i == 0:
+            torch.save(obj, tmp_path)
+        else:
+            try:
+                os.link(paths[0], tmp_path)
+            except OSError:
+                shutil.copyfile(paths[0], tmp_path)
+        os.replace(tmp_path, path)
+
+
 def write_requirements_version(output_path: Path):
     import subprocess
     from warnings import warn
@@ -17,6 +17,7 @@ class LogWriter:
         resume=False,
         beginning_epoch=0,
         network=None,
+        train_metrics="full",
     ):
         from time import time
 
@@ -33,6 +34,8 @@ class LogWriter:
 
         self.evaluation_metrics = evaluation_metrics
         self.maps_path = maps_path
+        # Metrics on the training set are left empty if they are not computed
+        self.train_metrics = train_metrics
 
         self.file_dir = self.maps_path / f"split-{split}" / "training_logs"
         if network is not None:
@@ -71,7 +74,7 @@ class LogWriter:
         Args:
             epoch (int): current epoch number
             i (int): current iteration number
-            metrics_train (Dict[str:float]): metrics on the training set
+            metrics_train (Dict[str:float]): metrics on the training set (ignored if train_metrics is skip)
             metrics_valid (Dict[str:float]): metrics on the validation set
             len_epoch (int): number of iterations in an epoch
         """
@@ -86,6 +89,8 @@ class LogWriter:
         general_row = [epoch, i, t_current]
         train_row = list()
         valid_row = list()
+        if self.train_metrics == "skip":
+            metrics_train = {key: np.nan for key in metrics_valid}
         for selection in self.evaluation_metrics:
             if selection in metrics_train:
                 train_row.append(metrics_train[selection])
@@ -113,11 +118,12 @@ class LogWriter:
         # Write tensorboard logs
         global_step = i + epoch * len_epoch
         for metric_idx, metric in enumerate(self.evaluation_metrics):
-            self.writer_train.add_scalar(
-                metric,
-                train_row[metric_idx],
-                global_step,
-            )
+            if self.train_metrics != "skip":
+                self.writer_train.add_scalar(
+                    metric,
+                    train_row[metric_idx],
+                    global_step,
+                )
             self.writer_valid.add_scalar(
                 metric,
                 valid_row[metric_idx],
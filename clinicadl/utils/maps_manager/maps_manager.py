@@ -1,25 +1,35 @@
 import json
+import os
 import shutil
 import subprocess
+from collections import defaultdict
 from contextlib import nullcontext
 from datetime import datetime
-from logging import getLogger
+from logging import DEBUG, getLogger, getLogRecordFactory, setLogRecordFactory
 from pathlib import Path
+from time import perf_counter, time
 from typing import Any, Dict, List, Optional, Tuple, Union
 
 import pandas as pd
 import torch
 import torch.distributed as dist
 from torch.cuda.amp import GradScaler, autocast
-from torch.utils.data import DataLoader
+from torch.utils.data import DataLoader, Subset
 from torch.utils.data.distributed import DistributedSampler
 
-from clinicadl.utils.callbacks.callbacks import Callback, CallbacksHandler
+from clinicadl.utils.callbacks.callbacks import (
+    Callback,
+    CallbacksHandler,
+    PerformanceCounters,
+)
 from clinicadl.utils.caps_dataset.data import (
+    CapsDatasetAllElements,
+    get_element_batch,
     get_transforms,
     load_data_test,
     return_dataset,
 )
+from clinicadl.utils.caps_dataset.sampler import ImageGroupedSampler
 from clinicadl.utils.cmdline_utils import check_gpu
 from clinicadl.utils.early_stopping import EarlyStopping
 from clinicadl.utils.exceptions import (
@@ -29,10 +39,17 @@ from clinicadl.utils.exceptions import (
     MAPSError,
 )
 from clinicadl.utils.maps_manager.ddp import DDP, cluster, init_ddp
+from clinicadl.utils.maps_manager.iotools import (
+    AsyncWriter,
+    save_and_link,
+    snapshot_to_cpu,
+)
 from clinicadl.utils.maps_manager.logwriter import LogWriter
 from clinicadl.utils.maps_manager.maps_manager_utils import (
     add_default_values,
     read_json,
+    run_in_processes,
+    split_cpu_budget,
 )
 from clinicadl.utils.metric_module import RetainBest
 from clinicadl.utils.network.network import Network
@@ -52,6 +69,7 @@ class MapsManager:
         maps_path: Path,
         parameters: Dict[str, Any] = None,
         verbose: str = "info",
+        callbacks: List[Callback] = None,
     ):
         """
 
@@ -63,8 +81,11 @@ class MapsManager:
             Parameters of the training step. If given a new MAPS is created.
         verbose: str
             Logging level ("debug", "info", "warning")
+        callbacks: List[Callback]
+            Callbacks called during the training in addition to the default ones.
         """
         self.maps_path = maps_path.resolve()
+        self.callbacks = callbacks if callbacks is not None else []
 
         # Existing MAPS
         if parameters is None:
@@ -151,12 +172,7 @@ class MapsManager:
                 f"or use overwrite to erase previously trained splits."
             )
 
-        if self.multi_network:
-            self._train_multi(split_list, resume=False)
-        elif self.ssda_network:
-            self._train_ssda(split_list, resume=False)
-        else:
-            self._train_single(split_list, resume=False)
+        self._train_splits(split_list, resume=False)
 
     def resume(self, split_list: List[int] = None):
         """
@@ -186,12 +202,123 @@ class MapsManager:
                 f"Please try train command on these splits and resume only others."
             )
 
-        if self.multi_network:
-            self._train_multi(split_list, resume=True)
+        self._train_splits(split_list, resume=True)
+
+    def _train_splits(self, split_list: List[int] = None, resume: bool = False):
+        """
+        Trains the splits with the training procedure corresponding to the parameters.
+
+        Args:
+            split_list: list of splits that are trained.
+            resume: If True the job is resumed from checkpoint.
+        """
+        if self.parallel_splits > 1:
+            self._train_parallel_splits(split_list, resume=resume)
+        elif self.multi_network and self.joint_multi_network:
+            self._train_multi_joint(split_list, resume=resume)
+        elif self.multi_network:
+            self._train_multi(split_list, resume=resume)
         elif self.ssda_network:
-            self._train_ssda(split_list, resume=True)
+            self._train_ssda(split_list, resume=resume)
         else:
-            self._train_single(split_list, resume=True)
+            self._train_single(split_list, resume=resume)
+
+    def _train_parallel_splits(
+        self, split_list: List[int] = None, resume: bool = False
+    ):
+        """
+        Trains the splits at the same time in independent worker processes on CPU.
+
+        The CPU cores are shared between the processes (see split_cpu_budget) and each
+        process only writes in the folder of its split. The wall time of each split is logged.
+
+        Args:
+            split_list: list of splits that are trained.
+            resume: If True the job is resumed from checkpoint.
+        """
+        if self.gpu or cluster.world_size > 1:
+            raise ClinicaDLArgumentError(
+                "Splits can only be trained in parallel on CPU without data parallelism. "
+                "Please use the --no-gpu flag or set parallel_splits to 1."
+            )
+
+        split_manager = self._init_split_manager(split_list)
+        splits = list(split_manager.split_iterator())
+        n_parallel = min(self.parallel_splits, len(splits))
+        n_threads, n_workers = split_cpu_budget(cluster.cpus, n_parallel, self.n_proc)
+        logger.info(
+            f"Training {len(splits)} splits with {n_parallel} parallel processes, "
+            f"each using {n_threads} threads and {n_workers} data loading workers."
+        )
+
+        start = time()
+        # Spawned processes, as the workers of joblib cannot start DataLoader workers
+        verbose = getLogger("clinicadl").getEffectiveLevel() <= DEBUG
+        wall_times = run_in_processes(
+            MapsManager._train_split_process,
+            [
+                (self.maps_path, split, resume, n_threads, n_workers, verbose)
+                for split in splits
+            ],
+            n_parallel,
+        )
+        for split, wall_time in zip(splits, wall_times):
+            logger.info(f"Split {split} was trained in {wall_time:.1f} s.")
+        logger.info(f"All the splits were trained in {time() - start:.1f} s.")
+
+    @staticmethod
+    def _train_split_process(
+        maps_path: Path,
+        split: int,
+        resume: bool,
+        n_threads: int,
+        n_proc: int,
+        verbose: bool = False,
+    ) -> float:
+        """
+        Trains one split in a worker process launched by _train_parallel_splits.
+
+        Args:
+            maps_path: path of the MAPS.
+            split: index of the split trained.
+            resume: If True the job is resumed from checkpoint.
+            n_threads: number of PyTorch intra-op threads of the process.
+            n_proc: number of DataLoader workers of the process.
+            verbose: If True the debug messages are logged.
+        Returns:
+            the wall time of the training of the split, in seconds.
+        """
+        from clinicadl.utils.logger import setup_logging
+
+        start = time()
+        setup_logging(verbose)
+
+        # The split is added once to each message when it is created, whatever
+        # the number of handlers it goes through. The factory is restored at the end
+        # as the worker process may be reused to train another split.
+        record_factory = getLogRecordFactory()
+
+        def split_record_factory(*args, **kwargs):
+            record = record_factory(*args, **kwargs)
+            record.msg = f"[split-{split}] {record.msg}"
+            return record
+
+        setLogRecordFactory(split_record_factory)
+        try:
+            torch.set_num_threads(n_threads)
+            # Each process initiates its own process group of size 1, which cannot
+            # listen on the port of the group of the main process (fixed on SLURM).
+            # The cluster API sets the port when it is first called, hence after this call.
+            cluster.world_size
+            os.environ["MASTER_PORT"] = str(
+                cluster.api.DefaultAPI.find_available_port()
+            )
+            maps_manager = MapsManager(maps_path)
+            maps_manager.parameters.update({"n_proc": n_proc, "parallel_splits": 1})
+            maps_manager._train_splits([split], resume=resume)
+        finally:
+            setLogRecordFactory(record_factory)
+        return time() - start
 
     def predict(
         self,
@@ -214,6 +341,9 @@ class MapsManager:
         save_nifti: bool = False,
         save_latent_tensor: bool = False,
         skip_leak_check: bool = False,
+        single_pass: bool = False,
+        pin_memory: bool = None,
+        prefetch_factor: int = None,
     ):
         """
         Performs the prediction task on a subset of caps_directory defined in a TSV file.
@@ -239,6 +369,10 @@ class MapsManager:
             overwrite: If True erase the occurrences of data_group.
             label: Target label used for training (if network_task in [`regression`, `classification`]).
             label_code: dictionary linking the target values to a node number.
+            single_pass: If True, all the models of the splits sharing the same data are loaded
+                at once and the data is read only once.
+            pin_memory: If given, sets the value of pin_memory, else use the same as in training step.
+            prefetch_factor: If given, sets the value of prefetch_factor, else use the same as in training step.
         """
         if not split_list:
             split_list = self._find_splits()
@@ -269,71 +403,102 @@ class MapsManager:
             split_list=split_list,
             skip_leak_check=skip_leak_check,
         )
-        for split in split_list:
-            logger.info(f"Prediction of split {split}")
-            group_df, group_parameters = self.get_group_info(data_group, split)
-            # Find label code if not given
-            if label is not None and label != self.label and label_code == "default":
-                self.task_manager.generate_label_code(group_df, label)
+        if single_pass:
+            split_groups = self._group_splits_by_data(data_group, split_list)
+        else:
+            split_groups = [[split] for split in split_list]
+
+        for split_group in split_groups:
+            split_selection_metrics = dict()
+            for split in split_group:
+                logger.info(f"Prediction of split {split}")
+                group_df, group_parameters = self.get_group_info(data_group, split)
+                # Find label code if not given
+                if (
+                    label is not None
+                    and label != self.label
+                    and label_code == "default"
+                ):
+                    self.task_manager.generate_label_code(group_df, label)
 
-            # Erase previous TSV files on master process
-            if not selection_metrics:
-                split_selection_metrics = self._find_selection_metrics(split)
-            else:
-                split_selection_metrics = selection_metrics
-            for selection in split_selection_metrics:
-                tsv_dir = (
-                    self.maps_path
-                    / f"{self.split_name}-{split}"
-                    / f"best-{selection}"
-                    / data_group
-                )
+                # Erase previous TSV files on master process
+                if not selection_metrics:
+                    split_selection_metrics[split] = self._find_selection_metrics(split)
+                else:
+                    split_selection_metrics[split] = selection_metrics
+                for selection in split_selection_metrics[split]:
+                    tsv_dir = (
+                        self.maps_path
+                        / f"{self.split_name}-{split}"
+                        / f"best-{selection}"
+                        / data_group
+                    )
 
-                tsv_pattern = f"{data_group}*.tsv"
+                    tsv_pattern = f"{data_group}*.tsv"
 
-                for tsv_file in tsv_dir.glob(tsv_pattern):
-                    tsv_file.unlink()
+                    for tsv_file in tsv_dir.glob(tsv_pattern):
+                        tsv_file.unlink()
 
-            if self.multi_network:
-                for network in range(self.num_networks):
-                    data_test = return_dataset(
-                        group_parameters["caps_directory"],
-                        group_df,
-                        self.preprocessing_dict,
-                        all_transformations=all_transforms,
-                        multi_cohort=group_parameters["multi_cohort"],
-                        label_presence=use_labels,
-                        label=self.label if label is None else label,
-                        label_code=(
-                            self.label_code if label_code == "default" else label_code
-                        ),
-                        cnn_index=network,
-                    )
-                    test_loader = DataLoader(
+            networks = range(self.num_networks) if self.multi_network else [None]
+            for network in networks:
+                data_test = return_dataset(
+                    group_parameters["caps_directory"],
+                    group_df,
+                    self.preprocessing_dict,
+                    all_transformations=all_transforms,
+                    multi_cohort=group_parameters["multi_cohort"],
+                    label_presence=use_labels,
+                    label=self.label if label is None else label,
+                    label_code=(
+                        self.label_code if label_code == "default" else label_code
+                    ),
+                    cnn_index=network,
+                    n_proc=n_proc if n_proc is not None else self.n_proc,
+                    image_cache_size=self.image_cache_size,
+                )
+                test_loader = DataLoader(
+                    data_test,
+                    batch_size=(
+                        batch_size if batch_size is not None else self.batch_size
+                    ),
+                    shuffle=False,
+                    sampler=DistributedSampler(
                         data_test,
-                        batch_size=(
-                            batch_size if batch_size is not None else self.batch_size
-                        ),
+                        num_replicas=cluster.world_size,
+                        rank=cluster.rank,
                         shuffle=False,
-                        sampler=DistributedSampler(
-                            data_test,
-                            num_replicas=cluster.world_size,
-                            rank=cluster.rank,
-                            shuffle=False,
-                        ),
-                        num_workers=n_proc if n_proc is not None else self.n_proc,
+                    ),
+                    **self._loader_options(n_proc, pin_memory, prefetch_factor),
+                )
+                if single_pass:
+                    self._test_loader_models(
+                        test_loader,
+                        criterion,
+                        data_group,
+                        [
+                            (split, selection)
+                            for split in split_group
+                            for selection in split_selection_metrics[split]
+                        ],
+                        use_labels=use_labels,
+                        gpu=gpu,
+                        amp=amp,
+                        network=network,
                     )
+                else:
                     self._test_loader(
                         test_loader,
                         criterion,
                         data_group,
                         split,
-                        split_selection_metrics,
+                        split_selection_metrics[split],
                         use_labels=use_labels,
                         gpu=gpu,
                         amp=amp,
                         network=network,
                     )
+
+                for split in split_group:
                     if save_tensor:
                         logger.debug("Saving tensors")
                         self._compute_output_tensors(
@@ -343,6 +508,8 @@ class MapsManager:
                             selection_metrics,
                             gpu=gpu,
                             network=network,
+                            batch_size=batch_size,
+                            n_proc=n_proc,
                         )
                     if save_nifti:
                         self._compute_output_nifti(
@@ -352,6 +519,8 @@ class MapsManager:
                             selection_metrics,
                             gpu=gpu,
                             network=network,
+                            batch_size=batch_size,
+                            n_proc=n_proc,
                         )
                     if save_latent_tensor:
                         self._compute_latent_tensors(
@@ -361,76 +530,20 @@ class MapsManager:
                             selection_metrics,
                             gpu=gpu,
                             network=network,
+                            batch_size=batch_size,
+                            n_proc=n_proc,
                         )
-            else:
-                data_test = return_dataset(
-                    group_parameters["caps_directory"],
-                    group_df,
-                    self.preprocessing_dict,
-                    all_transformations=all_transforms,
-                    multi_cohort=group_parameters["multi_cohort"],
-                    label_presence=use_labels,
-                    label=self.label if label is None else label,
-                    label_code=(
-                        self.label_code if label_code == "default" else label_code
-                    ),
-                )
 
-                test_loader = DataLoader(
-                    data_test,
-                    batch_size=(
-                        batch_size if batch_size is not None else self.batch_size
-                    ),
-                    shuffle=False,
-                    sampler=DistributedSampler(
-                        data_test,
-                        num_replicas=cluster.world_size,
-                        rank=cluster.rank,
-                        shuffle=False,
-                    ),
-                    num_workers=n_proc if n_proc is not None else self.n_proc,
-                )
-                self._test_loader(
-                    test_loader,
-                    criterion,
-                    data_group,
-                    split,
-                    split_selection_metrics,
-                    use_labels=use_labels,
-                    gpu=gpu,
-                    amp=amp,
-                )
-                if save_tensor:
-                    logger.debug("Saving tensors")
-                    self._compute_output_tensors(
-                        data_test,
-                        data_group,
-                        split,
-                        selection_metrics,
-                        gpu=gpu,
-                    )
-                if save_nifti:
-                    self._compute_output_nifti(
-                        data_test,
-                        data_group,
-                        split,
-                        selection_metrics,
-                        gpu=gpu,
-                    )
-                if save_latent_tensor:
-                    self._compute_latent_tensors(
-                        data_test,
+            if cluster.master:
+                for split in split_group:
+                    self._ensemble_prediction(
                         data_group,
                         split,
                         selection_metrics,
-                        gpu=gpu,
+                        use_labels,
+                        skip_leak_check,
                     )
 
-            if cluster.master:
-                self._ensemble_prediction(
-                    data_group, split, selection_metrics, use_labels, skip_leak_check
-                )
-
     def interpret(
         self,
         data_group,
@@ -452,10 +565,14 @@ class MapsManager:
         overwrite_name=False,
         level=None,
         save_nifti=False,
+        save_diagnosis_maps=False,
+        pin_memory=None,
+        prefetch_factor=None,
     ):
         """
         Performs the interpretation task on a subset of caps_directory defined in a TSV file.
-        The mean interpretation is always saved, to save the individual interpretations set save_individual to True.
+        The mean and variance interpretations are always saved, to save the individual interpretations
+        set save_individual to True.
 
         Parameters
         ----------
@@ -502,9 +619,18 @@ class MapsManager:
             Layer number in the convolutional part after which the feature map is chosen.
         save_nifi : bool
             If True, save the interpretation map in nifti format.
+        save_diagnosis_maps: bool
+            If True, also saves the mean interpretation of each diagnosis.
+        pin_memory: bool
+            If given, sets the value of pin_memory, else use the same as in training step.
+        prefetch_factor: int
+            If given, sets the value of prefetch_factor, else use the same as in training step.
         """
+        import nibabel as nib
+        from numpy import eye
 
         from clinicadl.interpret.gradients import method_dict
+        from clinicadl.interpret.statistics import RunningMoments
 
         if method not in method_dict.keys():
             raise NotImplementedError(
@@ -542,6 +668,15 @@ class MapsManager:
         for split in split_list:
             logger.info(f"Interpretation of split {split}")
             df_group, parameters_group = self.get_group_info(data_group, split)
+            if save_diagnosis_maps:
+                if "diagnosis" not in df_group.columns:
+                    raise ClinicaDLArgumentError(
+                        f"The data group {data_group} has no diagnosis column: "
+                        f"the mean interpretation of each diagnosis cannot be computed."
+                    )
+                diagnosis_dict = df_group.set_index(["participant_id", "session_id"])[
+                    "diagnosis"
+                ].to_dict()
 
             data_test = return_dataset(
                 parameters_group["caps_directory"],
@@ -552,13 +687,15 @@ class MapsManager:
                 label_presence=False,
                 label_code=self.label_code,
                 label=self.label,
+                n_proc=n_proc if n_proc is not None else self.n_proc,
+                image_cache_size=self.image_cache_size,
             )
 
             test_loader = DataLoader(
                 data_test,
                 batch_size=batch_size if batch_size is not None else self.batch_size,
                 shuffle=False,
-                num_workers=n_proc if n_proc is not None else self.n_proc,
+                **self._loader_options(n_proc, pin_memory, prefetch_factor),
             )
 
             if not selection_metrics:
@@ -593,51 +730,67 @@ class MapsManager:
 
                 interpreter = method_dict[method](model)
 
-                cum_maps = [0] * data_test.elem_per_image
-                for data in test_loader:
-                    images = data["image"].to(model.device)
+                # Statistics of the maps of each element of the image, for the whole
+                # data group (key None) and for each diagnosis
+                statistics = defaultdict(RunningMoments)
+                with AsyncWriter() as writer:
+                    for data in test_loader:
+                        images = data["image"].to(model.device)
 
-                    map_pt = interpreter.generate_gradients(
-                        images, target_node, level=level, amp=amp
-                    )
-                    for i in range(len(data["participant_id"])):
-                        mode_id = data[f"{self.mode}_id"][i]
-                        cum_maps[mode_id] += map_pt[i]
-                        if save_individual:
-                            single_path = (
+                        map_pt = interpreter.generate_gradients(
+                            images, target_node, level=level, amp=amp
+                        )
+                        for i in range(len(data["participant_id"])):
+                            participant_id = data["participant_id"][i]
+                            session_id = data["session_id"][i]
+                            mode_id = data[f"{self.mode}_id"][i].item()
+                            statistics[(None, mode_id)].update(map_pt[i])
+                            if save_diagnosis_maps:
+                                diagnosis = diagnosis_dict[(participant_id, session_id)]
+                                statistics[(diagnosis, mode_id)].update(map_pt[i])
+                            if save_individual:
+                                single_path = (
+                                    results_path
+                                    / f"{participant_id}_{session_id}_{self.mode}-{mode_id}_map.pt"
+                                )
+                                # Clone to save the map only, not the storage of the whole batch
+                                writer.submit(
+                                    torch.save, map_pt[i].clone(), single_path
+                                )
+                                if save_nifti:
+                                    single_nifti_path = (
+                                        results_path
+                                        / f"{participant_id}_{session_id}_{self.mode}-{mode_id}_map.nii.gz"
+                                    )
+
+                                    output_nii = nib.Nifti1Image(
+                                        map_pt[i].numpy(), eye(4)
+                                    )
+                                    writer.submit(
+                                        nib.save, output_nii, single_nifti_path
+                                    )
+
+                    for (diagnosis, mode_id), moments in statistics.items():
+                        prefix = "mean" if diagnosis is None else f"mean_{diagnosis}"
+                        maps = {prefix: moments.mean.float()}
+                        if diagnosis is None:
+                            maps["var"] = moments.variance.float()
+                        for map_name, mode_map in maps.items():
+                            writer.submit(
+                                torch.save,
+                                mode_map,
                                 results_path
-                                / f"{data['participant_id'][i]}_{data['session_id'][i]}_{self.mode}-{data[f'{self.mode}_id'][i]}_map.pt"
+                                / f"{map_name}_{self.mode}-{mode_id}_map.pt",
                             )
-                            torch.save(map_pt[i], single_path)
                             if save_nifti:
-                                import nibabel as nib
-                                from numpy import eye
-
-                                single_nifti_path = (
+                                output_nii = nib.Nifti1Image(mode_map.numpy(), eye(4))
+                                writer.submit(
+                                    nib.save,
+                                    output_nii,
                                     results_path
-                                    / f"{data['participant_id'][i]}_{data['session_id'][i]}_{self.mode}-{data[f'{self.mode}_id'][i]}_map.nii.gz"
+                                    / f"{map_name}_{self.mode}-{mode_id}_map.nii.gz",
                                 )
 
-                                output_nii = nib.Nifti1Image(map_pt[i].numpy(), eye(4))
-                                nib.save(output_nii, single_nifti_path)
-
-                for i, mode_map in enumerate(cum_maps):
-                    mode_map /= len(data_test)
-
-                    torch.save(
-                        mode_map,
-                        results_path / f"mean_{self.mode}-{i}_map.pt",
-                    )
-                    if save_nifti:
-                        import nibabel as nib
-                        from numpy import eye
-
-                        output_nii = nib.Nifti1Image(mode_map.numpy(), eye(4))
-                        nib.save(
-                            output_nii,
-                            results_path / f"mean_{self.mode}-{i}_map.nii.gz",
-                        )
-
     ###################################
     # High-level functions templates  #
     ###################################
@@ -674,6 +827,8 @@ class MapsManager:
                 multi_cohort=self.multi_cohort,
                 label=self.label,
                 label_code=self.label_code,
+                n_proc=self.n_proc,
+                image_cache_size=self.image_cache_size,
             )
             logger.debug("Loading validation data...")
             data_valid = return_dataset(
@@ -685,6 +840,8 @@ class MapsManager:
                 multi_cohort=self.multi_cohort,
                 label=self.label,
                 label_code=self.label_code,
+                n_proc=self.n_proc,
+                image_cache_size=self.image_cache_size,
             )
             train_sampler = self.task_manager.generate_sampler(
                 data_train,
@@ -699,7 +856,7 @@ class MapsManager:
                 data_train,
                 batch_size=self.batch_size,
                 sampler=train_sampler,
-                num_workers=self.n_proc,
+                **self._loader_options(),
                 worker_init_fn=pl_worker_init_function,
             )
             logger.debug(f"Train loader size is {len(train_loader)}")
@@ -713,7 +870,7 @@ class MapsManager:
                 data_valid,
                 batch_size=self.batch_size,
                 shuffle=False,
-                num_workers=self.n_proc,
+                **self._loader_options(),
                 sampler=valid_sampler,
             )
             logger.debug(f"Validation loader size is {len(valid_loader)}")
@@ -793,6 +950,8 @@ class MapsManager:
                     label=self.label,
                     label_code=self.label_code,
                     cnn_index=network,
+                    n_proc=self.n_proc,
+                    image_cache_size=self.image_cache_size,
                 )
                 data_valid = return_dataset(
                     self.caps_directory,
@@ -804,6 +963,8 @@ class MapsManager:
                     label=self.label,
                     label_code=self.label_code,
                     cnn_index=network,
+                    n_proc=self.n_proc,
+                    image_cache_size=self.image_cache_size,
                 )
 
                 train_sampler = self.task_manager.generate_sampler(
@@ -816,7 +977,7 @@ class MapsManager:
                     data_train,
                     batch_size=self.batch_size,
                     sampler=train_sampler,
-                    num_workers=self.n_proc,
+                    **self._loader_options(),
                     worker_init_fn=pl_worker_init_function,
                 )
 
@@ -830,7 +991,7 @@ class MapsManager:
                     data_valid,
                     batch_size=self.batch_size,
                     shuffle=False,
-                    num_workers=self.n_proc,
+                    **self._loader_options(),
                     sampler=valid_sampler,
                 )
                 from clinicadl.utils.callbacks.callbacks import CodeCarbonTracker
@@ -859,6 +1020,105 @@ class MapsManager:
 
                 self._erase_tmp(split)
 
+    def _train_multi_joint(self, split_list: List[int] = None, resume: bool = False):
+        """
+        Trains a single CNN per element in the image, all the CNNs being trained
+        in the same data pass: each image is loaded once per epoch and each of its
+        elements is fed to its own network.
+
+        Args:
+            split_list: list of splits that are trained.
+            resume: If True the job is resumed from checkpoint.
+        """
+        train_transforms, all_transforms = get_transforms(
+            normalize=self.normalize,
+            data_augmentation=self.data_augmentation,
+            size_reduction=self.size_reduction,
+            size_reduction_factor=self.size_reduction_factor,
+        )
+
+        split_manager = self._init_split_manager(split_list)
+        for split in split_manager.split_iterator():
+            logger.info(f"Training split {split}")
+            seed_everything(self.seed, self.deterministic, self.compensation)
+
+            split_df_dict = split_manager[split]
+
+            logger.debug("Loading training data...")
+            data_train = CapsDatasetAllElements(
+                return_dataset(
+                    self.caps_directory,
+                    split_df_dict["train"],
+                    self.preprocessing_dict,
+                    train_transformations=train_transforms,
+                    all_transformations=all_transforms,
+                    multi_cohort=self.multi_cohort,
+                    label=self.label,
+                    label_code=self.label_code,
+                    n_proc=self.n_proc,
+                    image_cache_size=self.image_cache_size,
+                )
+            )
+            logger.debug("Loading validation data...")
+            data_valid = CapsDatasetAllElements(
+                return_dataset(
+                    self.caps_directory,
+                    split_df_dict["validation"],
+                    self.preprocessing_dict,
+                    train_transformations=train_transforms,
+                    all_transformations=all_transforms,
+                    multi_cohort=self.multi_cohort,
+                    label=self.label,
+                    label_code=self.label_code,
+                    n_proc=self.n_proc,
+                    image_cache_size=self.image_cache_size,
+                )
+            )
+
+            train_sampler = self.task_manager.generate_sampler(
+                data_train,
+                self.sampler,
+                dp_degree=cluster.world_size,
+                rank=cluster.rank,
+            )
+            train_loader = DataLoader(
+                data_train,
+                batch_size=self.batch_size,
+                sampler=train_sampler,
+                **self._loader_options(),
+                worker_init_fn=pl_worker_init_function,
+            )
+
+            valid_sampler = DistributedSampler(
+                data_valid,
+                num_replicas=cluster.world_size,
+                rank=cluster.rank,
+                shuffle=False,
+            )
+            valid_loader = DataLoader(
+                data_valid,
+                batch_size=self.batch_size,
+                shuffle=False,
+                **self._loader_options(),
+                sampler=valid_sampler,
+            )
+
+            self._train_joint(train_loader, valid_loader, split, resume=resume)
+
+            if cluster.master:
+                self._ensemble_prediction(
+                    "train",
+                    split,
+                    self.selection_metrics,
+                )
+                self._ensemble_prediction(
+                    "validation",
+                    split,
+                    self.selection_metrics,
+                )
+
+                self._erase_tmp(split)
+
     def _train_ssda(self, split_list=None, resume=False):
         """
         Trains a single CNN for a source and target domain using semi-supervised domain adaptation.
@@ -982,7 +1242,7 @@ class MapsManager:
                 batch_size=self.batch_size,
                 sampler=train_source_sampler,
                 # shuffle=True,  # len(data_train_source) < len(data_train_target_labeled),
-                num_workers=self.n_proc,
+                **self._loader_options(),
                 worker_init_fn=pl_worker_init_function,
                 drop_last=True,
             )
@@ -994,7 +1254,7 @@ class MapsManager:
                 batch_size=1,  # To limit the need of oversampling
                 # sampler=train_target_sampler,
                 sampler=labeled_sampler,
-                num_workers=self.n_proc,
+                **self._loader_options(),
                 worker_init_fn=pl_worker_init_function,
                 # shuffle=True,  # len(data_train_target_labeled) < len(data_train_source),
                 drop_last=True,
@@ -1010,7 +1270,7 @@ class MapsManager:
             train_target_unl_loader = DataLoader(
                 data_target_unlabeled,
                 batch_size=self.batch_size,
-                num_workers=self.n_proc,
+                **self._loader_options(),
                 # sampler=unlabeled_sampler,
                 worker_init_fn=pl_worker_init_function,
                 shuffle=True,
@@ -1025,7 +1285,7 @@ class MapsManager:
                 data_valid_source,
                 batch_size=self.batch_size,
                 shuffle=False,
-                num_workers=self.n_proc,
+                **self._loader_options(),
             )
             logger.info(
                 f"Validation loader source size is {len(valid_loader_source)*self.batch_size}"
@@ -1035,7 +1295,7 @@ class MapsManager:
                 data_valid_target_labeled,
                 batch_size=self.batch_size,  # To check
                 shuffle=False,
-                num_workers=self.n_proc,
+                **self._loader_options(),
             )
             logger.info(
                 f"Validation loader target size is {len(valid_loader_target)*self.batch_size}"
@@ -1101,6 +1361,9 @@ class MapsManager:
             optimizer=optimizer,
             split=split,
             maps_path=self.maps_path,
+            network=network,
+            resume=resume,
+            beginning_epoch=beginning_epoch,
         )
 
         model.train()
@@ -1119,9 +1382,28 @@ class MapsManager:
                 resume=resume,
                 beginning_epoch=beginning_epoch,
                 network=network,
+                train_metrics=self.train_metrics,
             )
             retain_best = RetainBest(selection_metrics=list(self.selection_metrics))
         epoch = beginning_epoch
+        train_metrics_loader = self._init_train_metrics_loader(train_loader)
+
+        def compute_metrics_train(metrics_valid):
+            if self.train_metrics == "running":
+                _, metrics = self.task_manager.compute_results(
+                    running_rows, running_loss
+                )
+            elif self.train_metrics == "skip":
+                metrics = {key: float("nan") for key in metrics_valid}
+            else:
+                _, metrics = self.task_manager.test(
+                    model,
+                    train_metrics_loader,
+                    criterion,
+                    amp=self.std_amp,
+                    performance=performance,
+                )
+            return metrics
 
         retain_best = RetainBest(selection_metrics=list(self.selection_metrics))
 
@@ -1141,35 +1423,62 @@ class MapsManager:
 
         scaler = GradScaler(enabled=self.amp)
         profiler = self._init_profiler()
-
-        while epoch < self.epochs and not early_stopping.step(metrics_valid["loss"]):
+        performance = PerformanceCounters()
+        # A single thread keeps the writings in order,
+        # one pending state bounds the memory used by the copies
+        checkpoint_writer = AsyncWriter(n_threads=1, max_pending=1)
+        stop_early = False
+
+        while (
+            epoch < self.epochs
+            and not stop_early
+            and not self.callback_handler.stop_training
+        ):
             # self.callback_handler.on_epoch_begin(self.parameters, epoch = epoch)
 
-            if isinstance(train_loader.sampler, DistributedSampler):
+            if isinstance(
+                train_loader.sampler, (DistributedSampler, ImageGroupedSampler)
+            ):
                 # It should always be true for a random sampler. But just in case
                 # we get a WeightedRandomSampler or a forgotten RandomSampler,
                 # we do not want to execute this line.
                 train_loader.sampler.set_epoch(epoch)
 
+            performance.reset()
             model.zero_grad(set_to_none=True)
             evaluation_flag, step_flag = True, True
+            # Predictions collected during the epoch when train_metrics is "running"
+            running_rows, running_loss = [], {}
 
             with profiler:
-                for i, data in enumerate(train_loader):
+                for i, data in enumerate(performance.iterate(train_loader)):
                     update: bool = (i + 1) % self.accumulation_steps == 0
                     sync = nullcontext() if update else model.no_sync()
-                    with sync:
+                    with sync, performance.timer("forward_backward"):
                         with autocast(enabled=self.std_amp):
-                            _, loss_dict = model(data, criterion)
+                            outputs, loss_dict = model(data, criterion)
                         logger.debug(f"Train loss dictionary {loss_dict}")
                         loss = loss_dict["loss"]
                         scaler.scale(loss).backward()
+                    performance.n_samples += data["image"].size(0)
+
+                    if self.train_metrics == "running":
+                        running_rows += self.task_manager.generate_test_rows(
+                            data, outputs.detach().float()
+                        )
+                        for loss_component, loss_value in loss_dict.items():
+                            running_loss[loss_component] = (
+                                running_loss.get(loss_component, 0)
+                                + loss_value.detach().float()
+                            )
+                    del outputs
 
                     if update:
                         step_flag = False
-                        scaler.step(optimizer)
-                        scaler.update()
-                        optimizer.zero_grad(set_to_none=True)
+                        with performance.timer("optimizer"):
+                            scaler.step(optimizer)
+                            scaler.update()
+                            optimizer.zero_grad(set_to_none=True)
 
                         del loss
 
@@ -1180,12 +1489,14 @@ class MapsManager:
                         ):
                             evaluation_flag = False
 
-                            _, metrics_train = self.task_manager.test(
-                                model, train_loader, criterion, amp=self.std_amp
-                            )
                             _, metrics_valid = self.task_manager.test(
-                                model, valid_loader, criterion, amp=self.std_amp
+                                model,
+                                valid_loader,
+                                criterion,
+                                amp=self.std_amp,
+                                performance=performance,
                             )
+                            metrics_train = compute_metrics_train(metrics_valid)
 
                             model.train()
                             train_loader.dataset.train()
@@ -1198,10 +1509,11 @@ class MapsManager:
                                     metrics_valid,
                                     len(train_loader),
                                 )
-                            logger.info(
-                                f"{self.mode} level training loss is {metrics_train['loss']} "
-                                f"at the end of iteration {i}"
-                            )
+                            if self.train_metrics != "skip":
+                                logger.info(
+                                    f"{self.mode} level training loss is {metrics_train['loss']} "
+                                    f"at the end of iteration {i}"
+                                )
                             logger.info(
                                 f"{self.mode} level validation loss is {metrics_valid['loss']} "
                                 f"at the end of iteration {i}"
@@ -1225,109 +1537,554 @@ class MapsManager:
 
                 # Update weights one last time if gradients were computed without update
                 if (i + 1) % self.accumulation_steps != 0:
-                    scaler.step(optimizer)
-                    scaler.update()
-                    optimizer.zero_grad(set_to_none=True)
+                    with performance.timer("optimizer"):
+                        scaler.step(optimizer)
+                        scaler.update()
+                        optimizer.zero_grad(set_to_none=True)
 
                 # Always test the results and save them once at the end of the epoch
                 model.zero_grad(set_to_none=True)
                 logger.debug(f"Last checkpoint at the end of the epoch {epoch}")
 
-                _, metrics_train = self.task_manager.test(
-                    model, train_loader, criterion, amp=self.std_amp
-                )
                 _, metrics_valid = self.task_manager.test(
-                    model, valid_loader, criterion, amp=self.std_amp
+                    model,
+                    valid_loader,
+                    criterion,
+                    amp=self.std_amp,
+                    performance=performance,
                 )
+                metrics_train = compute_metrics_train(metrics_valid)
 
                 model.train()
                 train_loader.dataset.train()
 
-            self.callback_handler.on_epoch_end(
-                self.parameters,
-                metrics_train=metrics_train,
-                metrics_valid=metrics_valid,
-                mode=self.mode,
-                i=i,
-            )
+            if self.image_cache_size > 0:
+                cache_info = train_loader.dataset.image_cache_info()
+                logger.info(
+                    f"Image cache at the end of epoch {epoch}: {cache_info['hits']} hits "
+                    f"and {cache_info['misses']} misses."
+                )
+                train_loader.dataset.reset_image_cache_info()
+
+            # The checkpoint of the last epoch is always saved
+            stop_early = early_stopping.step(metrics_valid["loss"])
+            tic = perf_counter()
+            save_checkpoint = (
+                (epoch + 1) % self.checkpoint_frequency == 0
+                or epoch + 1 == self.epochs
+                or stop_early
+            )
+            model_weights = {
+                "model": model.state_dict(),
+                "epoch": epoch,
+                "name": self.architecture,
+            }
+            if save_checkpoint:
+                # Gathers the optimizer states of all the ranks when they are sharded
+                optimizer_weights = {
+                    "optimizer": model.optim_state_dict(optimizer),
+                    "epoch": epoch,
+                    "name": self.architecture,
+                }
+
+            if cluster.master:
+                # Save checkpoints and best models
+                best_dict = retain_best.step(metrics_valid)
+                self._write_weights(
+                    model_weights,
+                    best_dict,
+                    split,
+                    network=network,
+                    save_all_models=self.parameters["save_all_models"],
+                    save_checkpoint=save_checkpoint,
+                    writer=checkpoint_writer,
+                )
+                if save_checkpoint:
+                    self._write_weights(
+                        optimizer_weights,
+                        None,
+                        split,
+                        filename="optimizer.pth.tar",
+                        writer=checkpoint_writer,
+                    )
+            dist.barrier()
+            performance.add("checkpoint", perf_counter() - tic)
+
+            self.callback_handler.on_epoch_end(
+                self.parameters,
+                metrics_train=metrics_train,
+                metrics_valid=metrics_valid,
+                mode=self.mode,
+                i=i,
+                epoch=epoch,
+                performance=performance,
+            )
+
+            if self.parameters["adaptive_learning_rate"]:
+                scheduler.step(
+                    metrics_valid["loss"]
+                )  # Update learning rate based on validation loss
+
+            epoch += 1
+
+        checkpoint_writer.close()
+        del model
+        self._test_loader(
+            train_loader,
+            criterion,
+            "train",
+            split,
+            self.selection_metrics,
+            amp=self.std_amp,
+            network=network,
+        )
+        self._test_loader(
+            valid_loader,
+            criterion,
+            "validation",
+            split,
+            self.selection_metrics,
+            amp=self.std_amp,
+            network=network,
+        )
+
+        if self.task_manager.save_outputs:
+            self._compute_output_tensors(
+                train_loader.dataset,
+                "train",
+                split,
+                self.selection_metrics,
+                nb_images=1,
+                network=network,
+            )
+            self._compute_output_tensors(
+                valid_loader.dataset,
+                "validation",
+                split,
+                self.selection_metrics,
+                nb_images=1,
+                network=network,
+            )
+
+        self.callback_handler.on_train_end(parameters=self.parameters)
+
+    def _train_joint(
+        self,
+        train_loader,
+        valid_loader,
+        split,
+        resume=False,
+    ):
+        """
+        Core function of the joint training of the networks of a multi-network framework.
+
+        The DataLoaders wrap CapsDatasetAllElements: each batch gathers all the elements
+        of the images and each network is trained on its own element with its own optimizer
+        in the same step. Early stopping is applied to each network independently: a stopped
+        network is not trained anymore while the others go on. Checkpoints of network i are
+        saved in network-{i}_checkpoint.pth.tar and network-{i}_optimizer.pth.tar, and the
+        best models and training logs follow the layout of the sequential training.
+
+        Args:
+            train_loader (torch.utils.data.DataLoader): DataLoader wrapping the training set.
+            valid_loader (torch.utils.data.DataLoader): DataLoader wrapping the validation set.
+            split (int): Index of the split trained.
+            resume (bool): If True the job is resumed from the checkpoints.
+        """
+        self._init_callbacks()
+        criterion = self.task_manager.get_criterion(self.loss)
+        networks = list(range(self.num_networks))
+
+        models, optimizers, beginning_epochs = {}, {}, {}
+        for network in networks:
+            model, beginning_epochs[network] = self._init_model(
+                split=split,
+                resume=resume,
+                transfer_path=self.transfer_path,
+                transfer_selection=self.transfer_selection_metric,
+                nb_unfrozen_layer=self.nb_unfrozen_layer,
+                checkpoint_name=f"network-{network}_checkpoint.pth.tar",
+            )
+            models[network] = DDP(
+                model, fsdp=self.fully_sharded_data_parallel, amp=self.amp
+            )
+            optimizers[network] = self._init_optimizer(
+                models[network],
+                split=split,
+                resume=resume,
+                checkpoint_name=f"network-{network}_optimizer.pth.tar",
+            )
+            models[network].train()
+
+        self.callback_handler.on_train_begin(
+            self.parameters,
+            criterion=criterion,
+            optimizer=optimizers[0],
+            split=split,
+            maps_path=self.maps_path,
+            resume=resume,
+            beginning_epoch=max(beginning_epochs.values()),
+        )
+        train_loader.dataset.train()
+
+        # Networks whose checkpoint is behind the others were stopped before the interruption
+        epoch = max(beginning_epochs.values())
+        active_networks = [
+            network for network in networks if beginning_epochs[network] == epoch
+        ]
+
+        early_stoppings = {
+            network: EarlyStopping(
+                "min", min_delta=self.tolerance, patience=self.patience
+            )
+            for network in networks
+        }
+        scalers = {network: GradScaler(enabled=self.std_amp) for network in networks}
+        metrics_valid = {network: {"loss": None} for network in networks}
+        metrics_train = {network: {"loss": None} for network in networks}
+        if cluster.master:
+            log_writers = {
+                network: LogWriter(
+                    self.maps_path,
+                    self.task_manager.evaluation_metrics + ["loss"],
+                    split,
+                    resume=resume,
+                    beginning_epoch=beginning_epochs[network],
+                    network=network,
+                    train_metrics=self.train_metrics,
+                )
+                for network in active_networks
+            }
+        retain_bests = {
+            network: RetainBest(selection_metrics=list(self.selection_metrics))
+            for network in networks
+        }
+        train_metrics_loader = self._init_train_metrics_loader(train_loader)
+
+        if self.parameters["adaptive_learning_rate"]:
+            from torch.optim.lr_scheduler import ReduceLROnPlateau
+
+            schedulers = {
+                network: ReduceLROnPlateau(
+                    optimizers[network], mode="min", factor=0.1, verbose=True
+                )
+                for network in networks
+            }
+
+        def evaluate(networks_list):
+            """Evaluates the networks on the validation and training sets in one data pass each."""
+            networks_models = [models[network] for network in networks_list]
+            results_valid = self.task_manager.test_models(
+                networks_models,
+                valid_loader,
+                criterion,
+                amp=self.std_amp,
+                elements=networks_list,
+                performance=performance,
+            )
+            if self.train_metrics == "running":
+                results_train = [
+                    self.task_manager.compute_results(
+                        running_rows[network], running_loss[network]
+                    )
+                    for network in networks_list
+                ]
+            elif self.train_metrics == "skip":
+                results_train = [
+                    (None, {key: float("nan") for key in metrics})
+                    for _, metrics in results_valid
+                ]
+            else:
+                results_train = self.task_manager.test_models(
+                    networks_models,
+                    train_metrics_loader,
+                    criterion,
+                    amp=self.std_amp,
+                    elements=networks_list,
+                    performance=performance,
+                )
+            for network, (_, valid), (_, train) in zip(
+                networks_list, results_valid, results_train
+            ):
+                metrics_valid[network] = valid
+                metrics_train[network] = train
+                models[network].train()
+            train_loader.dataset.train()
+
+        profiler = self._init_profiler()
+        performance = PerformanceCounters()
+        # Checkpoints are written at each epoch: the epochs of the checkpoints
+        # give the networks that were still trained when the job was interrupted
+        checkpoint_writer = AsyncWriter(n_threads=1, max_pending=1)
+
+        while epoch < self.epochs:
+            for network in list(active_networks):
+                if early_stoppings[network].step(metrics_valid[network]["loss"]):
+                    logger.info(f"Early stopping of network {network} at epoch {epoch}")
+                    active_networks.remove(network)
+            if not active_networks:
+                break
+
+            if isinstance(
+                train_loader.sampler, (DistributedSampler, ImageGroupedSampler)
+            ):
+                train_loader.sampler.set_epoch(epoch)
+
+            performance.reset()
+            for network in active_networks:
+                models[network].zero_grad(set_to_none=True)
+            evaluation_flag, step_flag = True, True
+            # Predictions collected during the epoch when train_metrics is "running"
+            running_rows = {network: [] for network in active_networks}
+            running_loss = {network: {} for network in active_networks}
+
+            with profiler:
+                for i, data in enumerate(performance.iterate(train_loader)):
+                    update: bool = (i + 1) % self.accumulation_steps == 0
+                    for network in active_networks:
+                        model = models[network]
+                        network_data = get_element_batch(data, network, self.mode)
+                        sync = nullcontext() if update else model.no_sync()
+                        with sync, performance.timer("forward_backward"):
+                            with autocast(enabled=self.std_amp):
+                                outputs, loss_dict = model(network_data, criterion)
+                            logger.debug(
+                                f"Train loss dictionary of network {network} {loss_dict}"
+                            )
+                            scalers[network].scale(loss_dict["loss"]).backward()
+
+                        if self.train_metrics == "running":
+                            running_rows[network] += (
+                                self.task_manager.generate_test_rows(
+                                    network_data, outputs.detach().float()
+                                )
+                            )
+                            for loss_component, loss_value in loss_dict.items():
+                                running_loss[network][loss_component] = (
+                                    running_loss[network].get(loss_component, 0)
+                                    + loss_value.detach().float()
+                                )
+                        del outputs, loss_dict
+
+                        if update:
+                            with performance.timer("optimizer"):
+                                scalers[network].step(optimizers[network])
+                                scalers[network].update()
+                                optimizers[network].zero_grad(set_to_none=True)
+                    performance.n_samples += data["image"].size(0)
+
+                    if update:
+                        step_flag = False
+
+                        # Evaluate the models only when no gradients are accumulated
+                        if (
+                            self.evaluation_steps != 0
+                            and (i + 1) % self.evaluation_steps == 0
+                        ):
+                            evaluation_flag = False
+                            evaluate(active_networks)
+                            for network in active_networks:
+                                if cluster.master:
+                                    log_writers[network].step(
+                                        epoch,
+                                        i,
+                                        metrics_train[network],
+                                        metrics_valid[network],
+                                        len(train_loader),
+                                    )
+                                logger.info(
+                                    f"{self.mode} level validation loss of network {network} "
+                                    f"is {metrics_valid[network]['loss']} at the end of iteration {i}"
+                                )
+
+                    profiler.step()
+
+                # If no step has been performed, raise Exception
+                if step_flag:
+                    raise Exception(
+                        "The model has not been updated once in the epoch. The accumulation step may be too large."
+                    )
+
+                # If no evaluation has been performed, warn the user
+                elif evaluation_flag and self.evaluation_steps != 0:
+                    logger.warning(
+                        f"Your evaluation steps {self.evaluation_steps} are too big "
+                        f"compared to the size of the dataset. "
+                        f"The model is evaluated only once at the end epochs."
+                    )
+
+                # Update weights one last time if gradients were computed without update
+                if (i + 1) % self.accumulation_steps != 0:
+                    with performance.timer("optimizer"):
+                        for network in active_networks:
+                            scalers[network].step(optimizers[network])
+                            scalers[network].update()
+                            optimizers[network].zero_grad(set_to_none=True)
+
+                # Always test the results and save them once at the end of the epoch
+                for network in active_networks:
+                    models[network].zero_grad(set_to_none=True)
+                logger.debug(f"Last checkpoint at the end of the epoch {epoch}")
+                evaluate(active_networks)
+
+            if self.image_cache_size > 0:
+                cache_info = train_loader.dataset.image_cache_info()
+                logger.info(
+                    f"Image cache at the end of epoch {epoch}: {cache_info['hits']} hits "
+                    f"and {cache_info['misses']} misses."
+                )
+                train_loader.dataset.reset_image_cache_info()
 
-            model_weights = {
-                "model": model.state_dict(),
-                "epoch": epoch,
-                "name": self.architecture,
-            }
-            optimizer_weights = {
-                "optimizer": model.optim_state_dict(optimizer),
-                "epoch": epoch,
-                "name": self.architecture,
-            }
+            tic = perf_counter()
+            for network in active_networks:
+                model_weights = {
+                    "model": models[network].state_dict(),
+                    "epoch": epoch,
+                    "name": self.architecture,
+                }
+                optimizer_weights = {
+                    "optimizer": models[network].optim_state_dict(optimizers[network]),
+                    "epoch": epoch,
+                    "name": self.architecture,
+                }
+
+                if cluster.master:
+                    # Save checkpoints and best models
+                    best_dict = retain_bests[network].step(metrics_valid[network])
+                    self._write_weights(
+                        model_weights,
+                        best_dict,
+                        split,
+                        network=network,
+                        filename=f"network-{network}_checkpoint.pth.tar",
+                        save_all_models=self.parameters["save_all_models"],
+                        writer=checkpoint_writer,
+                    )
+                    self._write_weights(
+                        optimizer_weights,
+                        None,
+                        split,
+                        filename=f"network-{network}_optimizer.pth.tar",
+                        writer=checkpoint_writer,
+                    )
 
-            if cluster.master:
-                # Save checkpoints and best models
-                best_dict = retain_best.step(metrics_valid)
-                self._write_weights(
-                    model_weights,
-                    best_dict,
-                    split,
+            dist.barrier()
+            performance.add("checkpoint", perf_counter() - tic)
+
+            for network in active_networks:
+                logger.info(f"Network {network}")
+                self.callback_handler.on_epoch_end(
+                    self.parameters,
+                    metrics_train=metrics_train[network],
+                    metrics_valid=metrics_valid[network],
+                    mode=self.mode,
+                    i=i,
+                    epoch=epoch,
                     network=network,
-                    save_all_models=self.parameters["save_all_models"],
-                )
-                self._write_weights(
-                    optimizer_weights,
-                    None,
-                    split,
-                    filename="optimizer.pth.tar",
-                    save_all_models=self.parameters["save_all_models"],
+                    performance=performance,
                 )
-            dist.barrier()
 
-            if self.parameters["adaptive_learning_rate"]:
-                scheduler.step(
-                    metrics_valid["loss"]
-                )  # Update learning rate based on validation loss
+                if self.parameters["adaptive_learning_rate"]:
+                    schedulers[network].step(metrics_valid[network]["loss"])
 
             epoch += 1
 
-        del model
-        self._test_loader(
+        checkpoint_writer.close()
+        del models
+        self._test_loader_networks(
             train_loader,
             criterion,
             "train",
             split,
             self.selection_metrics,
             amp=self.std_amp,
-            network=network,
         )
-        self._test_loader(
+        self._test_loader_networks(
             valid_loader,
             criterion,
             "validation",
             split,
             self.selection_metrics,
             amp=self.std_amp,
-            network=network,
         )
 
         if self.task_manager.save_outputs:
-            self._compute_output_tensors(
-                train_loader.dataset,
-                "train",
-                split,
-                self.selection_metrics,
-                nb_images=1,
-                network=network,
-            )
-            self._compute_output_tensors(
-                valid_loader.dataset,
-                "validation",
-                split,
-                self.selection_metrics,
-                nb_images=1,
-                network=network,
-            )
+            for data_group, dataset in [
+                ("train", train_loader.dataset),
+                ("validation", valid_loader.dataset),
+            ]:
+                for network in networks:
+                    self._compute_output_tensors(
+                        return_dataset(
+                            self.caps_directory,
+                            dataset.df,
+                            self.preprocessing_dict,
+                            all_transformations=dataset.dataset.transformations,
+                            multi_cohort=self.multi_cohort,
+                            label=self.label,
+                            label_code=self.label_code,
+                            cnn_index=network,
+                            n_proc=self.n_proc,
+                        ),
+                        data_group,
+                        split,
+                        self.selection_metrics,
+                        nb_images=1,
+                        network=network,
+                    )
 
         self.callback_handler.on_train_end(parameters=self.parameters)
 
+    def _init_train_metrics_loader(
+        self, train_loader: DataLoader
+    ) -> Optional[DataLoader]:
+        """
+        Initializes the DataLoader used to evaluate the model on the training set during training,
+        according to the train_metrics option:
+            - "full": the whole training set is evaluated,
+            - "subset": a random subset of train_metrics_subset_size elements, fixed for all epochs,
+            - "running": the predictions made during the epoch are used, no loader is needed,
+            - "skip": the training set is not evaluated, no loader is needed.
+
+        Args:
+            train_loader: DataLoader wrapping the training set.
+        Returns:
+            the DataLoader, or None if the training set is not evaluated with a separate pass.
+        """
+        if self.train_metrics == "full":
+            if train_loader.persistent_workers:
+                # The training set may be evaluated while the iterator of train_loader is
+                # in use, and a DataLoader with persistent workers has a single iterator.
+                return DataLoader(
+                    train_loader.dataset,
+                    batch_size=train_loader.batch_size,
+                    sampler=train_loader.sampler,
+                    **self._loader_options(),
+                )
+            return train_loader
+        elif self.train_metrics == "subset":
+            dataset = train_loader.dataset
+            generator = torch.Generator().manual_seed(self.seed)
+            n_elements = min(self.train_metrics_subset_size, len(dataset))
+            indices = torch.randperm(len(dataset), generator=generator)[:n_elements]
+            indices = indices.sort().values.tolist()
+            logger.debug(
+                f"Training metrics are computed on a subset of {n_elements} elements."
+            )
+            return DataLoader(
+                dataset,
+                batch_size=self.batch_size,
+                sampler=indices[cluster.rank :: cluster.world_size],
+                **self._loader_options(),
+            )
+        elif self.train_metrics in ["running", "skip"]:
+            return None
+        else:
+            raise ClinicaDLArgumentError(
+                f"train_metrics must be chosen in [full, subset, running, skip]. "
+                f"Value given: {self.train_metrics}."
+            )
+
     def _train_ssdann(
         self,
         train_source_loader,
@@ -1684,6 +2441,47 @@ class MapsManager:
             network (int): Index of the network tested (only used in multi-network setting).
         """
         for selection_metric in selection_metrics:
+            self._test_loader_models(
+                dataloader,
+                criterion,
+                data_group,
+                [(split, selection_metric)],
+                use_labels=use_labels,
+                gpu=gpu,
+                amp=amp,
+                network=network,
+                report_ci=report_ci,
+            )
+
+    def _test_loader_models(
+        self,
+        dataloader,
+        criterion,
+        data_group: str,
+        models_list: List[Tuple[int, str]],
+        use_labels=True,
+        gpu=None,
+        amp=False,
+        network=None,
+        report_ci=True,
+    ):
+        """
+        Launches the testing task of several models on a dataset wrapped by a DataLoader
+        and writes prediction TSV files. All the models are loaded at once and the
+        dataset is read only once.
+
+        Args:
+            dataloader (torch.utils.data.DataLoader): DataLoader wrapping the test CapsDataset.
+            criterion (torch.nn.modules.loss._Loss): optimization criterion used during training.
+            data_group (str): name of the data group used for the testing task.
+            models_list (list[tuple[int, str]]): split and selection metric of each model tested.
+            use_labels (bool): If True, the labels must exist in test meta-data and metrics are computed.
+            gpu (bool): If given, a new value for the device of the model will be computed.
+            amp (bool): If enabled, uses Automatic Mixed Precision (requires GPU usage).
+            network (int): Index of the network tested (only used in multi-network setting).
+        """
+        models = []
+        for split, selection_metric in models_list:
             if cluster.master:
                 log_dir = (
                     self.maps_path
@@ -1706,16 +2504,21 @@ class MapsManager:
                 gpu=gpu,
                 network=network,
             )
-            model = DDP(model, fsdp=self.fully_sharded_data_parallel, amp=self.amp)
-
-            prediction_df, metrics = self.task_manager.test(
-                model,
-                dataloader,
-                criterion,
-                use_labels=use_labels,
-                amp=amp,
-                report_ci=report_ci,
+            models.append(
+                DDP(model, fsdp=self.fully_sharded_data_parallel, amp=self.amp)
             )
+
+        models_results = self.task_manager.test_models(
+            models,
+            dataloader,
+            criterion,
+            use_labels=use_labels,
+            amp=amp,
+            report_ci=report_ci,
+        )
+        for (split, selection_metric), (prediction_df, metrics) in zip(
+            models_list, models_results
+        ):
             if use_labels:
                 if network is not None:
                     metrics[f"{self.mode}_id"] = network
@@ -1726,6 +2529,7 @@ class MapsManager:
 
                 logger.info(
                     f"{self.mode} level {data_group} loss is {loss_to_log} for model selected on {selection_metric}"
+                    + (f" of split {split}" if len(models_list) > 1 else "")
                 )
 
             if cluster.master:
@@ -1738,6 +2542,93 @@ class MapsManager:
                     data_group=data_group,
                 )
 
+    def _test_loader_networks(
+        self,
+        dataloader,
+        criterion,
+        data_group: str,
+        split: int,
+        selection_metrics,
+        use_labels=True,
+        gpu=None,
+        amp=False,
+        report_ci=True,
+    ):
+        """
+        Launches the testing task of all the networks of a multi-network framework on a dataset
+        wrapped by a DataLoader and writes prediction TSV files. The DataLoader wraps a
+        CapsDatasetAllElements, so that the dataset is read only once for all the networks.
+
+        Args:
+            dataloader (torch.utils.data.DataLoader): DataLoader wrapping the test CapsDatasetAllElements.
+            criterion (torch.nn.modules.loss._Loss): optimization criterion used during training.
+            data_group (str): name of the data group used for the testing task.
+            split (int): Index of the split used to train the models tested.
+            selection_metrics (list[str]): List of metrics used to select the best models which are tested.
+            use_labels (bool): If True, the labels must exist in test meta-data and metrics are computed.
+            gpu (bool): If given, a new value for the device of the model will be computed.
+            amp (bool): If enabled, uses Automatic Mixed Precision (requires GPU usage).
+        """
+        networks = list(range(self.num_networks))
+        for selection_metric in selection_metrics:
+            if cluster.master:
+                log_dir = (
+                    self.maps_path
+                    / f"{self.split_name}-{split}"
+                    / f"best-{selection_metric}"
+                    / data_group
+                )
+                self.write_description_log(
+                    log_dir,
+                    data_group,
+                    dataloader.dataset.caps_dict,
+                    dataloader.dataset.df,
+                )
+
+            models = []
+            for network in networks:
+                # load the best trained model during the training
+                model, _ = self._init_model(
+                    transfer_path=self.maps_path,
+                    split=split,
+                    transfer_selection=selection_metric,
+                    gpu=gpu,
+                    network=network,
+                )
+                models.append(
+                    DDP(model, fsdp=self.fully_sharded_data_parallel, amp=self.amp)
+                )
+
+            networks_results = self.task_manager.test_models(
+                models,
+                dataloader,
+                criterion,
+                use_labels=use_labels,
+                amp=amp,
+                report_ci=report_ci,
+                elements=networks,
+            )
+            for network, (prediction_df, metrics) in zip(networks, networks_results):
+                if use_labels:
+                    metrics[f"{self.mode}_id"] = network
+
+                    loss_to_log = (
+                        metrics["Metric_values"][-1] if report_ci else metrics["loss"]
+                    )
+                    logger.info(
+                        f"{self.mode} level {data_group} loss is {loss_to_log} for model "
+                        f"selected on {selection_metric} of network {network}"
+                    )
+
+                if cluster.master:
+                    self._mode_level_to_tsv(
+                        prediction_df,
+                        metrics,
+                        split,
+                        selection_metric,
+                        data_group=data_group,
+                    )
+
     def _test_loader_ssda(
         self,
         dataloader,
@@ -1817,6 +2708,8 @@ class MapsManager:
         selection_metrics,
         gpu=None,
         network=None,
+        batch_size=None,
+        n_proc=None,
     ):
         """
         Computes the output nifti images and saves them in the MAPS.
@@ -1828,11 +2721,16 @@ class MapsManager:
             selection_metrics (list[str]): metrics used for model selection.
             gpu (bool): If given, a new value for the device of the model will be computed.
             network (int): Index of the network tested (only used in multi-network setting).
+            batch_size (int): If given, sets the value of batch_size, else use the same as in training step.
+            n_proc (int): If given, sets the value of num_workers, else use the same as in training step.
         # Raise an error if mode is not image
         """
         import nibabel as nib
         from numpy import eye
 
+        dataloader = self._init_export_loader(
+            dataset, batch_size=batch_size, n_proc=n_proc
+        )
         for selection_metric in selection_metrics:
             # load the best trained model during the training
             model, _ = self._init_model(
@@ -1857,27 +2755,29 @@ class MapsManager:
                 nifti_path.mkdir(parents=True, exist_ok=True)
             dist.barrier()
 
-            nb_imgs = len(dataset)
-            for i in [
-                *range(cluster.rank, nb_imgs, cluster.world_size),
-                *range(int(nb_imgs % cluster.world_size <= cluster.rank)),
-            ]:
-                data = dataset[i]
-                image = data["image"]
-                x = image.unsqueeze(0).to(model.device)
-                with autocast(enabled=self.std_amp):
-                    output = model(x)
-                output = output.squeeze(0).detach().cpu().float()
-                # Convert tensor to nifti image with appropriate affine
-                input_nii = nib.Nifti1Image(image[0].detach().cpu().numpy(), eye(4))
-                output_nii = nib.Nifti1Image(output[0].numpy(), eye(4))
-                # Create file name according to participant and session id
-                participant_id = data["participant_id"]
-                session_id = data["session_id"]
-                input_filename = f"{participant_id}_{session_id}_image_input.nii.gz"
-                output_filename = f"{participant_id}_{session_id}_image_output.nii.gz"
-                nib.save(input_nii, nifti_path / input_filename)
-                nib.save(output_nii, nifti_path / output_filename)
+            with AsyncWriter() as writer:
+                for data in dataloader:
+                    images = data["image"]
+                    with autocast(enabled=self.std_amp):
+                        outputs = model(images.to(model.device))
+                    outputs = outputs.cpu().float()
+                    for idx in range(len(images)):
+                        # Convert tensor to nifti image with appropriate affine
+                        input_nii = nib.Nifti1Image(images[idx, 0].numpy(), eye(4))
+                        output_nii = nib.Nifti1Image(outputs[idx, 0].numpy(), eye(4))
+                        # Create file name according to participant and session id
+                        participant_id = data["participant_id"][idx]
+                        session_id = data["session_id"][idx]
+                        input_filename = (
+                            f"{participant_id}_{session_id}_image_input.nii.gz"
+                        )
+                        output_filename = (
+                            f"{participant_id}_{session_id}_image_output.nii.gz"
+                        )
+                        writer.submit(nib.save, input_nii, nifti_path / input_filename)
+                        writer.submit(
+                            nib.save, output_nii, nifti_path / output_filename
+                        )
 
     @torch.no_grad()
     def _compute_output_tensors(
@@ -1889,6 +2789,8 @@ class MapsManager:
         nb_images=None,
         gpu=None,
         network=None,
+        batch_size=None,
+        n_proc=None,
     ):
         """
         Compute the output tensors and saves them in the MAPS.
@@ -1901,7 +2803,23 @@ class MapsManager:
             nb_images (int): number of full images to write. Default computes the outputs of the whole data set.
             gpu (bool): If given, a new value for the device of the model will be computed.
             network (int): Index of the network tested (only used in multi-network setting).
+            batch_size (int): If given, sets the value of batch_size, else use the same as in training step.
+            n_proc (int): If given, sets the value of num_workers, else use the same as in training step.
         """
+        if nb_images is None:  # Compute outputs for the whole data set
+            nb_modes = None
+        else:
+            nb_modes = nb_images * dataset.elem_per_image
+        dataloader = self._init_export_loader(
+            dataset, nb_modes=nb_modes, batch_size=batch_size, n_proc=n_proc
+        )
+
+        def save_input_output(input_tensor, output_tensor, input_path, output_path):
+            # The message is logged by the writing thread once the files are written
+            torch.save(input_tensor, input_path)
+            torch.save(output_tensor, output_path)
+            logger.debug(f"File saved at {[input_path.name, output_path.name]}")
+
         for selection_metric in selection_metrics:
             # load the best trained model during the training
             model, _ = self._init_model(
@@ -1926,34 +2844,28 @@ class MapsManager:
                 tensor_path.mkdir(parents=True, exist_ok=True)
             dist.barrier()
 
-            if nb_images is None:  # Compute outputs for the whole data set
-                nb_modes = len(dataset)
-            else:
-                nb_modes = nb_images * dataset.elem_per_image
-
-            for i in [
-                *range(cluster.rank, nb_modes, cluster.world_size),
-                *range(int(nb_modes % cluster.world_size <= cluster.rank)),
-            ]:
-                data = dataset[i]
-                image = data["image"]
-                x = image.unsqueeze(0).to(model.device)
-                with autocast(enabled=self.std_amp):
-                    output = model(x)
-                output = output.squeeze(0).cpu().float()
-                participant_id = data["participant_id"]
-                session_id = data["session_id"]
-                mode_id = data[f"{self.mode}_id"]
-                input_filename = (
-                    f"{participant_id}_{session_id}_{self.mode}-{mode_id}_input.pt"
-                )
-                output_filename = (
-                    f"{participant_id}_{session_id}_{self.mode}-{mode_id}_output.pt"
-                )
-                torch.save(image, tensor_path / input_filename)
-                torch.save(output, tensor_path / output_filename)
-                logger.debug(f"File saved at {[input_filename, output_filename]}")
+            with AsyncWriter() as writer:
+                for data in dataloader:
+                    images = data["image"]
+                    with autocast(enabled=self.std_amp):
+                        outputs = model(images.to(model.device))
+                    outputs = outputs.cpu().float()
+                    for idx in range(len(images)):
+                        participant_id = data["participant_id"][idx]
+                        session_id = data["session_id"][idx]
+                        mode_id = data[f"{self.mode}_id"][idx].item()
+                        input_filename = f"{participant_id}_{session_id}_{self.mode}-{mode_id}_input.pt"
+                        output_filename = f"{participant_id}_{session_id}_{self.mode}-{mode_id}_output.pt"
+                        # Clone to save the element only, not the storage of the whole batch
+                        writer.submit(
+                            save_input_output,
+                            images[idx].clone(),
+                            outputs[idx].clone(),
+                            tensor_path / input_filename,
+                            tensor_path / output_filename,
+                        )
 
+    @torch.no_grad()
     def _compute_latent_tensors(
         self,
         dataset,
@@ -1963,6 +2875,8 @@ class MapsManager:
         nb_images=None,
         gpu=None,
         network=None,
+        batch_size=None,
+        n_proc=None,
     ):
         """
         Compute the output tensors and saves them in the MAPS.
@@ -1975,7 +2889,17 @@ class MapsManager:
             nb_images (int): number of full images to write. Default computes the outputs of the whole data set.
             gpu (bool): If given, a new value for the device of the model will be computed.
             network (int): Index of the network tested (only used in multi-network setting).
+            batch_size (int): If given, sets the value of batch_size, else use the same as in training step.
+            n_proc (int): If given, sets the value of num_workers, else use the same as in training step.
         """
+        if nb_images is None:  # Compute outputs for the whole data set
+            nb_modes = None
+        else:
+            nb_modes = nb_images * dataset.elem_per_image
+        dataloader = self._init_export_loader(
+            dataset, nb_modes=nb_modes, batch_size=batch_size, n_proc=n_proc
+        )
+
         for selection_metric in selection_metrics:
             # load the best trained model during the training
             model, _ = self._init_model(
@@ -2000,30 +2924,79 @@ class MapsManager:
                 tensor_path.mkdir(parents=True, exist_ok=True)
             dist.barrier()
 
-            if nb_images is None:  # Compute outputs for the whole data set
-                nb_modes = len(dataset)
-            else:
-                nb_modes = nb_images * dataset.elem_per_image
+            with AsyncWriter() as writer:
+                for data in dataloader:
+                    images = data["image"]
+                    logger.debug(f"Images for latent representation {images}")
+                    with autocast(enabled=self.std_amp):
+                        _, latents, _ = model.module._forward(images.to(model.device))
+                    latents = latents.cpu().float()
+                    for idx in range(len(images)):
+                        participant_id = data["participant_id"][idx]
+                        session_id = data["session_id"][idx]
+                        mode_id = data[f"{self.mode}_id"][idx].item()
+                        output_filename = f"{participant_id}_{session_id}_{self.mode}-{mode_id}_latent.pt"
+                        writer.submit(
+                            torch.save,
+                            latents[idx].clone(),
+                            tensor_path / output_filename,
+                        )
 
-            for i in [
-                *range(cluster.rank, nb_modes, cluster.world_size),
-                *range(int(nb_modes % cluster.world_size <= cluster.rank)),
-            ]:
-                data = dataset[i]
-                image = data["image"]
-                logger.debug(f"Image for latent representation {image}")
-                with autocast(enabled=self.std_amp):
-                    _, latent, _ = model.module._forward(
-                        image.unsqueeze(0).to(model.device)
-                    )
-                latent = latent.squeeze(0).cpu().float()
-                participant_id = data["participant_id"]
-                session_id = data["session_id"]
-                mode_id = data[f"{self.mode}_id"]
-                output_filename = (
-                    f"{participant_id}_{session_id}_{self.mode}-{mode_id}_latent.pt"
-                )
-                torch.save(latent, tensor_path / output_filename)
+    def _loader_options(
+        self, n_proc=None, pin_memory=None, prefetch_factor=None
+    ) -> Dict[str, Any]:
+        """
+        Computes the performance options of a DataLoader from the DataLoader section
+        of the training parameters. Workers are only kept alive between iterations
+        (persistent_workers) and prefetch batches when n_proc > 0.
+
+        Args:
+            n_proc (int): If given, sets the value of num_workers, else use the same as in training step.
+            pin_memory (bool): If given, sets the value of pin_memory, else use the same as in training step.
+            prefetch_factor (int): If given, sets the value of prefetch_factor, else use the same as in training step.
+        Returns:
+            the keyword arguments given to the DataLoader.
+        """
+        num_workers = n_proc if n_proc is not None else self.n_proc
+        pin_memory = pin_memory if pin_memory is not None else self.pin_memory
+        options = {
+            "num_workers": num_workers,
+            # Pinned memory is only useful to speed up host to GPU copies
+            "pin_memory": pin_memory and torch.cuda.is_available(),
+        }
+        if num_workers > 0:
+            options["persistent_workers"] = self.persistent_workers
+            options["prefetch_factor"] = (
+                prefetch_factor if prefetch_factor is not None else self.prefetch_factor
+            )
+        return options
+
+    def _init_export_loader(self, dataset, nb_modes=None, batch_size=None, n_proc=None):
+        """
+        Wraps the dataset in a DataLoader used to export outputs of the models.
+        The elements are split between the processes without shuffling.
+
+        Args:
+            dataset (clinicadl.utils.caps_dataset.data.CapsDataset): wrapper of the data set.
+            nb_modes (int): number of elements to export. Default exports the whole data set.
+            batch_size (int): If given, sets the value of batch_size, else use the same as in training step.
+            n_proc (int): If given, sets the value of num_workers, else use the same as in training step.
+        """
+        if nb_modes is not None:
+            dataset = Subset(dataset, range(min(nb_modes, len(dataset))))
+
+        return DataLoader(
+            dataset,
+            batch_size=batch_size if batch_size is not None else self.batch_size,
+            shuffle=False,
+            sampler=DistributedSampler(
+                dataset,
+                num_replicas=cluster.world_size,
+                rank=cluster.rank,
+                shuffle=False,
+            ),
+            **self._loader_options(n_proc),
+        )
 
     def _ensemble_prediction(
         self,
@@ -2119,6 +3092,7 @@ class MapsManager:
             label_code=self.parameters["label_code"],
             train_transformations=None,
             all_transformations=transformations,
+            n_proc=self.n_proc,
         )
         self.parameters.update(
             {
@@ -2433,29 +3407,37 @@ class MapsManager:
         network: int = None,
         filename: str = "checkpoint.pth.tar",
         save_all_models: bool = False,
+        save_checkpoint: bool = True,
+        writer: Optional[AsyncWriter] = None,
     ):
         """
         Update checkpoint and save the best model according to a set of metrics.
         If no metrics_dict is given, only the checkpoint is saved.
 
+        The state is serialized once: the other files (best models of several
+        metrics, all_models) are hard links to the first one written.
+        Files are replaced atomically.
+
         Args:
             state: state of the training (model weights, epoch...).
             metrics_dict: output of RetainBest step.
             split: split number.
             network: network number (multi-network framework).
             filename: name of the checkpoint file.
+            save_all_models: If True, the state is also saved in the all_models folder.
+            save_checkpoint: If False, the checkpoint is not updated.
+            writer: If given, the state is copied to CPU and written in a background
+                thread.
         """
-        checkpoint_dir = self.maps_path / f"{self.split_name}-{split}" / "tmp"
-        checkpoint_dir.mkdir(parents=True, exist_ok=True)
-        checkpoint_path = checkpoint_dir / filename
-        torch.save(state, checkpoint_path)
+        split_path = self.maps_path / f"{self.split_name}-{split}"
+        paths = []
+        if save_checkpoint:
+            paths.append(split_path / "tmp" / filename)
 
         if save_all_models:
-            all_models_dir = (
-                self.maps_path / f"{self.split_name}-{split}" / "all_models"
+            paths.append(
+                split_path / "all_models" / f"model_epoch_{state['epoch']}.pth.tar"
             )
-            all_models_dir.mkdir(parents=True, exist_ok=True)
-            torch.save(state, all_models_dir / f"model_epoch_{state['epoch']}.pth.tar")
 
         best_filename = "model.pth.tar"
         if network is not None:
@@ -2464,14 +3446,15 @@ class MapsManager:
         # Save model according to several metrics
         if metrics_dict is not None:
             for metric_name, metric_bool in metrics_dict.items():
-                metric_path = (
-                    self.maps_path
-                    / f"{self.split_name}-{split}"
-                    / f"best-{metric_name}"
-                )
                 if metric_bool:
-                    metric_path.mkdir(parents=True, exist_ok=True)
-                    shutil.copyfile(checkpoint_path, metric_path / best_filename)
+                    paths.append(split_path / f"best-{metric_name}" / best_filename)
+
+        if len(paths) == 0:
+            return
+        if writer is None:
+            save_and_link(state, paths)
+        else:
+            writer.submit(save_and_link, snapshot_to_cpu(state), paths)
 
     def _write_information(self):
         """
@@ -2508,7 +3491,8 @@ class MapsManager:
     def _erase_tmp(self, split):
         """Erase checkpoints of the model and optimizer at the end of training."""
         tmp_path = self.maps_path / f"{self.split_name}-{split}" / "tmp"
-        shutil.rmtree(tmp_path)
+        if tmp_path.is_dir():
+            shutil.rmtree(tmp_path)
 
     @staticmethod
     def write_description_log(
@@ -2705,6 +3689,7 @@ class MapsManager:
         resume=False,
         gpu=None,
         network=None,
+        checkpoint_name="checkpoint.pth.tar",
     ):
         """
         Instantiate the model
@@ -2716,6 +3701,7 @@ class MapsManager:
             resume (bool): If True initialize the network with the checkpoint weights.
             gpu (bool): If given, a new value for the device of the model will be computed.
             network (int): Index of the network trained (used in multi-network setting only).
+            checkpoint_name (str): name of the checkpoint file loaded if resume is True.
         """
         import clinicadl.utils.network as network_package
 
@@ -2747,10 +3733,7 @@ class MapsManager:
 
         if resume:
             checkpoint_path = (
-                self.maps_path
-                / f"{self.split_name}-{split}"
-                / "tmp"
-                / "checkpoint.pth.tar"
+                self.maps_path / f"{self.split_name}-{split}" / "tmp" / checkpoint_name
             )
             checkpoint_state = torch.load(checkpoint_path, map_location=device)
             model.load_state_dict(checkpoint_state["model"])
@@ -2783,7 +3766,9 @@ class MapsManager:
 
         return model, current_epoch
 
-    def _init_optimizer(self, model: DDP, split=None, resume=False):
+    def _init_optimizer(
+        self, model: DDP, split=None, resume=False, checkpoint_name="optimizer.pth.tar"
+    ):
         """Initialize the optimizer and use checkpoint weights if resume is True."""
 
         optimizer_cls = getattr(torch.optim, self.optimizer)
@@ -2797,10 +3782,7 @@ class MapsManager:
 
         if resume:
             checkpoint_path = (
-                self.maps_path
-                / f"{self.split_name}-{split}"
-                / "tmp"
-                / "optimizer.pth.tar"
+                self.maps_path / f"{self.split_name}-{split}" / "tmp" / checkpoint_name
             )
             checkpoint_state = torch.load(checkpoint_path, map_location=model.device)
             model.load_optim_state_dict(optimizer, checkpoint_state["optimizer"])
@@ -2858,15 +3840,21 @@ class MapsManager:
             RegressionManager,
         )
 
+        # Processes used to compute the bootstrap confidence intervals
+        n_proc = self.parameters.get("n_proc", 1)
         if self.network_task == "classification":
             if n_classes is not None:
-                return ClassificationManager(self.mode, n_classes=n_classes)
+                return ClassificationManager(
+                    self.mode, n_classes=n_classes, n_proc=n_proc
+                )
             else:
-                return ClassificationManager(self.mode, df=df, label=self.label)
+                return ClassificationManager(
+                    self.mode, df=df, label=self.label, n_proc=n_proc
+                )
         elif self.network_task == "regression":
-            return RegressionManager(self.mode)
+            return RegressionManager(self.mode, n_proc=n_proc)
         elif self.network_task == "reconstruction":
-            return ReconstructionManager(self.mode)
+            return ReconstructionManager(self.mode, n_proc=n_proc)
         else:
             raise NotImplementedError(
                 f"Task {self.network_task} is not implemented in ClinicaDL. "
@@ -2961,6 +3949,28 @@ class MapsManager:
             parameters = json.load(f, object_hook=path_decoder)
         return df, parameters
 
+    def _group_splits_by_data(
+        self, data_group: str, split_list: List[int]
+    ) -> List[List[int]]:
+        """
+        Groups the splits for which the data group is defined by the same list of
+        participant_id / session_id and the same configuration parameters.
+        The models of the splits of a group can be tested with a single pass over the data.
+        """
+        split_groups = []
+        groups_info = []
+        for split in split_list:
+            group_df, group_parameters = self.get_group_info(data_group, split)
+            for (df, parameters), split_group in zip(groups_info, split_groups):
+                if df.equals(group_df) and parameters == group_parameters:
+                    split_group.append(split)
+                    break
+            else:
+                groups_info.append((group_df, group_parameters))
+                split_groups.append([split])
+
+        return split_groups
+
     def get_parameters(self):
         """Returns the training parameters dictionary."""
         json_path = self.maps_path / "maps.json"
@@ -3193,6 +4203,7 @@ class MapsManager:
             Callback,
             CallbacksHandler,
             LoggerCallback,
+            PerformanceCallback,
         )
 
         # if self.callbacks is None:
@@ -3211,6 +4222,10 @@ class MapsManager:
             self.callback_handler.add_callback(Tracker)
 
         self.callback_handler.add_callback(LoggerCallback())
+        if cluster.master:
+            self.callback_handler.add_callback(PerformanceCallback())
+        for callback in self.callbacks:
+            self.callback_handler.add_callback(callback)
         # self.callback_handler.add_callback(MetricConsolePrinterCallback())
 
     @property
@@ -1,6 +1,6 @@
 import json
 from pathlib import Path
-from typing import Any, Dict
+from typing import Any, Callable, Dict, List, Tuple
 
 import toml
 
@@ -173,3 +173,63 @@ def remove_unused_tasks(
             del toml_dict[other_task.capitalize()]
 
     return toml_dict
+
+
+def split_cpu_budget(n_cpus: int, n_parallel: int, n_proc: int) -> Tuple[int, int]:
+    """
+    Shares the CPU cores between splits trained at the same time.
+
+    Each split gets the same share of the cores. Inside its share, at most n_proc cores
+    are used by the DataLoader workers and at least one core is left to the training
+    process, which uses the remaining cores as PyTorch intra-op threads.
+
+    Args:
+        n_cpus: number of CPU cores available.
+        n_parallel: number of splits trained at the same time.
+        n_proc: number of DataLoader workers asked by the user.
+
+    Returns:
+        the number of PyTorch threads and the number of DataLoader workers of each split.
+    """
+    cores_per_split = max(1, n_cpus // n_parallel)
+    n_workers = min(n_proc, cores_per_split - 1)
+    n_threads = cores_per_split - n_workers
+    return n_threads, n_workers
+
+
+def _set_start_method(method: str):
+    import multiprocessing
+
+    multiprocessing.set_start_method(method, force=True)
+
+
+def run_in_processes(
+    function: Callable, args_list: List[Tuple], n_processes: int
+) -> List[Any]:
+    """
+    Calls function on each tuple of arguments of args_list, in n_processes spawned processes.
+
+    Contrary to the workers of joblib, these processes are not daemonic and can start
+    the workers of their own DataLoaders. An exception raised by a call is raised again
+    in the calling process.
+
+    Args:
+        function: function called, which must be importable by the spawned processes.
+        args_list: arguments of each call.
+        n_processes: number of processes running at the same time.
+    Returns:
+        the results of the calls, in the order of args_list.
+    """
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    # The start method of the calling process is restored in the spawned processes, so
+    # that they do not spawn their DataLoader workers, which would import clinicadl again.
+    with ProcessPoolExecutor(
+        max_workers=n_processes,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_set_start_method,
+        initargs=(multiprocessing.get_start_method(),),
+    ) as executor:
+        futures = [executor.submit(function, *args) for args in args_list]
+        return [future.result() for future in futures]
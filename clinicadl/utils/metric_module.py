@@ -22,10 +22,18 @@ metric_optimum = {
 
 logger = getLogger("clinicadl.metric")
 
+BOOTSTRAP_N_RESAMPLES = 3000
+BOOTSTRAP_CONFIDENCE_LEVEL = 0.95
+# Below this number of resampled elements, starting a process pool costs more than it saves
+BOOTSTRAP_PARALLEL_MIN_SIZE = 10**7
+
 
 class MetricModule:
-    def __init__(self, metrics, n_classes=2):
+    def __init__(self, metrics, n_classes=2, n_proc=1, seed=None):
         self.n_classes = n_classes
+        # Parameters of the bootstrap used to compute confidence intervals
+        self.n_proc = n_proc
+        self.seed = seed
 
         # Check if wanted metrics are implemented
         list_fn = [
@@ -60,8 +68,8 @@ class MetricModule:
             y = np.array(y)
             y_pred = np.array(y_pred)
 
-            if report_ci:
-                from scipy.stats import bootstrap
+            if report_ci and len(y) >= 2:
+                bootstrap_results = self.bootstrap(y, y_pred)
 
             metric_names = ["Metrics"]
             metric_values = ["Values"]  # Collect metric values
@@ -70,48 +78,22 @@ class MetricModule:
             se_values = ["SE"]  # Collect standard error values
 
             for metric_key, metric_fn in self.metrics.items():
-                metric_args = list(metric_fn.__code__.co_varnames)
-
-                class_numbers = (
-                    range(self.n_classes)
-                    if "class_number" in metric_args and self.n_classes > 2
-                    else [0]
-                )
-
-                for class_number in class_numbers:
+                for class_number, metric_name in self._metric_names(metric_key):
                     metric_result = metric_fn(y, y_pred, class_number)
 
                     # Compute confidence intervals only if there are at least two samples in the data.
                     if report_ci and len(y) >= 2:
-                        res = bootstrap(
-                            (y, y_pred),
-                            lambda y, y_pred: metric_fn(y, y_pred, class_number),
-                            n_resamples=3000,
-                            confidence_level=0.95,
-                            method="percentile",
-                            paired=True,
+                        lower_ci, upper_ci, standard_error = percentile_ci(
+                            bootstrap_results[metric_name]
                         )
 
-                        lower_ci, upper_ci = res.confidence_interval
-                        standard_error = res.standard_error
-
                         metric_values.append(metric_result)
                         lower_ci_values.append(lower_ci)
                         upper_ci_values.append(upper_ci)
                         se_values.append(standard_error)
-                        metric_names.append(
-                            f"{metric_key}-{class_number}"
-                            if len(class_numbers) > 1
-                            else f"{metric_key}"
-                        )
+                        metric_names.append(metric_name)
                     else:
-                        results[
-                            (
-                                f"{metric_key}-{class_number}"
-                                if len(class_numbers) > 1
-                                else f"{metric_key}"
-                            )
-                        ] = metric_result
+                        results[metric_name] = metric_result
 
             if report_ci:
                 # Construct the final results dictionary
@@ -125,6 +107,101 @@ class MetricModule:
 
         return results
 
+    def _metric_names(self, metric_key):
+        """
+        Lists the values computed for a metric, i.e. one per class for class-wise metrics
+        in the multi-class case.
+
+        Args:
+            metric_key (str): name of the metric
+        Returns:
+            (List[Tuple[int, str]]) the class number and the name of each value
+        """
+        metric_args = list(self.metrics[metric_key].__code__.co_varnames)
+        if "class_number" in metric_args and self.n_classes > 2:
+            return [
+                (class_number, f"{metric_key}-{class_number}")
+                for class_number in range(self.n_classes)
+            ]
+        return [(0, metric_key)]
+
+    def bootstrap(self, y, y_pred):
+        """
+        Computes the metrics on bootstrap resamples of the data.
+
+        The resample indices are drawn once and shared by all the metrics. Metrics derived
+        from the confusion matrix and regression metrics are computed for all the resamples
+        at once, other metrics are computed resample by resample.
+
+        Args:
+            y (np.ndarray): array of labels
+            y_pred (np.ndarray): array of predictions
+        Returns:
+            (Dict[str:np.ndarray]) values of each metric on the resamples
+        """
+        rng = np.random.default_rng(self.seed)
+        indices = rng.integers(len(y), size=(BOOTSTRAP_N_RESAMPLES, len(y)))
+
+        if self.n_proc > 1 and indices.size >= BOOTSTRAP_PARALLEL_MIN_SIZE:
+            from joblib import Parallel, delayed
+
+            chunk_results = Parallel(n_jobs=self.n_proc)(
+                delayed(self._bootstrap_chunk)(y, y_pred, chunk)
+                for chunk in np.array_split(indices, self.n_proc)
+            )
+        else:
+            chunk_results = [self._bootstrap_chunk(y, y_pred, indices)]
+
+        return {
+            metric_name: np.concatenate([chunk[metric_name] for chunk in chunk_results])
+            for metric_name in chunk_results[0]
+        }
+
+    def _bootstrap_chunk(self, y, y_pred, indices):
+        """
+        Args:
+            y (np.ndarray): array of labels
+            y_pred (np.ndarray): array of predictions
+            indices (np.ndarray): indices of the resamples, of shape (n_resamples, len(y))
+        Returns:
+            (Dict[str:np.ndarray]) values of each metric on the resamples
+        """
+        results = dict()
+        confusion_values = dict()
+        regression_values = None
+        classes = None
+
+        for metric_key, metric_fn in self.metrics.items():
+            for class_number, metric_name in self._metric_names(metric_key):
+                if metric_key.lower() in _confusion_metric_keys:
+                    if classes is None:
+                        classes = np.unique(
+                            np.concatenate([y, y_pred, np.arange(self.n_classes)])
+                        )
+                        confusion = _confusion_matrices(y, y_pred, indices, classes)
+                    if class_number not in confusion_values:
+                        confusion_values[class_number] = _confusion_metrics(
+                            confusion, np.searchsorted(classes, class_number)
+                        )
+                    results[metric_name] = confusion_values[class_number][
+                        metric_key.lower()
+                    ]
+                elif metric_key.lower() in _regression_metric_keys:
+                    if regression_values is None:
+                        regression_values = _regression_metrics(
+                            y[indices], y_pred[indices]
+                        )
+                    results[metric_name] = regression_values[metric_key.lower()]
+                else:
+                    results[metric_name] = np.array(
+                        [
+                            metric_fn(y[resample], y_pred[resample], class_number)
+                            for resample in indices
+                        ]
+                    )
+
+        return results
+
     @staticmethod
     def compute_mae(y, y_pred, *args):
         """
@@ -460,6 +537,142 @@ class MetricModule:
         return np.mean(lcc_matrix)
 
 
+def percentile_ci(bootstrap_values, confidence_level=BOOTSTRAP_CONFIDENCE_LEVEL):
+    """
+    Computes the percentile confidence interval and the standard error of a metric
+    from its values on bootstrap resamples.
+
+    Args:
+        bootstrap_values (np.ndarray): values of the metric on the resamples
+        confidence_level (float): confidence level of the interval
+    Returns:
+        (Tuple[float, float, float]) lower bound, upper bound and standard error
+    """
+    alpha = (1 - confidence_level) / 2
+    lower_ci, upper_ci = np.percentile(
+        bootstrap_values, [100 * alpha, 100 * (1 - alpha)]
+    )
+    standard_error = np.std(bootstrap_values, ddof=1)
+
+    return lower_ci, upper_ci, standard_error
+
+
+_confusion_metric_keys = {
+    "accuracy",
+    "sensitivity",
+    "specificity",
+    "ppv",
+    "npv",
+    "f1_score",
+    "ba",
+    "mcc",
+    "mk",
+    "lr_plus",
+    "lr_minus",
+}
+
+_regression_metric_keys = {"mae", "rmse", "r2_score"}
+
+
+def _safe_divide(numerator, denominator):
+    """Element-wise division which returns 0 where the denominator is 0, as the metric functions."""
+    return np.divide(
+        numerator,
+        denominator,
+        out=np.zeros(np.shape(numerator)),
+        where=denominator != 0,
+    )
+
+
+def _confusion_matrices(y, y_pred, indices, classes):
+    """
+    Args:
+        y (np.ndarray): array of labels
+        y_pred (np.ndarray): array of predictions
+        indices (np.ndarray): indices of the resamples, of shape (n_resamples, len(y))
+        classes (np.ndarray): sorted values of all the classes
+    Returns:
+        (np.ndarray) confusion matrices (true class x predicted class) of the resamples
+    """
+    n_resamples = len(indices)
+    n_classes = len(classes)
+    y_codes = np.searchsorted(classes, y)[indices]
+    y_pred_codes = np.searchsorted(classes, y_pred)[indices]
+    offsets = np.arange(n_resamples)[:, np.newaxis] * n_classes**2
+    confusion = np.bincount(
+        (offsets + y_codes * n_classes + y_pred_codes).ravel(),
+        minlength=n_resamples * n_classes**2,
+    )
+    return confusion.reshape(n_resamples, n_classes, n_classes)
+
+
+def _confusion_metrics(confusion, class_index):
+    """
+    Args:
+        confusion (np.ndarray): confusion matrices of the resamples
+        class_index (int): index of the class studied in the confusion matrices
+    Returns:
+        (Dict[str:np.ndarray]) values of the metrics on the resamples
+    """
+    confusion = confusion.astype(float)
+    total = confusion.sum(axis=(1, 2))
+    true_positive = confusion[:, class_index, class_index]
+    false_negative = confusion[:, class_index, :].sum(axis=1) - true_positive
+    false_positive = confusion[:, :, class_index].sum(axis=1) - true_positive
+    true_negative = total - true_positive - false_negative - false_positive
+
+    sensitivity = _safe_divide(true_positive, true_positive + false_negative)
+    specificity = _safe_divide(true_negative, false_positive + true_negative)
+    ppv = _safe_divide(true_positive, true_positive + false_positive)
+    npv = _safe_divide(true_negative, true_negative + false_negative)
+    mcc_denominator = np.sqrt(
+        (true_positive + false_positive)
+        * (true_positive + false_negative)
+        * (true_negative + false_positive)
+        * (true_negative + false_negative)
+    )
+
+    return {
+        "accuracy": np.trace(confusion, axis1=1, axis2=2) / total,
+        "sensitivity": sensitivity,
+        "specificity": specificity,
+        "ppv": ppv,
+        "npv": npv,
+        "f1_score": _safe_divide(2 * (ppv * sensitivity), ppv + sensitivity),
+        "ba": (sensitivity + specificity) / 2,
+        "mcc": _safe_divide(
+            true_positive * true_negative - false_positive * false_negative,
+            mcc_denominator,
+        ),
+        "mk": ppv + npv - 1,
+        "lr_plus": _safe_divide(sensitivity, 1 - specificity),
+        "lr_minus": _safe_divide(1 - sensitivity, specificity),
+    }
+
+
+def _regression_metrics(y, y_pred):
+    """
+    Args:
+        y (np.ndarray): labels of the resamples, of shape (n_resamples, n_samples)
+        y_pred (np.ndarray): predictions of the resamples, of shape (n_resamples, n_samples)
+    Returns:
+        (Dict[str:np.ndarray]) values of the metrics on the resamples
+    """
+    residuals = y - y_pred
+    total_sum_squares = np.sum((y - np.mean(y, axis=1, keepdims=True)) ** 2, axis=1)
+    residual_sum_squares = np.sum(residuals**2, axis=1)
+
+    return {
+        "mae": np.mean(np.abs(residuals), axis=1),
+        "rmse": np.sqrt(np.mean(residuals**2, axis=1)),
+        "r2_score": np.where(
+            total_sum_squares != 0,
+            1 - _safe_divide(residual_sum_squares, total_sum_squares),
+            0,
+        ),
+    }
+
+
 class RetainBest:
     """
     A class to retain the best and overfitting values for a set of wanted metrics.
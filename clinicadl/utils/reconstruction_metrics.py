@@ -0,0 +1,207 @@
+"""
+Metrics of image reconstruction computed with PyTorch on a whole batch of images.
+
+The functions take the true and reconstructed images as tensors of shape (N, C, *spatial)
+on any device and return a tensor of shape (N,) with the value of the metric for each image.
+They return the same values as the corresponding methods of MetricModule, which are
+computed on one image at a time with NumPy, scikit-image and SciPy.
+"""
+
+from functools import lru_cache
+from typing import Callable, Dict, Sequence, Tuple
+
+import torch
+
+# Parameters of the Gaussian window of SSIM (as in clinicadl.utils.pytorch_ssim)
+SSIM_WINDOW_SIZE = 11
+SSIM_SIGMA = 1.5
+SSIM_C1 = 0.01**2
+SSIM_C2 = 0.03**2
+# Parameters of the Gaussian filter of LNCC (as scipy.ndimage.gaussian_filter with sigma=2)
+LNCC_SIGMA = 2
+LNCC_TRUNCATE = 4.0
+
+
+@lru_cache(maxsize=None)
+def gaussian_kernel(radius: int, sigma: float) -> Tuple[float, ...]:
+    """
+    Computes a normalized 1D Gaussian kernel. Kernels are cached, so that they are
+    only built once.
+
+    Args:
+        radius: the kernel size is 2 * radius + 1.
+        sigma: standard deviation of the Gaussian.
+    Returns:
+        the weights of the kernel.
+    """
+    x = torch.arange(-radius, radius + 1, dtype=torch.float64)
+    kernel = torch.exp(-(x**2) / (2 * sigma**2))
+    return tuple((kernel / kernel.sum()).tolist())
+
+
+def _reflect_indices(size: int, radius: int, device: torch.device) -> torch.Tensor:
+    """
+    Indices of an axis of length size padded by radius on each side with the 'reflect'
+    mode of scipy.ndimage (d c b a | a b c d | d c b a).
+    """
+    indices = torch.arange(-radius, size + radius, device=device) % (2 * size)
+    return torch.where(indices >= size, 2 * size - 1 - indices, indices)
+
+
+def gaussian_filter(
+    x: torch.Tensor,
+    sigma: float,
+    radius: int,
+    dims: Sequence[int],
+    padding: str = "zeros",
+) -> torch.Tensor:
+    """
+    Applies a Gaussian filter along several dimensions of a tensor, one dimension
+    after the other.
+
+    Along each dimension, the filtered tensor is the weighted sum of shifted views
+    of the padded tensor, which is much faster on CPU than a convolution with
+    a single input channel.
+
+    Args:
+        x: input tensor.
+        sigma: standard deviation of the Gaussian.
+        radius: radius of the kernel.
+        dims: dimensions along which the filter is applied.
+        padding: 'zeros' pads the borders with zeros, 'reflect' with the 'reflect'
+            mode of scipy.ndimage.
+    Returns:
+        the filtered tensor, of the same shape as x.
+    """
+    kernel = gaussian_kernel(radius, sigma)
+    for dim in dims:
+        size = x.shape[dim]
+        if padding == "reflect":
+            padded = x.index_select(dim, _reflect_indices(size, radius, x.device))
+        else:
+            pad_shape = list(x.shape)
+            pad_shape[dim] = radius
+            zeros = x.new_zeros(pad_shape)
+            padded = torch.cat([zeros, x, zeros], dim=dim)
+
+        x = padded.narrow(dim, 0, size) * kernel[0]
+        for shift, weight in enumerate(kernel[1:], start=1):
+            x.add_(padded.narrow(dim, shift, size), alpha=weight)
+    return x
+
+
+def _mean_per_image(x: torch.Tensor) -> torch.Tensor:
+    return x.flatten(1).mean(1)
+
+
+def batch_mae(y: torch.Tensor, y_pred: torch.Tensor) -> torch.Tensor:
+    """Mean absolute error of each image."""
+    return _mean_per_image(torch.abs(y - y_pred))
+
+
+def batch_mse(y: torch.Tensor, y_pred: torch.Tensor) -> torch.Tensor:
+    """Mean squared error of each image."""
+    return _mean_per_image(torch.square(y - y_pred))
+
+
+def batch_rmse(y: torch.Tensor, y_pred: torch.Tensor) -> torch.Tensor:
+    """Root mean squared error of each image."""
+    return torch.sqrt(batch_mse(y, y_pred))
+
+
+def batch_psnr(y: torch.Tensor, y_pred: torch.Tensor) -> torch.Tensor:
+    """
+    Peak signal-to-noise ratio of each image.
+
+    As in skimage.metrics.peak_signal_noise_ratio, the data range is 1 if the true image
+    is positive and 2 otherwise, and the values of the true image must be in [-1, 1].
+
+    Args:
+        y: true images.
+        y_pred: reconstructed images.
+    Returns:
+        the PSNR of each image.
+    """
+    y_flat = y.flatten(1)
+    true_min, true_max = y_flat.min(1).values, y_flat.max(1).values
+    if (true_max > 1).any() or (true_min < -1).any():
+        raise ValueError(
+            "image_true has intensity values outside the range expected "
+            "for its data type. Please manually specify the data_range."
+        )
+    data_range = torch.where(true_min >= 0, 1.0, 2.0).to(y.dtype)
+    return 10 * torch.log10(data_range**2 / batch_mse(y, y_pred))
+
+
+def batch_ssim(y: torch.Tensor, y_pred: torch.Tensor) -> torch.Tensor:
+    """
+    Structural similarity of each image, computed with a Gaussian window of size 11
+    on the spatial dimensions of 2D or 3D images, as in clinicadl.utils.pytorch_ssim.
+
+    Args:
+        y: true images.
+        y_pred: reconstructed images.
+    Returns:
+        the SSIM of each image.
+    """
+    dims = range(2, y.dim())
+    radius = SSIM_WINDOW_SIZE // 2
+
+    def local_mean(x):
+        return gaussian_filter(x, SSIM_SIGMA, radius, dims)
+
+    mu1 = local_mean(y)
+    mu2 = local_mean(y_pred)
+    mu1_sq = mu1.pow(2)
+    mu2_sq = mu2.pow(2)
+    mu1_mu2 = mu1 * mu2
+    sigma1_sq = local_mean(y * y) - mu1_sq
+    sigma2_sq = local_mean(y_pred * y_pred) - mu2_sq
+    sigma12 = local_mean(y * y_pred) - mu1_mu2
+
+    ssim_map = ((2 * mu1_mu2 + SSIM_C1) * (2 * sigma12 + SSIM_C2)) / (
+        (mu1_sq + mu2_sq + SSIM_C1) * (sigma1_sq + sigma2_sq + SSIM_C2)
+    )
+    return _mean_per_image(ssim_map)
+
+
+def batch_lncc(y: torch.Tensor, y_pred: torch.Tensor) -> torch.Tensor:
+    """
+    Local normalized cross-correlation of each image, computed with a Gaussian filter
+    of standard deviation 2 as in MetricModule.compute_lncc.
+
+    Args:
+        y: true images.
+        y_pred: reconstructed images.
+    Returns:
+        the LNCC of each image.
+    """
+    # scipy.ndimage.gaussian_filter also filters the channel dimension
+    dims = range(1, y.dim())
+    radius = int(LNCC_TRUNCATE * LNCC_SIGMA + 0.5)
+
+    def local_mean(x):
+        return gaussian_filter(x, LNCC_SIGMA, radius, dims, padding="reflect")
+
+    mean1 = local_mean(y)
+    mean2 = local_mean(y_pred)
+    mean12 = local_mean(y * y_pred)
+    mean11 = local_mean(y * y)
+    mean22 = local_mean(y_pred * y_pred)
+
+    covar12 = mean12 - (mean1 * mean2)
+    var1 = torch.sqrt(mean11 - (mean1 * mean1))
+    var2 = torch.sqrt(mean22 - (mean2 * mean2))
+
+    lcc_matrix = torch.maximum(covar12 / (var1 * var2), torch.zeros_like(covar12))
+    return _mean_per_image(lcc_matrix)
+
+
+batch_metrics: Dict[str, Callable[[torch.Tensor, torch.Tensor], torch.Tensor]] = {
+    "MAE": batch_mae,
+    "MSE": batch_mse,
+    "RMSE": batch_rmse,
+    "PSNR": batch_psnr,
+    "SSIM": batch_ssim,
+    "LNCC": batch_lncc,
+}
@@ -8,6 +8,7 @@ from torch.nn.functional import softmax
 from torch.utils.data import sampler
 from torch.utils.data.distributed import DistributedSampler
 
+from clinicadl.utils.caps_dataset.sampler import ImageGroupedSampler
 from clinicadl.utils.exceptions import ClinicaDLArgumentError
 from clinicadl.utils.task_manager.task_manager import TaskManager
 
@@ -21,11 +22,12 @@ class ClassificationManager(TaskManager):
         n_classes=None,
         df=None,
         label=None,
+        n_proc=1,
     ):
         if n_classes is None:
             n_classes = self.output_size(None, df, label)
         self.n_classes = n_classes
-        super().__init__(mode, n_classes)
+        super().__init__(mode, n_classes, n_proc=n_proc)
 
     @property
     def columns(self):
@@ -71,6 +73,21 @@ class ClassificationManager(TaskManager):
             + [normalized_output[i].item() for i in range(self.n_classes)]
         ]
 
+    def generate_test_rows(self, data, outputs):
+        predictions = torch.argmax(outputs.data, dim=1).tolist()
+        normalized_outputs = softmax(outputs, dim=1)[:, : self.n_classes].tolist()
+        return [
+            [participant, session, elem_idx, label, prediction] + probabilities
+            for participant, session, elem_idx, label, prediction, probabilities in zip(
+                data["participant_id"],
+                data["session_id"],
+                data[f"{self.mode}_id"].tolist(),
+                data["label"].tolist(),
+                predictions,
+                normalized_outputs,
+            )
+        ]
+
     def compute_metrics(self, results_df, report_ci):
         return self.metrics_module.apply(
             results_df.true_label.values,
@@ -127,6 +144,8 @@ class ClassificationManager(TaskManager):
             else:
                 length = len(weights)
             return sampler.WeightedRandomSampler(weights, length)
+        elif sampler_option == "grouped":
+            return ImageGroupedSampler(dataset, num_replicas=dp_degree, rank=rank)
         else:
             raise NotImplementedError(
                 f"The option {sampler_option} for sampler on classification task is not implemented"
@@ -187,52 +206,36 @@ class ClassificationManager(TaskManager):
             results (Dict[str, float]) the metrics on the image level
         """
 
-        def check_prediction(row):
-            if row["true_label"] == row["predicted_label"]:
-                return 1
-            else:
-                return 0
+        proba_columns = [f"proba{i}" for i in range(self.n_classes)]
+        df_final, probas, element_ids = self.pivot_elements(
+            performance_df, proba_columns
+        )
 
         if method == "soft":
             # Compute the sub-level accuracies on the validation set:
-            validation_df["accurate_prediction"] = validation_df.apply(
-                lambda x: check_prediction(x), axis=1
-            )
+            validation_df["accurate_prediction"] = (
+                validation_df["true_label"] == validation_df["predicted_label"]
+            ).astype(int)
             sub_level_accuracies = validation_df.groupby(f"{self.mode}_id")[
                 "accurate_prediction"
             ].mean()
             if selection_threshold is not None:
                 sub_level_accuracies[sub_level_accuracies < selection_threshold] = 0
             weight_series = sub_level_accuracies / sub_level_accuracies.sum()
+            weights = weight_series.reindex(element_ids).to_numpy()
         elif method == "hard":
-            n_modes = validation_df[f"{self.mode}_id"].nunique()
-            weight_series = pd.DataFrame(np.ones((n_modes, 1)))
+            weights = None
         else:
             raise NotImplementedError(
                 f"Ensemble method {method} was not implemented. "
                 f"Please choose in ['hard', 'soft']."
             )
 
-        # Sort to allow weighted average computation
-        performance_df.sort_values(
-            ["participant_id", "session_id", f"{self.mode}_id"], inplace=True
-        )
-        weight_series.sort_index(inplace=True)
-
-        # Soft majority vote
-        df_final = pd.DataFrame(columns=self.columns)
-        for (subject, session), subject_df in performance_df.groupby(
-            ["participant_id", "session_id"]
-        ):
-            label = subject_df["true_label"].unique().item()
-            proba_list = [
-                np.average(subject_df[f"proba{i}"], weights=weight_series)
-                for i in range(self.n_classes)
-            ]
-            prediction = proba_list.index(max(proba_list))
-            row = [[subject, session, 0, label, prediction] + proba_list]
-            row_df = pd.DataFrame(row, columns=self.columns)
-            df_final = pd.concat([df_final, row_df])
+        # Weighted average of the probabilities of all the parts of each image
+        image_probas = np.average(probas, axis=2, weights=weights)
+        df_final.insert(2, f"{self.mode}_id", 0)
+        df_final["predicted_label"] = image_probas.argmax(axis=1)
+        df_final[proba_columns] = image_probas
 
         if use_labels:
             results = self.compute_metrics(df_final, report_ci=False)
@@ -1,8 +1,11 @@
+import torch
 from torch import nn
 from torch.utils.data import sampler
 from torch.utils.data.distributed import DistributedSampler
 
+from clinicadl.utils.caps_dataset.sampler import ImageGroupedSampler
 from clinicadl.utils.exceptions import ClinicaDLArgumentError
+from clinicadl.utils.reconstruction_metrics import batch_metrics
 from clinicadl.utils.task_manager.task_manager import TaskManager
 
 
@@ -10,8 +13,9 @@ class ReconstructionManager(TaskManager):
     def __init__(
         self,
         mode,
+        n_proc=1,
     ):
-        super().__init__(mode)
+        super().__init__(mode, n_proc=n_proc)
 
     @property
     def columns(self):
@@ -42,14 +46,41 @@ class ReconstructionManager(TaskManager):
             row.append(metrics[metric])
         return [row]
 
+    def generate_test_rows(self, data, outputs):
+        # The metrics of the whole batch are computed at once, on the device of the outputs
+        images = data["image"].to(outputs.device, non_blocking=True)
+        metrics = torch.stack(
+            [
+                batch_metrics[metric](images, outputs)
+                for metric in self.evaluation_metrics
+            ],
+            dim=1,
+        ).tolist()
+        return [
+            [participant, session, elem_idx] + elem_metrics
+            for participant, session, elem_idx, elem_metrics in zip(
+                data["participant_id"],
+                data["session_id"],
+                data[f"{self.mode}_id"].tolist(),
+                metrics,
+            )
+        ]
+
     def compute_metrics(self, results_df, report_ci=False):
         if not report_ci:
             return {
                 metric: results_df[metric].mean() for metric in self.evaluation_metrics
             }
 
-        from numpy import mean as np_mean
-        from scipy.stats import bootstrap
+        import numpy as np
+
+        from clinicadl.utils.metric_module import BOOTSTRAP_N_RESAMPLES, percentile_ci
+
+        # The same resamples of the images are used for all the metrics
+        rng = np.random.default_rng(self.metrics_module.seed)
+        indices = rng.integers(
+            len(results_df), size=(BOOTSTRAP_N_RESAMPLES, len(results_df))
+        )
 
         metrics = dict()
         metric_names = ["Metrics"]
@@ -63,18 +94,11 @@ class ReconstructionManager(TaskManager):
 
             metric_result = metric_vals.mean()
 
-            metric_vals = (metric_vals,)
             # Compute confidence intervals only if there are at least two samples in the data.
             if len(results_df) >= 2:
-                res = bootstrap(
-                    metric_vals,
-                    np_mean,
-                    n_resamples=3000,
-                    confidence_level=0.95,
-                    method="percentile",
+                lower_ci, upper_ci, standard_error = percentile_ci(
+                    metric_vals.to_numpy()[indices].mean(axis=1)
                 )
-                lower_ci, upper_ci = res.confidence_interval
-                standard_error = res.standard_error
             else:
                 lower_ci, upper_ci, standard_error = "N/A"
 
@@ -115,6 +139,8 @@ class ReconstructionManager(TaskManager):
                 )
             else:
                 return sampler.RandomSampler(weights)
+        elif sampler_option == "grouped":
+            return ImageGroupedSampler(dataset, num_replicas=dp_degree, rank=rank)
         else:
             raise NotImplementedError(
                 f"The option {sampler_option} for sampler on reconstruction task is not implemented"
@@ -4,6 +4,7 @@ from torch import nn
 from torch.utils.data import sampler
 from torch.utils.data.distributed import DistributedSampler
 
+from clinicadl.utils.caps_dataset.sampler import ImageGroupedSampler
 from clinicadl.utils.exceptions import ClinicaDLArgumentError
 from clinicadl.utils.task_manager.task_manager import TaskManager
 
@@ -12,8 +13,9 @@ class RegressionManager(TaskManager):
     def __init__(
         self,
         mode,
+        n_proc=1,
     ):
-        super().__init__(mode)
+        super().__init__(mode, n_proc=n_proc)
 
     @property
     def columns(self):
@@ -44,6 +46,18 @@ class RegressionManager(TaskManager):
             ]
         ]
 
+    def generate_test_rows(self, data, outputs):
+        return [
+            [participant, session, elem_idx, label, prediction]
+            for participant, session, elem_idx, label, prediction in zip(
+                data["participant_id"],
+                data["session_id"],
+                data[f"{self.mode}_id"].tolist(),
+                data["label"].reshape(-1).tolist(),
+                outputs.reshape(-1).tolist(),
+            )
+        ]
+
     def compute_metrics(self, results_df, report_ci):
         return self.metrics_module.apply(
             results_df.true_label.values,
@@ -97,6 +111,8 @@ class RegressionManager(TaskManager):
             else:
                 length = len(weights)
             return sampler.WeightedRandomSampler(weights, length)
+        elif sampler_option == "grouped":
+            return ImageGroupedSampler(dataset, num_replicas=dp_degree, rank=rank)
         else:
             raise NotImplementedError(
                 f"The option {sampler_option} for sampler on regression task is not implemented"
@@ -134,26 +150,13 @@ class RegressionManager(TaskManager):
                 f"The only method implemented for regression is hard-voting."
             )
 
-        n_modes = validation_df[f"{self.mode}_id"].nunique()
-        weight_series = np.ones(n_modes)
-
-        # Sort to allow weighted average computation
-        performance_df.sort_values(
-            ["participant_id", "session_id", f"{self.mode}_id"], inplace=True
+        df_final, predictions, _ = self.pivot_elements(
+            performance_df, ["predicted_label"]
         )
 
-        # Soft majority vote
-        df_final = pd.DataFrame(columns=self.columns)
-        for (subject, session), subject_df in performance_df.groupby(
-            ["participant_id", "session_id"]
-        ):
-            label = subject_df["true_label"].unique().item()
-            prediction = np.average(
-                subject_df["predicted_label"], weights=weight_series
-            )
-            row = [[subject, session, 0, label, prediction]]
-            row_df = pd.DataFrame(row, columns=self.columns)
-            df_final = pd.concat([df_final, row_df])
+        # Average of the predictions of all the parts of each image
+        df_final.insert(2, f"{self.mode}_id", 0)
+        df_final["predicted_label"] = np.average(predictions[:, 0], axis=1)
 
         if use_labels:
             results = self.compute_metrics(df_final, report_ci=False)
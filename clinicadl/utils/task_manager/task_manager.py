@@ -1,6 +1,8 @@
 from abc import abstractmethod
+from time import perf_counter
 from typing import Any, Dict, List, Optional, Sequence, Tuple
 
+import numpy as np
 import pandas as pd
 import torch
 import torch.distributed as dist
@@ -9,7 +11,8 @@ from torch.cuda.amp import autocast
 from torch.nn.modules.loss import _Loss
 from torch.utils.data import DataLoader, Sampler
 
-from clinicadl.utils.caps_dataset.data import CapsDataset
+from clinicadl.utils.callbacks.callbacks import PerformanceCounters
+from clinicadl.utils.caps_dataset.data import CapsDataset, get_element_batch
 from clinicadl.utils.maps_manager.ddp import cluster
 from clinicadl.utils.metric_module import MetricModule
 from clinicadl.utils.network.network import Network
@@ -18,9 +21,11 @@ from clinicadl.utils.network.network import Network
 # TODO: add function to check that the output size of the network corresponds to what is expected to
 #  perform the task
 class TaskManager:
-    def __init__(self, mode: str, n_classes: int = None):
+    def __init__(self, mode: str, n_classes: int = None, n_proc: int = 1):
         self.mode = mode
-        self.metrics_module = MetricModule(self.evaluation_metrics, n_classes=n_classes)
+        self.metrics_module = MetricModule(
+            self.evaluation_metrics, n_classes=n_classes, n_proc=n_proc
+        )
 
     @property
     @abstractmethod
@@ -62,6 +67,26 @@ class TaskManager:
         """
         pass
 
+    def generate_test_rows(
+        self, data: Dict[str, Any], outputs: Tensor
+    ) -> List[List[Any]]:
+        """
+        Computes the rows of the prediction TSV file corresponding to a whole batch.
+
+        By default generate_test_row is called on each input of the batch. Task managers
+        override it to compute all the rows at once.
+
+        Args:
+            data: input batch generated by a DataLoader on a CapsDataset.
+            outputs: output batch generated by a forward pass in the model.
+        Returns:
+            list of the rows of the prediction TSV file.
+        """
+        rows = []
+        for idx in range(len(data["participant_id"])):
+            rows += self.generate_test_row(idx, data, outputs)
+        return rows
+
     @abstractmethod
     def compute_metrics(self, results_df: pd.DataFrame) -> Dict[str, float]:
         """
@@ -101,6 +126,42 @@ class TaskManager:
         """
         pass
 
+    def pivot_elements(
+        self, performance_df: pd.DataFrame, values: List[str]
+    ) -> Tuple[pd.DataFrame, np.ndarray, pd.Index]:
+        """
+        Gathers the results of all the parts of each image in an array, so that
+        ensemble_prediction assembles them with array operations.
+
+        Args:
+            performance_df: results on the parts of the images.
+            values: columns of performance_df gathered in the array.
+        Returns:
+            the participant_id, session_id and true_label of each image, sorted by participant and session,
+            the array of shape (n_images, len(values), n_elements) of the values of the parts of each image,
+            and the indices of the parts corresponding to the last axis of the array.
+        """
+        index = ["participant_id", "session_id"]
+        # Results read with MapsManager.get_prediction are indexed by participant and session
+        index_levels = [name for name in index if name in performance_df.index.names]
+        if index_levels:
+            performance_df = performance_df.reset_index(index_levels)
+        labels = performance_df.groupby(index)["true_label"]
+        if (labels.nunique(dropna=False) > 1).any():
+            raise ValueError("All the parts of an image must have the same true label.")
+
+        pivot_df = performance_df.pivot(
+            index=index, columns=f"{self.mode}_id", values=values
+        )[values]
+        if pivot_df.isna().to_numpy().any():
+            raise ValueError(
+                f"The results of some {self.mode}s are missing to assemble the images."
+            )
+        element_ids = pivot_df.columns.unique(level=1)
+        array = pivot_df.to_numpy().reshape(len(pivot_df), len(values), -1)
+
+        return labels.first().reset_index(), array, element_ids
+
     @staticmethod
     @abstractmethod
     def generate_label_code(df: pd.DataFrame, label: str) -> Optional[Dict[str, int]]:
@@ -183,6 +244,7 @@ class TaskManager:
         use_labels: bool = True,
         amp: bool = False,
         report_ci=False,
+        performance: Optional[PerformanceCounters] = None,
     ) -> Tuple[pd.DataFrame, Dict[str, float]]:
         """
         Computes the predictions and evaluation metrics.
@@ -200,35 +262,123 @@ class TaskManager:
             and metrics dict will be created.
         amp: bool
             If True, enables Pytorch's automatic mixed precision.
+        performance: PerformanceCounters
+            If given, the evaluation time and the time spent waiting for data are added to the counters.
 
         Returns
         -------
             the results and metrics on the image level.
         """
-        model.eval()
+        return self.test_models(
+            [model],
+            dataloader,
+            criterion,
+            use_labels=use_labels,
+            amp=amp,
+            report_ci=report_ci,
+            performance=performance,
+        )[0]
+
+    def test_models(
+        self,
+        models: List[Network],
+        dataloader: DataLoader,
+        criterion: _Loss,
+        use_labels: bool = True,
+        amp: bool = False,
+        report_ci=False,
+        elements: Optional[List[int]] = None,
+        performance: Optional[PerformanceCounters] = None,
+    ) -> List[Tuple[pd.DataFrame, Dict[str, float]]]:
+        """
+        Computes the predictions and evaluation metrics of several models
+        while reading the data only once: each batch is fed to all the models.
+
+        Args:
+            models: the models trained.
+            dataloader: wrapper of a CapsDataset.
+            criterion: function to calculate the loss.
+            use_labels: If True the true_label will be written in output DataFrame
+                and metrics dict will be created.
+            amp: If True, enables Pytorch's automatic mixed precision.
+            report_ci: If True confidence intervals are computed for the metrics.
+            elements: index of the element fed to each model, when the dataloader wraps
+                a CapsDatasetAllElements (networks of a multi-network framework).
+            performance: If given, the evaluation time and the time spent waiting
+                for data are added to the counters.
+        Returns:
+            the results and metrics on the image level of each model.
+        """
+        tic = perf_counter()
+        for model in models:
+            model.eval()
         dataloader.dataset.eval()
+        batches = (
+            dataloader
+            if performance is None
+            else performance.iterate(dataloader, "evaluation_data")
+        )
 
-        results_df = pd.DataFrame(columns=self.columns)
-        total_loss = {}
+        models_rows = [[] for _ in models]
+        models_loss = [{} for _ in models]
         with torch.no_grad():
-            for i, data in enumerate(dataloader):
-                # initialize the loss list to save the loss components
-                with autocast(enabled=amp):
-                    outputs, loss_dict = model(data, criterion, use_labels=use_labels)
+            for i, data in enumerate(batches):
+                for j, (model, rows, total_loss) in enumerate(
+                    zip(models, models_rows, models_loss)
+                ):
+                    model_data = (
+                        data
+                        if elements is None
+                        else get_element_batch(data, elements[j], self.mode)
+                    )
+                    # initialize the loss list to save the loss components
+                    with autocast(enabled=amp):
+                        outputs, loss_dict = model(
+                            model_data, criterion, use_labels=use_labels
+                        )
+
+                    if i == 0:
+                        for loss_component in loss_dict.keys():
+                            total_loss[loss_component] = 0
+                    for loss_component in total_loss.keys():
+                        total_loss[loss_component] += loss_dict[loss_component].float()
+
+                    # Generate detailed DataFrame
+                    rows += self.generate_test_rows(model_data, outputs.float())
+
+                    del outputs, loss_dict
+
+        results = [
+            self.compute_results(
+                rows, total_loss, use_labels=use_labels, report_ci=report_ci
+            )
+            for rows, total_loss in zip(models_rows, models_loss)
+        ]
+        torch.cuda.empty_cache()
+        if performance is not None:
+            performance.add("evaluation", perf_counter() - tic)
 
-                if i == 0:
-                    for loss_component in loss_dict.keys():
-                        total_loss[loss_component] = 0
-                for loss_component in total_loss.keys():
-                    total_loss[loss_component] += loss_dict[loss_component].float()
+        return results
 
-                # Generate detailed DataFrame
-                for idx in range(len(data["participant_id"])):
-                    row = self.generate_test_row(idx, data, outputs.float())
-                    row_df = pd.DataFrame(row, columns=self.columns)
-                    results_df = pd.concat([results_df, row_df])
+    def compute_results(
+        self,
+        rows: List[List[Any]],
+        total_loss: Dict[str, Tensor],
+        use_labels: bool = True,
+        report_ci: bool = False,
+    ) -> Tuple[pd.DataFrame, Dict[str, float]]:
+        """
+        Gathers the predictions computed by all the processes and computes the evaluation metrics.
 
-                del outputs, loss_dict
+        Args:
+            rows: rows of the prediction TSV file computed with generate_test_rows.
+            total_loss: sum over the batches of each loss component.
+            use_labels: If True metrics dict will be created.
+            report_ci: If True confidence intervals are computed for the metrics.
+        Returns:
+            the results and metrics on the image level.
+        """
+        results_df = pd.DataFrame(rows, columns=self.columns)
         dataframes = [None] * dist.get_world_size()
         dist.gather_object(
             results_df, dataframes if dist.get_rank() == 0 else None, dst=0
@@ -256,8 +406,6 @@ class TaskManager:
                 else:
                     metrics_dict[loss_component] = loss_value
 
-        torch.cuda.empty_cache()
-
         return results_df, metrics_dict
 
     def test_da(
@@ -284,7 +432,7 @@ class TaskManager:
         """
         model.eval()
         dataloader.dataset.eval()
-        results_df = pd.DataFrame(columns=self.columns)
+        rows = []
         total_loss = 0
         with torch.no_grad():
             for i, data in enumerate(dataloader):
@@ -294,13 +442,10 @@ class TaskManager:
                 total_loss += loss_dict["loss"].item()
 
                 # Generate detailed DataFrame
-                for idx in range(len(data["participant_id"])):
-                    row = self.generate_test_row(idx, data, outputs)
-                    row_df = pd.DataFrame(row, columns=self.columns)
-                    results_df = pd.concat([results_df, row_df])
+                rows += self.generate_test_rows(data, outputs)
 
                 del outputs, loss_dict
-            results_df.reset_index(inplace=True, drop=True)
+        results_df = pd.DataFrame(rows, columns=self.columns)
 
         if not use_labels:
             metrics_dict = None
@@ -11,6 +11,9 @@ from clinicadl.utils.exceptions import ClinicaDLTSVError
 
 logger = getLogger("clinicadl")
 
+# Number of candidate splits drawn and evaluated at once by the split and kfold tools
+SPLIT_CANDIDATES_BATCH = 1000
+
 
 def merged_tsv_reader(merged_tsv_path: Path) -> pd.DataFrame:
     if not merged_tsv_path.is_file():
@@ -126,6 +129,215 @@ def chi2(x_test, x_train):
     return T, p
 
 
+def stratified_test_masks(
+    y: np.ndarray, n_test: int, n_candidates: int, rng: np.random.Generator
+) -> np.ndarray:
+    """
+    Draws several stratified shuffle splits at once.
+
+    As in StratifiedShuffleSplit, the number of test samples of each class is proportional
+    to the size of the class, the remaining samples being given to the classes with the
+    largest fractional parts.
+
+    Parameters
+    ----------
+    y: array of shape (n_samples,)
+        Labels used for the stratification.
+    n_test: int
+        Number of samples in the test set.
+    n_candidates: int
+        Number of splits drawn.
+    rng: np.random.Generator
+        Random generator used to draw the splits.
+
+    Returns
+    -------
+    Boolean array of shape (n_candidates, n_samples), True for the samples in the test set.
+    """
+    classes, y_indices, class_counts = np.unique(
+        y, return_inverse=True, return_counts=True
+    )
+    continuous = class_counts * n_test / len(y)
+    class_n_test = np.floor(continuous).astype(int)
+    remainder = n_test - class_n_test.sum()
+    order = np.lexsort((rng.random(len(classes)), class_n_test - continuous))
+    class_n_test[order[:remainder]] += 1
+
+    test_masks = np.zeros((n_candidates, len(y)), dtype=bool)
+    for class_index, class_test in enumerate(class_n_test):
+        if class_test == 0:
+            continue
+        members = np.flatnonzero(y_indices == class_index)
+        keys = rng.random((n_candidates, len(members)))
+        chosen = np.argpartition(keys, class_test - 1, axis=1)[:, :class_test]
+        np.put_along_axis(test_masks, members[chosen], True, axis=1)
+    return test_masks
+
+
+def stratified_fold_candidates(
+    y: np.ndarray, n_splits: int, n_candidates: int, rng: np.random.Generator
+) -> np.ndarray:
+    """
+    Draws several stratified k-fold splits at once.
+
+    As in StratifiedKFold, the samples are sorted by class and dealt to the folds in turn,
+    so that the classes and the sizes of the folds are balanced.
+
+    Parameters
+    ----------
+    y: array of shape (n_samples,)
+        Labels used for the stratification.
+    n_splits: int
+        Number of folds.
+    n_candidates: int
+        Number of k-fold splits drawn.
+    rng: np.random.Generator
+        Random generator used to draw the splits.
+
+    Returns
+    -------
+    Integer array of shape (n_candidates, n_samples) with the fold of each sample.
+    """
+    y_indices = np.unique(y, return_inverse=True)[1]
+    keys = y_indices + rng.random((n_candidates, len(y)))
+    order = np.argsort(keys, axis=1)
+    folds = np.empty((n_candidates, len(y)), dtype=int)
+    np.put_along_axis(
+        folds, order, np.broadcast_to(np.arange(len(y)) % n_splits, order.shape), axis=1
+    )
+    return folds
+
+
+def ttest_pvalues(
+    test_masks: np.ndarray, values: np.ndarray, supplementary_train_values=()
+) -> np.ndarray:
+    """
+    Computes the p-values of the T-tests (ttest_ind, nan_policy="omit") between the
+    test and train values of several candidate splits.
+
+    Parameters
+    ----------
+    test_masks: array of shape (n_candidates, n_samples)
+        True for the samples in the test set of each candidate.
+    values: array of shape (n_samples,)
+        Values compared between the test and train sets.
+    supplementary_train_values: array
+        Values always included in the train set.
+
+    Returns
+    -------
+    Array of shape (n_candidates,) with the p-value of each candidate.
+    """
+    from scipy.stats import t as t_distribution
+
+    values = np.asarray(values, dtype=float)
+    supplementary_train_values = np.asarray(supplementary_train_values, dtype=float)
+    supplementary_train_values = supplementary_train_values[
+        ~np.isnan(supplementary_train_values)
+    ]
+    valid = ~np.isnan(values)
+    # Values are centered to limit rounding errors on the sums of squares
+    center = np.mean(np.concatenate([values[valid], supplementary_train_values]))
+    centered = np.where(valid, values - center, 0)
+    supplementary_centered = supplementary_train_values - center
+
+    masks = test_masks.astype(float)
+    n_test = masks @ valid
+    sum_test = masks @ centered
+    squares_test = masks @ centered**2
+    n_train = valid.sum() - n_test + len(supplementary_centered)
+    sum_train = centered.sum() - sum_test + supplementary_centered.sum()
+    squares_train = (
+        (centered**2).sum() - squares_test + (supplementary_centered**2).sum()
+    )
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean_test = sum_test / n_test
+        mean_train = sum_train / n_train
+        dof = n_test + n_train - 2
+        pooled_variance = (
+            squares_test
+            - n_test * mean_test**2
+            + squares_train
+            - n_train * mean_train**2
+        ) / dof
+        t = (mean_test - mean_train) / np.sqrt(
+            pooled_variance * (1 / n_test + 1 / n_train)
+        )
+        return 2 * t_distribution.sf(np.abs(t), dof)
+
+
+def chi2_pvalues(
+    test_masks: np.ndarray, values: np.ndarray, supplementary_train_values=()
+) -> np.ndarray:
+    """
+    Computes the p-values of the chi2 tests (see chi2) between the test and train
+    categories of several candidate splits.
+
+    Parameters
+    ----------
+    test_masks: array of shape (n_candidates, n_samples)
+        True for the samples in the test set of each candidate.
+    values: array of shape (n_samples,)
+        Categories compared between the test and train sets.
+    supplementary_train_values: array
+        Categories always included in the train set.
+
+    Returns
+    -------
+    Array of shape (n_candidates,) with the p-value of each candidate.
+    """
+    from scipy.stats import chi2 as chi2_distribution
+
+    values = np.asarray(values)
+    supplementary_train_values = np.asarray(supplementary_train_values)
+    categories = np.unique(np.concatenate([values, supplementary_train_values]))
+    one_hot = (values[:, np.newaxis] == categories).astype(float)
+    supplementary_counts = (
+        supplementary_train_values[:, np.newaxis] == categories
+    ).sum(axis=0)
+
+    masks = test_masks.astype(float)
+    counts_test = masks @ one_hot
+    counts_train = one_hot.sum(axis=0) - counts_test + supplementary_counts
+    with np.errstate(divide="ignore", invalid="ignore"):
+        f_obs = counts_test / counts_test.sum(axis=1, keepdims=True)
+        f_exp = counts_train / counts_train.sum(axis=1, keepdims=True)
+        statistic = ((f_obs - f_exp) ** 2 / f_exp).sum(axis=1)
+    return chi2_distribution.sf(statistic, len(categories) - 1)
+
+
+def ks_statistics(test_masks: np.ndarray, values: np.ndarray) -> np.ndarray:
+    """
+    Computes the statistics of the two-sample Kolmogorov-Smirnov tests between the
+    test and train values of several candidate splits.
+
+    Parameters
+    ----------
+    test_masks: array of shape (n_candidates, n_samples)
+        True for the samples in the test set of each candidate.
+    values: array of shape (n_samples,)
+        Values (numerical or not) compared between the test and train sets.
+
+    Returns
+    -------
+    Array of shape (n_candidates,) with the KS statistic of each candidate.
+    """
+    ranks = np.unique(values, return_inverse=True)[1]
+    order = np.argsort(ranks, kind="stable")
+    sorted_ranks = ranks[order]
+    # The empirical distributions are compared after the last occurrence of each value
+    last_occurrences = np.append(sorted_ranks[1:] != sorted_ranks[:-1], True)
+
+    masks = test_masks[:, order]
+    n_test = masks.sum(axis=1, keepdims=True)
+    cdf_test = np.cumsum(masks, axis=1)[:, last_occurrences] / n_test
+    cdf_train = np.cumsum(~masks, axis=1)[:, last_occurrences] / (
+        masks.shape[1] - n_test
+    )
+    return np.abs(cdf_test - cdf_train).max(axis=1)
+
+
 def add_demographics(df, demographics_df, diagnosis) -> pd.DataFrame:
     out_df = pd.DataFrame()
     tmp_demo_df = copy(demographics_df)
@@ -237,6 +449,9 @@ def cleaning_nan_diagnoses(bids_df: pd.DataFrame) -> pd.DataFrame:
     A cleaned DataFrame
     """
     bids_copy_df = copy(bids_df)
+    missing = bids_df["diagnosis"].isna()
+    missing_diag = np.sum(missing)
+    found_diag = 0
 
     # Look for the diagnosis in another column in ADNI
     if "adni_diagnosis_change" in bids_df.columns:
@@ -252,29 +467,10 @@ def cleaning_nan_diagnoses(bids_df: pd.DataFrame) -> pd.DataFrame:
             9: "CN",
             -1: np.nan,
         }
-
-        missing_diag = 0
-        found_diag = 0
-
-        for subject, session in bids_df.index.values:
-            diagnosis = bids_df.loc[(subject, session), "diagnosis"]
-            if isinstance(diagnosis, float):
-                missing_diag += 1
-                change = bids_df.loc[(subject, session), "adni_diagnosis_change"]
-                if not np.isnan(change) and change != -1:
-                    found_diag += 1
-                    bids_copy_df.loc[(subject, session), "diagnosis"] = change_dict[
-                        change
-                    ]
-
-    else:
-        missing_diag = 0
-        found_diag = 0
-
-        for subject, session in bids_df.index.values:
-            diagnosis = bids_df.loc[(subject, session), "diagnosis"]
-            if isinstance(diagnosis, float):
-                missing_diag += 1
+        changed_diagnosis = bids_df["adni_diagnosis_change"].map(change_dict)
+        found = missing & changed_diagnosis.notna()
+        found_diag = np.sum(found)
+        bids_copy_df.loc[found, "diagnosis"] = changed_diagnosis[found]
 
     logger.info(f"Missing diagnoses: {missing_diag}")
     logger.info(f"Missing diagnoses not found: {missing_diag - found_diag}")
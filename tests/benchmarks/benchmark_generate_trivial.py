@@ -0,0 +1,112 @@
+"""
+Benchmark of `clinicadl generate trivial` on a synthetic t1-linear CAPS.
+
+This script is not collected by pytest. Run it with:
+
+    python tests/benchmarks/benchmark_generate_trivial.py --n_subjects 50 --n_proc 4
+
+The synthetic CAPS contains one random cropped t1-linear image per subject, and the
+two masks are the left and right halves of the image, as for the AAL2 masks used
+by default.
+"""
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import nibabel as nib
+import numpy as np
+import pandas as pd
+
+IMAGE_SHAPE = (169, 208, 179)
+FILENAME = "space-MNI152NLin2009cSym_desc-Crop_res-1x1x1_T1w.nii.gz"
+
+
+def generate_caps(output_dir: Path, n_subjects: int, seed: int = 0):
+    """
+    Writes a synthetic t1-linear CAPS, the corresponding TSV file and the masks in output_dir.
+
+    Args:
+        output_dir: directory where the files are written.
+        n_subjects: number of participants of the synthetic CAPS.
+        seed: seed of the random generator.
+    Returns:
+        the paths to the CAPS, the TSV file and the masks directory.
+    """
+    rng = np.random.default_rng(seed)
+    caps_dir = output_dir / "caps"
+    rows = []
+    for subject_index in range(n_subjects):
+        participant_id = f"sub-{subject_index:04d}"
+        session_id = "ses-M000"
+        image_dir = caps_dir / "subjects" / participant_id / session_id / "t1_linear"
+        image_dir.mkdir(parents=True)
+        image = rng.random(IMAGE_SHAPE, dtype=np.float32)
+        nib.save(
+            nib.Nifti1Image(image, np.eye(4)),
+            image_dir / f"{participant_id}_{session_id}_{FILENAME}",
+        )
+        rows.append([participant_id, session_id])
+
+    tsv_path = output_dir / "data.tsv"
+    pd.DataFrame(rows, columns=["participant_id", "session_id"]).to_csv(
+        tsv_path, sep="\t", index=False
+    )
+
+    mask_dir = output_dir / "masks"
+    mask_dir.mkdir()
+    for label in range(2):
+        mask = np.zeros(IMAGE_SHAPE, dtype=np.float32)
+        half = IMAGE_SHAPE[0] // 2
+        if label == 0:
+            mask[:half] = 1
+        else:
+            mask[half:] = 1
+        nib.save(nib.Nifti1Image(mask, np.eye(4)), mask_dir / f"mask-{label + 1}.nii")
+
+    return caps_dir, tsv_path, mask_dir
+
+
+def main():
+    from clinicadl.generate.generate import generate_trivial_dataset
+
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--n_subjects", type=int, default=20)
+    parser.add_argument("--n_proc", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--output_dir",
+        type=Path,
+        default=None,
+        help="Directory where the synthetic data and the outputs are kept. "
+        "A temporary directory is used by default.",
+    )
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        output_dir = args.output_dir or Path(tmp_dir)
+        output_dir.mkdir(parents=True, exist_ok=True)
+        caps_dir, tsv_path, mask_dir = generate_caps(
+            output_dir, args.n_subjects, seed=args.seed
+        )
+        print(f"Synthetic CAPS: {args.n_subjects} images of shape {IMAGE_SHAPE}")
+
+        start = time.perf_counter()
+        generate_trivial_dataset(
+            caps_directory=caps_dir,
+            output_dir=output_dir / "trivial",
+            n_subjects=args.n_subjects,
+            n_proc=args.n_proc,
+            tsv_path=tsv_path,
+            mask_path=mask_dir,
+        )
+        duration = time.perf_counter() - start
+        n_images = 2 * args.n_subjects
+        print(
+            f"generate trivial: {duration:.2f} s ({n_images / duration:.2f} images/s)"
+        )
+
+
+if __name__ == "__main__":
+    main()
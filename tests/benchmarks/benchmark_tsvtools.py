@@ -0,0 +1,152 @@
+"""
+Benchmark of `clinicadl tsvtools get-labels` and `get-progression` on a synthetic
+merged TSV (output of `clinica iotools merge-tsv`).
+
+This script is not collected by pytest. Run it with:
+
+    python tests/benchmarks/benchmark_tsvtools.py --n_subjects 10000
+
+The synthetic dataset mimics a longitudinal cohort: each subject has a random
+subset of the usual ADNI visits, a diagnosis that may progress (or regress) with
+time, some missing diagnoses, some SMC participants, some sessions with a bad name
+and some sessions without T1w image.
+"""
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+VISITS = [0, 6, 12, 18, 24, 36, 48, 60, 72, 84, 96, 108, 120]
+DIAGNOSES = ["CN", "MCI", "AD"]
+
+
+def generate_dataset(output_dir: Path, n_subjects: int, seed: int = 0):
+    """
+    Writes a synthetic merged TSV, the corresponding missing_mods directory
+    and a restriction TSV in output_dir.
+
+    Args:
+        output_dir: directory where the files are written.
+        n_subjects: number of participants of the synthetic cohort.
+        seed: seed of the random generator.
+    Returns:
+        the paths to the merged TSV, the missing_mods directory and the restriction TSV.
+    """
+    rng = np.random.default_rng(seed)
+    rows = []
+    for subject_index in range(n_subjects):
+        participant_id = f"sub-{subject_index:06d}"
+        n_visits = rng.integers(1, len(VISITS) + 1)
+        visits = np.sort(rng.choice(VISITS, size=n_visits, replace=False))
+        stage = rng.integers(len(DIAGNOSES))
+        diagnosis_sc = "SMC" if rng.random() < 0.05 else DIAGNOSES[stage]
+        age = rng.uniform(55, 90)
+        sex = rng.choice(["F", "M"])
+        for visit in visits:
+            if rng.random() < 0.1:
+                stage = min(stage + 1, len(DIAGNOSES) - 1)
+            elif rng.random() < 0.02:
+                stage = max(stage - 1, 0)
+            # The diagnosis is always known at baseline
+            diagnosis = DIAGNOSES[stage]
+            if visit != visits[0] and rng.random() < 0.15:
+                diagnosis = np.nan
+            session_id = f"ses-M{visit:03d}"
+            if rng.random() < 0.01:
+                session_id = f"ses-V{visit:02d}"
+            rows.append(
+                [
+                    participant_id,
+                    session_id,
+                    age + visit / 12,
+                    sex,
+                    diagnosis,
+                    diagnosis_sc,
+                ]
+            )
+    merged_df = pd.DataFrame(
+        rows,
+        columns=[
+            "participant_id",
+            "session_id",
+            "age",
+            "sex",
+            "diagnosis",
+            "diagnosis_sc",
+        ],
+    )
+    merged_tsv = output_dir / "merged.tsv"
+    merged_df.to_csv(merged_tsv, sep="\t", index=False)
+
+    missing_mods_dir = output_dir / "missing_mods"
+    missing_mods_dir.mkdir(exist_ok=True)
+    for session_id, session_df in merged_df.groupby("session_id"):
+        missing_mods_df = pd.DataFrame(
+            {
+                "participant_id": session_df.participant_id.values,
+                "t1w": (rng.random(len(session_df)) > 0.05).astype(int),
+                "flair": (rng.random(len(session_df)) > 0.5).astype(int),
+            }
+        )
+        missing_mods_df.to_csv(
+            missing_mods_dir / f"missing_mods_{session_id}.tsv", sep="\t", index=False
+        )
+
+    restriction_df = merged_df.loc[
+        rng.random(len(merged_df)) > 0.05, ["participant_id", "session_id"]
+    ]
+    restriction_tsv = output_dir / "restriction.tsv"
+    restriction_df.to_csv(restriction_tsv, sep="\t", index=False)
+
+    return merged_tsv, missing_mods_dir, restriction_tsv
+
+
+def main():
+    from clinicadl.tsvtools.get_labels import get_labels
+    from clinicadl.tsvtools.get_progression.get_progression import get_progression
+
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--n_subjects", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--output_dir",
+        type=Path,
+        default=None,
+        help="Directory where the synthetic data and the outputs are kept. "
+        "A temporary directory is used by default.",
+    )
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        output_dir = args.output_dir or Path(tmp_dir)
+        output_dir.mkdir(parents=True, exist_ok=True)
+        merged_tsv, missing_mods_dir, restriction_tsv = generate_dataset(
+            output_dir, args.n_subjects, seed=args.seed
+        )
+        n_sessions = len(pd.read_csv(merged_tsv, sep="\t"))
+        print(f"Synthetic merged TSV: {n_sessions} sessions")
+
+        start = time.perf_counter()
+        get_labels(
+            bids_directory=output_dir,
+            diagnoses=DIAGNOSES,
+            modality="t1w",
+            restriction_path=restriction_tsv,
+            merged_tsv=merged_tsv,
+            missing_mods=missing_mods_dir,
+            remove_unique_session_=True,
+            output_dir=output_dir / "labels",
+        )
+        print(f"get-labels: {time.perf_counter() - start:.2f} s")
+
+        start = time.perf_counter()
+        get_progression(output_dir / "labels" / "labels.tsv", horizon_time=36)
+        print(f"get-progression: {time.perf_counter() - start:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -11,6 +11,7 @@ from clinicadl.cmdline import cli
 @pytest.fixture(
     params=[
         "prepare-data",
+        "benchmark",
         "generate",
         "interpret",
         "predict",
@@ -0,0 +1,27 @@
+import numpy as np
+
+
+def test_im_loss_roi_gaussian_distribution():
+    from clinicadl.generate.generate_utils import im_loss_roi_gaussian_distribution
+
+    rng = np.random.default_rng(0)
+    image = rng.random((10, 12, 8))
+    image[rng.random(image.shape) < 0.2] = 0
+    mask = (rng.random(image.shape) < 0.5).astype(float)
+    min_value = 60
+
+    np.random.seed(42)
+    atrophied = im_loss_roi_gaussian_distribution(image, mask, min_value)
+
+    # Voxel by voxel reference computation with the same random values
+    np.random.seed(42)
+    coordinates = list(zip(*np.nonzero(image * (mask != 0))))
+    n = np.random.normal(loc=0.0, scale=0.1, size=len(coordinates))
+    n_diff = (n + abs(np.min(n))) * 10 + min_value
+    expected = np.array(image, copy=True)
+    for i, (x, y, z) in enumerate(coordinates):
+        expected[x, y, z] = image[x, y, z] - n_diff[i] * image[x, y, z] / 100
+
+    np.testing.assert_array_equal(atrophied, expected)
+    # The voxels outside the mask are not modified
+    np.testing.assert_array_equal(atrophied[mask == 0], image[mask == 0])
@@ -0,0 +1,15 @@
+import torch
+
+
+def test_running_moments():
+    from clinicadl.interpret.statistics import RunningMoments
+
+    maps = torch.randn(20, 1, 4, 5, 6) * 3 + 10
+    moments = RunningMoments()
+    for map_pt in maps:
+        moments.update(map_pt)
+
+    assert moments.count == 20
+    assert moments.mean.dtype == torch.float64
+    assert torch.allclose(moments.mean, maps.double().mean(dim=0))
+    assert torch.allclose(moments.variance, maps.double().var(dim=0, unbiased=False))
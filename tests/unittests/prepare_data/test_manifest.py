@@ -0,0 +1,38 @@
+def test_manifest(tmp_path):
+    import os
+
+    from clinicadl.prepare_data.manifest import (
+        compute_manifest_key,
+        file_signature,
+        is_up_to_date,
+        read_manifest,
+        write_manifest,
+    )
+
+    parameters = {"mode": "patch", "patch_size": 50, "extract_json": "a.json"}
+    key = compute_manifest_key(parameters)
+    # The name of the JSON file does not change the extracted tensors
+    assert compute_manifest_key({**parameters, "extract_json": "b.json"}) == key
+    assert compute_manifest_key({**parameters, "patch_size": 32}) != key
+
+    input_file = tmp_path / "image.nii.gz"
+    input_file.write_text("image")
+    output_file = tmp_path / "subjects" / "patch_0.pt"
+    output_file.parent.mkdir()
+    output_file.write_text("patch")
+    manifest = {"image.nii.gz": (*file_signature(input_file), ["subjects/patch_0.pt"])}
+
+    write_manifest(tmp_path, key, manifest)
+    assert read_manifest(tmp_path, key) == manifest
+    assert read_manifest(tmp_path, "other") == {}
+
+    entry = manifest["image.nii.gz"]
+    assert is_up_to_date(tmp_path, input_file, entry)
+    assert not is_up_to_date(tmp_path, input_file, None)
+    # Modified input image
+    os.utime(input_file, ns=(0, 0))
+    assert not is_up_to_date(tmp_path, input_file, entry)
+    # Removed output tensor
+    entry = (*file_signature(input_file), ["subjects/patch_0.pt"])
+    output_file.unlink()
+    assert not is_up_to_date(tmp_path, input_file, entry)
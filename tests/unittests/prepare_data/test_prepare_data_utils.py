@@ -0,0 +1,20 @@
+def test_extract_images_reduced(tmp_path):
+    import nibabel as nib
+    import numpy as np
+    import torch
+
+    from clinicadl.prepare_data.prepare_data_utils import extract_images
+    from clinicadl.utils.caps_dataset.data import SizeReduction
+
+    image_array = np.random.rand(169, 208, 179).astype(np.float32)
+    image_path = tmp_path / "sub-01_ses-M000_T1w.nii.gz"
+    nib.save(nib.Nifti1Image(image_array, np.eye(4)), image_path)
+
+    ((filename, tensor),) = extract_images(
+        image_path, size_reduction_factor=3, tensor_dtype="float16"
+    )
+    expected = SizeReduction(3)(torch.from_numpy(image_array).unsqueeze(0))
+    assert filename.name == "sub-01_ses-M000_T1w.pt"
+    assert tensor.dtype == torch.float16
+    assert tensor.is_contiguous()
+    assert torch.allclose(tensor.float(), expected, atol=1e-3)
@@ -0,0 +1,111 @@
+import math
+
+import pytest
+
+
+def test_successive_halving_pruner():
+    from clinicadl.random_search.pruning import SuccessiveHalvingPruner
+    from clinicadl.utils.exceptions import ClinicaDLArgumentError
+
+    pruner = SuccessiveHalvingPruner(max_epochs=30, min_epochs=1, reduction_factor=3)
+    assert pruner.rungs == [1, 3, 9, 27]
+    assert SuccessiveHalvingPruner(max_epochs=5, min_epochs=5).rungs == []
+
+    # The first trial reaching a rung is always continued
+    assert not pruner.should_prune([0.5], 0.5)
+    # One trial in three is continued
+    rung_losses = [0.1, 0.2, 0.3, 0.4, 0.5, 0.6]
+    assert not pruner.should_prune(rung_losses, 0.2)
+    assert pruner.should_prune(rung_losses, 0.3)
+    assert pruner.should_prune([0.1, math.nan], math.nan)
+
+    with pytest.raises(ClinicaDLArgumentError):
+        SuccessiveHalvingPruner(max_epochs=10, min_epochs=0)
+    with pytest.raises(ClinicaDLArgumentError):
+        SuccessiveHalvingPruner(max_epochs=10, reduction_factor=1)
+
+
+def test_trial_ledger(tmp_path):
+    from clinicadl.random_search.pruning import TrialLedger
+
+    ledger = TrialLedger(tmp_path / "search")
+    assert ledger.read_record(0) is None
+
+    for trial_id, losses in enumerate([[0.9, 0.5, 0.4], [0.8, 0.7], [0.3]]):
+        ledger.write_record(trial_id, status="running")
+        for epoch, loss in enumerate(losses, start=1):
+            ledger.report(trial_id, split=0, epoch=epoch, loss=loss)
+    ledger.report(1, split=1, epoch=1, loss=0.1)
+    ledger.write_record(0, status="complete")
+    ledger.write_record(1, status="pruned")
+
+    assert ledger.read_record(0) == {"trial_id": 0, "status": "complete"}
+    assert sorted(ledger.rung_losses(split=0, epoch=1)) == [0.3, 0.8, 0.9]
+    assert sorted(ledger.rung_losses(split=0, epoch=2)) == [0.5, 0.7]
+
+    summary_df = ledger.summary()
+    assert (tmp_path / "search" / "trials.tsv").is_file()
+    assert summary_df.trial.tolist() == ["trial-001", "trial-002", "trial-000"]
+    assert summary_df.status.tolist() == ["pruned", "running", "complete"]
+    assert summary_df.epochs.tolist() == [2, 1, 3]
+
+    ledger.reset(0)
+    assert ledger.read_losses(0).empty
+
+
+def test_pruning_callback(tmp_path):
+    from clinicadl.random_search.pruning import (
+        PruningCallback,
+        SuccessiveHalvingPruner,
+        TrialLedger,
+    )
+
+    ledger = TrialLedger(tmp_path)
+    pruner = SuccessiveHalvingPruner(max_epochs=10, min_epochs=2, reduction_factor=2)
+    callbacks = []
+    for trial_id, loss in enumerate([0.5, 0.2, 0.9]):
+        callback = PruningCallback(ledger, pruner, trial_id)
+        callback.on_train_begin(None, split=0)
+        for epoch in range(2):
+            callback.on_epoch_end(None, metrics_valid={"loss": loss}, epoch=epoch)
+        callbacks.append(callback)
+
+    # Trial 1 is the best of its rung, trial 2 is not among the best half
+    assert [callback.pruned for callback in callbacks] == [False, False, True]
+    assert callbacks[2].stop_training
+    assert ledger.read_losses(2).epoch.tolist() == [1, 2]
+
+    # Multi-network trainings are not pruned
+    callback = PruningCallback(ledger, pruner, 3)
+    callback.on_train_begin(None, split=0, network=1)
+    callback.on_epoch_end(None, metrics_valid={"loss": 1.0}, epoch=0)
+    callback.on_train_begin(None, split=0)
+    callback.on_epoch_end(None, metrics_valid={"loss": 1.0}, epoch=0, network=1)
+    assert ledger.read_losses(3).empty
+
+
+def test_sample_trial_options():
+    from clinicadl.random_search.random_search import sample_trial_options
+
+    space_options = {
+        "seed": 0,
+        "network_task": "classification",
+        "mode": "image",
+        "n_convblocks": [2, 6],
+        "first_conv_width": [4, 8, 16],
+        "n_fcblocks": [1, 3],
+        "channels_limit": 64,
+        "d_reduction": "MaxPooling",
+        "network_normalization": "BatchNorm",
+        "n_conv": 1,
+        "wd_bool": True,
+        "learning_rate": [2, 5],
+        "weight_decay": 4,
+    }
+    options = sample_trial_options(space_options, 3)
+    assert options == sample_trial_options(space_options, 3)
+    assert options["architecture"] == "RandomArchitecture"
+    assert any(
+        sample_trial_options(space_options, trial_id) != options
+        for trial_id in range(3)
+    )
@@ -0,0 +1,100 @@
+import json
+
+import pandas as pd
+import pytest
+import torch
+
+
+@pytest.fixture
+def launch_directory(tmp_path):
+    """Launch directory of a search training on a CAPS of 8 images of size 16x16x16."""
+    caps_directory = tmp_path / "caps"
+    rows = []
+    for i in range(8):
+        participant_id = f"sub-{i:02d}"
+        tensor_dir = (
+            caps_directory
+            / "subjects"
+            / participant_id
+            / "ses-M000"
+            / "deeplearning_prepare_data"
+            / "image_based"
+            / "t1_linear"
+        )
+        tensor_dir.mkdir(parents=True)
+        torch.save(
+            torch.rand(1, 16, 16, 16),
+            tensor_dir
+            / f"{participant_id}_ses-M000_space-MNI152NLin2009cSym_desc-Crop_res-1x1x1_T1w.pt",
+        )
+        rows.append([participant_id, "ses-M000", "AD" if i % 2 else "CN"])
+    (caps_directory / "tensor_extraction").mkdir()
+    preprocessing_dict = {
+        "preprocessing": "t1-linear",
+        "mode": "image",
+        "use_uncropped_image": False,
+        "prepare_dl": False,
+        "file_type": {
+            "pattern": "*space-MNI152NLin2009cSym_desc-Crop_res-1x1x1_T1w.nii.gz",
+            "description": "T1w Image registered in MNI152NLin2009cSym space",
+            "needed_pipeline": "t1-linear",
+        },
+    }
+    with (caps_directory / "tensor_extraction" / "image.json").open("w") as f:
+        json.dump(preprocessing_dict, f)
+
+    tsv_path = tmp_path / "labels" / "split"
+    tsv_path.mkdir(parents=True)
+    df = pd.DataFrame(rows, columns=["participant_id", "session_id", "diagnosis"])
+    df.to_csv(tsv_path.parent / "train.tsv", sep="\t", index=False)
+    df.iloc[:6].to_csv(tsv_path / "train.tsv", sep="\t", index=False)
+    df.iloc[6:].to_csv(tsv_path / "validation_baseline.tsv", sep="\t", index=False)
+
+    launch_directory = tmp_path / "search"
+    launch_directory.mkdir()
+    (launch_directory / "random_search.toml").write_text(
+        "[Random_Search]\n"
+        f'caps_directory = "{caps_directory}"\n'
+        f'tsv_path = "{tsv_path}"\n'
+        'preprocessing_json = "image.json"\n'
+        'network_task = "classification"\n'
+        "n_convblocks = 2\n"
+        "first_conv_width = 2\n"
+        "n_fcblocks = 1\n"
+        "channels_limit = 4\n"
+        "[Computational]\n"
+        "gpu = false\n"
+        "n_proc = 2\n"
+        "batch_size = 2\n"
+        "[Optimization]\n"
+        "epochs = 1\n"
+    )
+    return launch_directory
+
+
+def test_launch_trials_concurrent_loader_workers(launch_directory):
+    from clinicadl.random_search.random_search import launch_trials
+
+    # The concurrent trials are trained in processes which can start the workers
+    # of their DataLoaders
+    summary_df = launch_trials(launch_directory, "job", n_trials=2, n_concurrent=2)
+    assert list(summary_df.status) == ["complete", "complete"]
+
+
+def test_run_trial_loader_workers_error(launch_directory, monkeypatch):
+    from torch.utils.data import DataLoader
+
+    from clinicadl.random_search.pruning import TrialLedger
+    from clinicadl.random_search.random_search import run_trial
+    from clinicadl.random_search.random_search_utils import get_space_dict
+
+    def start_workers(self):
+        raise RuntimeError("workers cannot be started")
+
+    monkeypatch.setattr(DataLoader, "__iter__", start_workers)
+
+    # The error stops the search instead of failing the trial
+    search_directory = launch_directory / "job"
+    with pytest.raises(RuntimeError, match="workers cannot be started"):
+        run_trial(search_directory, 0, get_space_dict(launch_directory))
+    assert TrialLedger(search_directory).read_record(0) is None
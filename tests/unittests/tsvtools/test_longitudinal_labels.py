@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+
+
+def test_infer_or_drop_diagnosis():
+    from clinicadl.tsvtools.get_labels import infer_or_drop_diagnosis
+
+    bids_df = pd.DataFrame(
+        {
+            "participant_id": ["sub-01"] * 5 + ["sub-02"] * 4,
+            "session_index": [0, 6, 12, 24, 36, 36, 0, 12, 24],
+            "diagnosis": ["CN", np.nan, np.nan, "CN", np.nan]
+            + [np.nan, "MCI", np.nan, "AD"],
+        }
+    ).set_index(["participant_id", "session_index"])
+
+    output_df = infer_or_drop_diagnosis(bids_df)
+    # Last sessions and sessions between two different diagnoses are dropped
+    assert list(output_df.index) == [
+        ("sub-01", 0),
+        ("sub-01", 6),
+        ("sub-01", 12),
+        ("sub-01", 24),
+        ("sub-02", 0),
+        ("sub-02", 24),
+    ]
+    assert list(output_df.diagnosis) == ["CN"] * 4 + ["MCI", "AD"]
+
+
+def test_get_progression(tmp_path):
+    from clinicadl.tsvtools.get_progression.get_progression import get_progression
+
+    data_tsv = tmp_path / "labels.tsv"
+    pd.DataFrame(
+        {
+            "participant_id": ["sub-01"] * 4 + ["sub-02"] * 3 + ["sub-03"] * 4,
+            "session_id": ["ses-M000", "ses-M012", "ses-M024", "ses-M048"]
+            + ["ses-M000", "ses-M036", "ses-M024"]
+            + ["ses-M000", "ses-M006", "ses-M012", "ses-M024"],
+            "diagnosis": ["CN", "CN", "MCI", "MCI"]
+            + ["MCI", "AD", "MCI"]
+            + ["MCI", "AD", "MCI", "AD"],
+        }
+    ).to_csv(data_tsv, sep="\t", index=False)
+
+    get_progression(data_tsv, horizon_time=12)
+    output_df = pd.read_csv(data_tsv, sep="\t")
+    # sub-03 converts and reverts: all its sessions are unstable
+    assert (
+        list(output_df.progression)
+        == ["s", "p", "s", "uk"] + ["s", "uk", "p"] + ["us"] * 4
+    )
@@ -0,0 +1,35 @@
+import pandas as pd
+
+
+def test_performance_callback(tmp_path):
+    from clinicadl.utils.callbacks.callbacks import (
+        PerformanceCallback,
+        PerformanceCounters,
+    )
+
+    counters = PerformanceCounters()
+    callback = PerformanceCallback()
+    callback.on_train_begin({}, maps_path=tmp_path, split=0)
+    for epoch in range(3):
+        counters.reset()
+        for data in counters.iterate(range(4)):
+            with counters.timer("forward_backward"):
+                counters.n_samples += 2
+        counters.add("checkpoint", 1.0)
+        # A joint multi-network training calls on_epoch_end for each network
+        for network in range(2):
+            callback.on_epoch_end(
+                {}, epoch=epoch, network=network, performance=counters
+            )
+
+    tsv_path = tmp_path / "split-0" / "training_logs" / "performance.tsv"
+    performance_df = pd.read_csv(tsv_path, sep="\t")
+    assert list(performance_df.epoch) == [0, 1, 2]
+    assert (performance_df.checkpoint_time == 1.0).all()
+    assert (performance_df.samples_per_second > 0).all()
+
+    # Resuming from epoch 1 removes the rows of the epochs trained again
+    callback.on_train_begin(
+        {}, maps_path=tmp_path, split=0, resume=True, beginning_epoch=1
+    )
+    assert list(pd.read_csv(tsv_path, sep="\t").epoch) == [0]
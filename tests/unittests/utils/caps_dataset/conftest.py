@@ -0,0 +1,62 @@
+import pandas as pd
+import pytest
+import torch
+
+
+@pytest.fixture
+def make_caps(tmp_path):
+    """
+    Factory writing the image tensors of t1-linear sessions in a CAPS, as saved by
+    prepare_data in image mode.
+
+    Args:
+        mode: mode of the preprocessing dict (the elements are extracted on-the-fly).
+        participants: participants of the CAPS, with a single session ses-M000.
+        image: tensor saved for each participant (default is a tensor of ones of size 4x4x4).
+        preprocessing_options: other fields of the preprocessing dict (patch_size, stride_size,
+            size_reduction_factor, tensor_dtype...).
+    Returns:
+        the CAPS directory, the preprocessing dict and the DataFrame of the sessions.
+    """
+    from clinicadl.prepare_data.prepare_data_utils import compute_folder_and_file_type
+
+    def _make_caps(
+        mode="image", participants=("sub-01",), image=None, **preprocessing_options
+    ):
+        preprocessing_dict = {
+            "preprocessing": "t1-linear",
+            "mode": mode,
+            "use_uncropped_image": False,
+            "prepare_dl": False,
+            **preprocessing_options,
+        }
+        folder, preprocessing_dict["file_type"] = compute_folder_and_file_type(
+            preprocessing_dict
+        )
+        if image is None:
+            image = torch.ones(1, 4, 4, 4)
+
+        for participant_id in participants:
+            tensor_dir = (
+                tmp_path
+                / "subjects"
+                / participant_id
+                / "ses-M000"
+                / "deeplearning_prepare_data"
+                / "image_based"
+                / folder
+            )
+            tensor_dir.mkdir(parents=True)
+            torch.save(
+                image,
+                tensor_dir
+                / f"{participant_id}_ses-M000_space-MNI152NLin2009cSym_desc-Crop_res-1x1x1_T1w.pt",
+            )
+
+        df = pd.DataFrame(
+            [[participant_id, "ses-M000", "single"] for participant_id in participants],
+            columns=["participant_id", "session_id", "cohort"],
+        )
+        return tmp_path, preprocessing_dict, df
+
+    return _make_caps
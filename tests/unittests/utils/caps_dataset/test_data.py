@@ -1,5 +1,6 @@
 import re
 
+import numpy as np
 import pandas as pd
 import pytest
 
@@ -49,3 +50,182 @@ def test_check_multi_cohort_tsv_errors(
         ),
     ):
         check_multi_cohort_tsv(pd.DataFrame(columns=dataframe_columns), purpose)
+
+
+def test_caps_dataset_all_elements(make_caps):
+    import torch
+    from torch.utils.data import DataLoader
+
+    from clinicadl.utils.caps_dataset.data import (
+        CapsDatasetAllElements,
+        get_element_batch,
+        return_dataset,
+    )
+
+    caps_directory, preprocessing_dict, df = make_caps(
+        "patch",
+        participants=["sub-01", "sub-02"],
+        image=torch.arange(64, dtype=torch.float32).view(1, 4, 4, 4),
+        patch_size=2,
+        stride_size=2,
+    )
+    patch_dataset = return_dataset(
+        caps_directory, df, preprocessing_dict, None, label_presence=False
+    )
+    dataset = CapsDatasetAllElements(patch_dataset)
+    assert len(dataset) == 2
+    assert dataset.num_elements == 8
+
+    data = next(iter(DataLoader(dataset, batch_size=2)))
+    assert data["image"].shape == (2, 8, 1, 2, 2, 2)
+    # Each element of the batch is the one returned by the dataset restricted to this element
+    element_dataset = return_dataset(
+        caps_directory,
+        df,
+        preprocessing_dict,
+        None,
+        label_presence=False,
+        cnn_index=3,
+    )
+    element_data = get_element_batch(data, 3, "patch")
+    assert element_data["patch_id"].tolist() == [3, 3]
+    assert torch.equal(element_data["image"][1], element_dataset[1]["image"])
+
+
+def test_caps_dataset_eval_mode_persistent_workers(make_caps):
+    import torch
+    from torch.utils.data import DataLoader
+
+    from clinicadl.utils.caps_dataset.data import return_dataset
+
+    caps_directory, preprocessing_dict, df = make_caps()
+    dataset = return_dataset(
+        caps_directory,
+        df,
+        preprocessing_dict,
+        None,
+        train_transformations=torch.neg,
+        label_presence=False,
+    )
+    loader = DataLoader(dataset, num_workers=1, persistent_workers=True)
+
+    assert next(iter(loader))["image"].sum() == -64
+    # The workers kept alive see the mode set in the main process
+    dataset.eval()
+    assert next(iter(loader))["image"].sum() == 64
+    dataset.train()
+    assert next(iter(loader))["image"].sum() == -64
+
+
+def test_caps_dataset_meta_data(make_caps):
+    from clinicadl.utils.caps_dataset.data import return_dataset
+
+    caps_directory, preprocessing_dict, df = make_caps(
+        "patch",
+        participants=["sub-01", "sub-02", "sub-03"],
+        patch_size=2,
+        stride_size=2,
+    )
+    df["diagnosis"] = ["AD", "CN", "MCI"]
+    df["age"] = [70.0, 75.0, 80.0]
+    dataset = return_dataset(
+        caps_directory,
+        df,
+        preprocessing_dict,
+        None,
+        label="diagnosis",
+        label_code={"AD": 1, "CN": 0},
+    )
+    assert dataset._get_meta_data(8 + 5) == ("sub-02", "ses-M000", "single", 5, 0, "")
+    # Labels absent from label_code raise the same error as label_fn
+    with pytest.raises(KeyError):
+        dataset._get_meta_data(2 * 8)
+
+    # The encoded meta data follow the changes of the DataFrame
+    dataset.df = df.iloc[[2, 0]]
+    assert len(dataset) == 16
+    assert dataset._get_meta_data(8)[:5] == ("sub-01", "ses-M000", "single", 0, 1)
+
+    dataset = return_dataset(caps_directory, df, preprocessing_dict, None, label="age")
+    label = dataset._get_meta_data(2 * 8)[4]
+    assert label.dtype == np.float32 and label.tolist() == [80.0]
+
+
+def test_caps_dataset_reduced_tensors(make_caps):
+    import torch
+
+    from clinicadl.utils.caps_dataset.data import (
+        MinMaxNormalization,
+        get_transforms,
+        return_dataset,
+    )
+    from clinicadl.utils.exceptions import ClinicaDLConfigurationError
+
+    caps_directory, preprocessing_dict, df = make_caps(
+        image=torch.ones(1, 80, 96, 80, dtype=torch.float16),
+        size_reduction_factor=2,
+        tensor_dtype="float16",
+    )
+    # The normalization and the size reduction were already applied by prepare_data
+    _, all_transforms = get_transforms(
+        normalize=True, size_reduction=True, size_reduction_factor=2
+    )
+    dataset = return_dataset(
+        caps_directory, df, preprocessing_dict, all_transforms, label_presence=False
+    )
+    image = dataset[0]["image"]
+    assert image.shape == (1, 80, 96, 80)
+    assert image.dtype == torch.float32
+    assert torch.equal(image, torch.ones(1, 80, 96, 80))
+
+    # The transformations requested must match the ones baked in the tensors
+    mismatched_transforms = [
+        get_transforms(
+            normalize=normalize,
+            size_reduction=size_reduction,
+            size_reduction_factor=size_reduction_factor,
+        )[1]
+        for normalize, size_reduction, size_reduction_factor in [
+            (True, True, 3),
+            (False, True, 2),
+            (True, False, 2),
+        ]
+    ]
+    for all_transforms in mismatched_transforms + [None, MinMaxNormalization()]:
+        with pytest.raises(ClinicaDLConfigurationError):
+            return_dataset(
+                caps_directory,
+                df,
+                preprocessing_dict,
+                all_transforms,
+                label_presence=False,
+            )
+
+
+def test_caps_dataset_reduced_tensors_match_runtime(tmp_path, make_caps):
+    import nibabel as nib
+    import torch
+
+    from clinicadl.prepare_data.prepare_data_utils import extract_images
+    from clinicadl.utils.caps_dataset.data import get_transforms, return_dataset
+
+    rng = np.random.default_rng(0)
+    image_array = rng.uniform(0, 1, (24, 24, 24)).astype(np.float32)
+    # The extrema of the image are outside the region kept by the size reduction
+    image_array[0, 0, 0] = 10
+    image_array[-1, -1, -1] = -10
+    nii_path = tmp_path / "image_T1w.nii.gz"
+    nib.save(nib.Nifti1Image(image_array, np.eye(4)), nii_path)
+
+    _, all_transforms = get_transforms(
+        normalize=True, size_reduction=True, size_reduction_factor=2
+    )
+    [(_, full_tensor)] = extract_images(nii_path)
+    [(_, reduced_tensor)] = extract_images(nii_path, size_reduction_factor=2)
+    caps_directory, preprocessing_dict, df = make_caps(
+        image=reduced_tensor, size_reduction_factor=2
+    )
+    dataset = return_dataset(
+        caps_directory, df, preprocessing_dict, all_transforms, label_presence=False
+    )
+    assert torch.equal(dataset[0]["image"], all_transforms(full_tensor))
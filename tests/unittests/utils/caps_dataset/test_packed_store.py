@@ -0,0 +1,43 @@
+import pytest
+import torch
+
+
+def test_packed_store_roundtrip(tmp_path):
+    from clinicadl.utils.caps_dataset.packed_store import (
+        PackedTensorStore,
+        PackedTensorWriter,
+    )
+
+    tensors = {
+        f"subjects/sub-0{i}/ses-M000/patch-{i}.pt": torch.rand(1, 3, 4, 5)
+        for i in range(5)
+    }
+    # Small shards to check that tensors are spread across several files
+    with PackedTensorWriter(tmp_path / "packed", shard_size=200) as writer:
+        for tensor_path, tensor in tensors.items():
+            writer.write(tensor_path, tensor)
+    assert len(list((tmp_path / "packed").glob("shard-*.bin"))) > 1
+
+    store = PackedTensorStore(tmp_path / "packed")
+    assert len(store) == len(tensors)
+    for tensor_path, tensor in tensors.items():
+        assert torch.equal(store.load(tensor_path), tensor)
+
+    # In-place modifications must not alter the store
+    store.load("subjects/sub-00/ses-M000/patch-0.pt").zero_()
+    assert torch.equal(
+        store.load("subjects/sub-00/ses-M000/patch-0.pt"),
+        tensors["subjects/sub-00/ses-M000/patch-0.pt"],
+    )
+
+
+def test_packed_store_writer_error(tmp_path):
+    from clinicadl.utils.caps_dataset.packed_store import PackedTensorWriter
+
+    # A store interrupted by an error is removed instead of being published
+    with pytest.raises(RuntimeError):
+        with PackedTensorWriter(tmp_path / "packed", shard_size=200) as writer:
+            for i in range(5):
+                writer.write(f"patch-{i}.pt", torch.rand(1, 3, 4, 5))
+            raise RuntimeError("interrupted")
+    assert not (tmp_path / "packed").exists()
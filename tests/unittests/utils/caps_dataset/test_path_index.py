@@ -0,0 +1,55 @@
+import pandas as pd
+import pytest
+import torch
+
+
+@pytest.fixture
+def caps_image(tmp_path):
+    from clinicadl.utils.clinica_utils import linear_nii
+
+    caps_directory = tmp_path / "caps"
+    filename = "sub-01_ses-M000_space-MNI152NLin2009cSym_desc-Crop_res-1x1x1_T1w"
+    session_dir = caps_directory / "subjects" / "sub-01" / "ses-M000"
+    nii_dir = session_dir / "t1_linear"
+    nii_dir.mkdir(parents=True)
+    (nii_dir / f"{filename}.nii.gz").touch()
+    tensor_dir = session_dir / "deeplearning_prepare_data" / "image_based" / "t1_linear"
+    tensor_dir.mkdir(parents=True)
+    torch.save(torch.zeros(1, 4, 4, 4), tensor_dir / f"{filename}.pt")
+
+    preprocessing_dict = {
+        "preprocessing": "t1-linear",
+        "mode": "image",
+        "use_uncropped_image": False,
+        "prepare_dl": False,
+        "file_type": linear_nii("T1w", False),
+    }
+    return caps_directory, preprocessing_dict, nii_dir / f"{filename}.nii.gz"
+
+
+def test_path_index_reuse(caps_image):
+    from clinicadl.utils.caps_dataset.data import CapsDatasetImage
+    from clinicadl.utils.caps_dataset.path_index import (
+        compute_path_index_key,
+        get_path_index_path,
+    )
+
+    caps_directory, preprocessing_dict, nii_path = caps_image
+    df = pd.DataFrame(
+        [["sub-01", "ses-M000", "single"]],
+        columns=["participant_id", "session_id", "cohort"],
+    )
+
+    dataset = CapsDatasetImage(
+        caps_directory, df, preprocessing_dict, label_presence=False
+    )
+    key = compute_path_index_key(preprocessing_dict)
+    assert get_path_index_path(caps_directory, key).is_file()
+    assert dataset.size == torch.Size([1, 4, 4, 4])
+
+    # The CAPS tree is not explored anymore once the index exists
+    nii_path.unlink()
+    dataset = CapsDatasetImage(
+        caps_directory, df, preprocessing_dict, label_presence=False
+    )
+    assert dataset[0]["image_path"].endswith(".pt")
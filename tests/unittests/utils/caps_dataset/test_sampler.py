@@ -0,0 +1,30 @@
+from types import SimpleNamespace
+
+import pandas as pd
+
+
+def test_image_grouped_sampler():
+    from clinicadl.utils.caps_dataset.sampler import ImageGroupedSampler
+
+    dataset = SimpleNamespace(
+        df=pd.DataFrame({"participant_id": range(5)}), elem_per_image=4
+    )
+
+    sampler = ImageGroupedSampler(dataset)
+    indices = list(sampler)
+    assert len(indices) == len(sampler) == 20
+    assert sorted(indices) == list(range(20))
+    # Elements of the same image are consecutive
+    images = [idx // 4 for idx in indices]
+    assert all(len(set(images[i : i + 4])) == 1 for i in range(0, 20, 4))
+
+    sampler.set_epoch(1)
+    assert list(sampler) != indices
+
+    # Images are split between processes which sample the same number of elements
+    replicas = [
+        ImageGroupedSampler(dataset, num_replicas=2, rank=rank) for rank in range(2)
+    ]
+    replica_indices = [list(replica) for replica in replicas]
+    assert len(replica_indices[0]) == len(replica_indices[1]) == 12
+    assert set(replica_indices[0]) | set(replica_indices[1]) == set(range(20))
@@ -0,0 +1,95 @@
+import pytest
+import torch
+
+
+@pytest.mark.parametrize("generator", ["random", "trivial", "shepplogan"])
+@pytest.mark.parametrize("mode", ["image", "patch", "roi", "slice"])
+def test_synthetic_dataset(generator, mode):
+    from clinicadl.utils.caps_dataset.data import return_dataset
+    from clinicadl.utils.caps_dataset.synthetic import (
+        synthetic_data_df,
+        synthetic_preprocessing_dict,
+    )
+
+    data_df = synthetic_data_df(4)
+    preprocessing_dict = synthetic_preprocessing_dict(
+        mode,
+        generator,
+        image_size=(16, 20, 18),
+        seed=1,
+        patch_size=8,
+        stride_size=8,
+        discarded_slices=(2, 2),
+        roi_list=["left", "center"],
+    )
+    dataset = return_dataset(
+        None,
+        data_df,
+        preprocessing_dict,
+        all_transformations=None,
+        label="diagnosis",
+        label_code={"AD": 0, "CN": 1},
+        image_cache_size=2,
+    )
+    assert len(dataset) == 4 * dataset.elem_per_image
+
+    # The elements do not depend on the order of the loading nor on the split
+    last_sample = dataset[len(dataset) - 1]
+    assert torch.equal(dataset[len(dataset) - 1]["image"], last_sample["image"])
+    assert last_sample["image"].size() == dataset.size
+    assert last_sample["label"] == 1
+
+    split_dataset = return_dataset(
+        None,
+        data_df.iloc[2:].reset_index(drop=True),
+        preprocessing_dict,
+        all_transformations=None,
+        label="diagnosis",
+        label_code={"AD": 0, "CN": 1},
+    )
+    assert torch.equal(
+        split_dataset[len(split_dataset) - 1]["image"], last_sample["image"]
+    )
+
+    # Another seed gives other images
+    other_dataset = return_dataset(
+        None,
+        data_df,
+        dict(
+            preprocessing_dict, synthetic=dict(preprocessing_dict["synthetic"], seed=2)
+        ),
+        all_transformations=None,
+    )
+    assert not torch.equal(
+        other_dataset[len(dataset) - 1]["image"], last_sample["image"]
+    )
+
+
+def test_synthetic_trivial_atrophy():
+    from clinicadl.utils.caps_dataset.synthetic import (
+        generate_synthetic_image,
+        synthetic_preprocessing_dict,
+    )
+
+    synthetic_dict = synthetic_preprocessing_dict(
+        "image", "trivial", image_size=(16, 20, 18), noise_std=0
+    )["synthetic"]
+    ad_image = generate_synthetic_image(synthetic_dict, 0)
+    cn_image = generate_synthetic_image(synthetic_dict, 1)
+
+    # AD images are atrophied in the left half, CN images in the right half
+    assert ad_image[:, :8].sum() < cn_image[:, :8].sum()
+    assert ad_image[:, 8:].sum() > cn_image[:, 8:].sum()
+    assert torch.allclose(ad_image.flip(1), cn_image, atol=1e-6)
+
+
+def test_synthetic_errors():
+    from clinicadl.utils.caps_dataset.synthetic import synthetic_preprocessing_dict
+    from clinicadl.utils.exceptions import ClinicaDLArgumentError
+
+    with pytest.raises(ClinicaDLArgumentError):
+        synthetic_preprocessing_dict("image", "noise")
+    with pytest.raises(ClinicaDLArgumentError):
+        synthetic_preprocessing_dict("image", image_size=(16, 16))
+    with pytest.raises(ClinicaDLArgumentError):
+        synthetic_preprocessing_dict("roi", roi_list=["hippocampus"])
@@ -0,0 +1,48 @@
+import pytest
+
+
+def test_async_writer(tmp_path):
+    from clinicadl.utils.maps_manager.iotools import AsyncWriter
+
+    def write(path, text):
+        path.write_text(text)
+
+    with AsyncWriter(n_threads=2, max_pending=3) as writer:
+        for i in range(10):
+            writer.submit(write, tmp_path / f"{i}.txt", str(i))
+    assert [(tmp_path / f"{i}.txt").read_text() for i in range(10)] == [
+        str(i) for i in range(10)
+    ]
+
+    # Errors of the writing threads are raised in the main thread
+    with pytest.raises(FileNotFoundError):
+        with AsyncWriter() as writer:
+            writer.submit(write, tmp_path / "missing" / "file.txt", "")
+
+
+def test_save_and_link(tmp_path):
+    import torch
+
+    from clinicadl.utils.maps_manager.iotools import save_and_link, snapshot_to_cpu
+
+    weights = torch.zeros(3)
+    state = {"model": {"weights": weights}, "epoch": 0}
+    snapshot = snapshot_to_cpu(state)
+    weights += 1
+    # The snapshot is not modified by the following training steps
+    assert torch.equal(snapshot["model"]["weights"], torch.zeros(3))
+
+    paths = [
+        tmp_path / "tmp" / "checkpoint.pth.tar",
+        tmp_path / "best" / "model.pth.tar",
+    ]
+    save_and_link(snapshot, paths)
+    assert paths[0].stat().st_ino == paths[1].stat().st_ino
+
+    # A new checkpoint does not modify the files linked to the previous one
+    save_and_link(snapshot_to_cpu(state), paths[:1])
+    assert torch.equal(torch.load(paths[0])["model"]["weights"], torch.ones(3))
+    assert torch.equal(torch.load(paths[1])["model"]["weights"], torch.zeros(3))
+    assert sorted(path.name for path in paths[0].parent.iterdir()) == [
+        "checkpoint.pth.tar"
+    ]
@@ -0,0 +1,69 @@
+import pytest
+
+
+def iterate_loader(n_workers):
+    import torch
+    from torch.utils.data import DataLoader
+
+    loader = DataLoader(torch.arange(8.0), batch_size=2, num_workers=n_workers)
+    return sum(batch.sum().item() for batch in loader)
+
+
+@pytest.mark.parametrize(
+    "n_cpus,n_parallel,n_proc,expected",
+    [
+        (64, 5, 2, (10, 2)),
+        (64, 4, 32, (1, 15)),
+        (8, 8, 2, (1, 0)),
+        (4, 8, 2, (1, 0)),
+    ],
+)
+def test_split_cpu_budget(n_cpus, n_parallel, n_proc, expected):
+    from clinicadl.utils.maps_manager.maps_manager_utils import split_cpu_budget
+
+    n_threads, n_workers = split_cpu_budget(n_cpus, n_parallel, n_proc)
+    assert (n_threads, n_workers) == expected
+    assert n_parallel * (n_threads + n_workers) <= max(n_cpus, n_parallel)
+
+
+def test_train_split_process_logging(monkeypatch, tmp_path, capsys):
+    import logging
+
+    from clinicadl.utils.maps_manager import maps_manager
+
+    class SplitMapsManager:
+        def __init__(self, maps_path):
+            self.parameters = dict()
+
+        def _train_splits(self, split_list, resume):
+            logging.getLogger("clinicadl.maps_manager").error("error message")
+
+    train_split_process = maps_manager.MapsManager._train_split_process
+    # The handlers set up by the process are removed at the end of the test
+    clinicadl_logger = logging.getLogger("clinicadl")
+    monkeypatch.setattr(clinicadl_logger, "handlers", clinicadl_logger.handlers)
+    monkeypatch.setattr(clinicadl_logger, "level", clinicadl_logger.level)
+    monkeypatch.setenv("MASTER_PORT", "0")
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(maps_manager, "MapsManager", SplitMapsManager)
+
+    train_split_process(tmp_path, 0, resume=False, n_threads=1, n_proc=0, verbose=True)
+    clinicadl_logger.info("message after the split")
+    for handler in clinicadl_logger.handlers:
+        handler.close()
+
+    # The split is added once to the message, whatever the number of handlers
+    captured = capsys.readouterr()
+    debug_log = (tmp_path / "clinicadl_debug.log").read_text()
+    for output in [captured.out, captured.err, debug_log]:
+        assert output.count("[split-0] error message") == 1
+        assert "[split-0] [split-0]" not in output
+    assert "[split-0]" not in debug_log.split("\n")[-2]
+
+
+def test_run_in_processes_loader_workers():
+    from clinicadl.utils.maps_manager.maps_manager_utils import run_in_processes
+
+    # The processes of the splits can start the workers of their DataLoaders
+    results = run_in_processes(iterate_loader, [(2,), (2,)], n_processes=2)
+    assert results == [28.0, 28.0]
@@ -0,0 +1,85 @@
+import pytest
+import torch
+
+
+@pytest.mark.parametrize("task", ["classification", "regression"])
+def test_generate_test_rows(task):
+    from clinicadl.utils.task_manager.classification import ClassificationManager
+    from clinicadl.utils.task_manager.regression import RegressionManager
+
+    batch_size = 4
+    data = {
+        "participant_id": [f"sub-0{i}" for i in range(batch_size)],
+        "session_id": ["ses-M000"] * batch_size,
+        "patch_id": torch.arange(batch_size),
+    }
+    if task == "classification":
+        task_manager = ClassificationManager("patch", n_classes=3)
+        data["label"] = torch.randint(0, 3, (batch_size,))
+        outputs = torch.randn(batch_size, 3)
+    else:
+        task_manager = RegressionManager("patch")
+        # Regression labels are collated by the dataset in the shape (batch_size, 1)
+        data["label"] = torch.rand(batch_size, 1, dtype=torch.float64)
+        outputs = torch.randn(batch_size, 1)
+
+    rows = task_manager.generate_test_rows(data, outputs)
+    assert rows == [
+        row
+        for idx in range(batch_size)
+        for row in task_manager.generate_test_row(idx, data, outputs)
+    ]
+
+
+def test_ensemble_prediction():
+    import numpy as np
+    import pandas as pd
+
+    from clinicadl.utils.task_manager.classification import ClassificationManager
+
+    rng = np.random.default_rng(0)
+    n_sessions, n_patches, n_classes = 5, 4, 3
+    rows = []
+    for session in range(n_sessions):
+        label = rng.integers(n_classes)
+        for patch in range(n_patches):
+            proba = rng.dirichlet(np.ones(n_classes))
+            rows.append(
+                [f"sub-0{session}", "ses-M000", patch, label, proba.argmax()]
+                + list(proba)
+            )
+    task_manager = ClassificationManager("patch", n_classes=n_classes)
+    performance_df = pd.DataFrame(rows, columns=task_manager.columns)
+    # The results of the patches are not sorted
+    performance_df = performance_df.sample(frac=1, random_state=0)
+    validation_df = performance_df.copy()
+
+    df_final, _ = task_manager.ensemble_prediction(performance_df, validation_df)
+
+    accuracies = (
+        (validation_df.true_label == validation_df.predicted_label)
+        .groupby(validation_df.patch_id)
+        .mean()
+    )
+    weights = accuracies / accuracies.sum()
+    assert list(df_final.columns) == task_manager.columns
+    assert len(df_final) == n_sessions
+    for (_, row), (participant, session_df) in zip(
+        df_final.iterrows(), performance_df.groupby("participant_id")
+    ):
+        session_df = session_df.sort_values("patch_id")
+        probas = [
+            np.average(session_df[f"proba{i}"], weights=weights)
+            for i in range(n_classes)
+        ]
+        assert row.participant_id == participant
+        assert row.patch_id == 0
+        assert row.true_label == session_df.true_label.iloc[0]
+        assert row.predicted_label == np.argmax(probas)
+        assert np.allclose(row[[f"proba{i}" for i in range(n_classes)]], probas)
+
+    # Results read with MapsManager.get_prediction are indexed by participant and session
+    indexed_df, _ = task_manager.ensemble_prediction(
+        performance_df.set_index(["participant_id", "session_id"]), validation_df
+    )
+    pd.testing.assert_frame_equal(indexed_df, df_final)
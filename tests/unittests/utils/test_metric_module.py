@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+
+
+@pytest.mark.parametrize(
+    "metrics,n_classes",
+    [
+        (["BA", "accuracy", "F1_score", "MCC", "MK", "LR_plus", "LR_minus"], 2),
+        (["BA", "accuracy", "sensitivity", "specificity", "PPV", "NPV"], 3),
+        (["MAE", "RMSE", "R2_score"], None),
+    ],
+)
+def test_bootstrap(metrics, n_classes):
+    from clinicadl.utils.metric_module import BOOTSTRAP_N_RESAMPLES, MetricModule
+
+    rng = np.random.default_rng(0)
+    if n_classes is None:
+        y = rng.random(30)
+        y_pred = y + rng.normal(scale=0.1, size=30)
+    else:
+        y = rng.integers(n_classes, size=30)
+        y_pred = np.where(rng.random(30) < 0.7, y, rng.integers(n_classes, size=30))
+
+    metric_module = MetricModule(metrics, n_classes=n_classes, seed=42)
+    bootstrap_results = metric_module.bootstrap(y, y_pred)
+
+    # Same resamples as the ones drawn by the module
+    indices = np.random.default_rng(42).integers(
+        len(y), size=(BOOTSTRAP_N_RESAMPLES, len(y))
+    )
+    for metric_key, metric_fn in metric_module.metrics.items():
+        for class_number, metric_name in metric_module._metric_names(metric_key):
+            expected = [
+                metric_fn(y[resample], y_pred[resample], class_number)
+                for resample in indices[:100]
+            ]
+            assert np.allclose(bootstrap_results[metric_name][:100], expected)
+
+    results = metric_module.apply(y, y_pred, report_ci=True)
+    assert results["Metric_names"][1:] == list(bootstrap_results)
+    for lower_ci, upper_ci in zip(results["Lower_CI"][1:], results["Upper_CI"][1:]):
+        assert lower_ci <= upper_ci
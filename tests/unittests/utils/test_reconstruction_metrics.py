@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+import torch
+
+
+@pytest.mark.parametrize("shape", [(3, 1, 20, 24, 18), (3, 2, 30, 26)])
+def test_batch_metrics(shape):
+    from clinicadl.utils.metric_module import MetricModule
+    from clinicadl.utils.pytorch_ssim import ssim, ssim3D
+    from clinicadl.utils.reconstruction_metrics import batch_metrics
+
+    generator = torch.Generator().manual_seed(0)
+    y = torch.rand(shape, generator=generator)
+    y_pred = (y + 0.1 * torch.randn(shape, generator=generator)).clamp(0, 1)
+    # Negative values change the data range of PSNR
+    y[1] = 2 * y[1] - 1
+
+    metrics = ["MAE", "RMSE", "PSNR", "LNCC"]
+    metric_module = MetricModule(metrics)
+    for metric in metrics:
+        values = batch_metrics[metric](y, y_pred)
+        assert values.shape == (shape[0],)
+        expected = [
+            metric_module.apply(y[idx], y_pred[idx], report_ci=False)[metric]
+            for idx in range(shape[0])
+        ]
+        np.testing.assert_allclose(values.numpy(), expected, rtol=1e-4)
+
+    # MetricModule.compute_ssim chooses between 2D and 3D SSIM with the number of channels
+    ssim_fn = ssim3D if len(shape) == 5 else ssim
+    expected = [
+        ssim_fn(y[idx].numpy(), y_pred[idx].numpy()).item() for idx in range(shape[0])
+    ]
+    np.testing.assert_allclose(
+        batch_metrics["SSIM"](y, y_pred).numpy(), expected, rtol=1e-4
+    )
+
+
+def test_batch_psnr_range():
+    from clinicadl.utils.reconstruction_metrics import batch_psnr
+
+    y = torch.full((2, 1, 4, 4, 4), 3.0)
+    with pytest.raises(ValueError):
+        batch_psnr(y, y)
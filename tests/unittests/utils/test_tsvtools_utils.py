@@ -0,0 +1,48 @@
+import numpy as np
+from scipy.stats import ks_2samp, ttest_ind
+
+
+def test_split_candidates():
+    from clinicadl.utils.tsvtools_utils import (
+        chi2,
+        chi2_pvalues,
+        ks_statistics,
+        stratified_fold_candidates,
+        stratified_test_masks,
+        ttest_pvalues,
+    )
+
+    rng = np.random.default_rng(0)
+    y = rng.integers(3, size=101)
+    age = rng.normal(70, 8, size=101)
+    age[5] = np.nan
+    sex = rng.integers(2, size=101)
+
+    test_masks = stratified_test_masks(y, 30, 20, rng)
+    assert (test_masks.sum(axis=1) == 30).all()
+    # The classes are represented as in the whole set
+    expected_counts = np.bincount(y) * 30 / len(y)
+    for test_mask in test_masks:
+        assert np.all(np.abs(np.bincount(y[test_mask]) - expected_counts) < 1)
+
+    p_age = ttest_pvalues(test_masks, age, [60.0, 80.0])
+    p_sex = chi2_pvalues(test_masks, sex, [1, 1])
+    rounded_age = np.round(np.nan_to_num(age))
+    statistics = ks_statistics(test_masks, rounded_age)
+    for i, test_mask in enumerate(test_masks):
+        train_age = np.concatenate([age[~test_mask], [60.0, 80.0]])
+        assert np.isclose(
+            p_age[i], ttest_ind(age[test_mask], train_age, nan_policy="omit").pvalue
+        )
+        train_sex = np.concatenate([sex[~test_mask], [1, 1]])
+        assert np.isclose(p_sex[i], chi2(sex[test_mask], train_sex)[1])
+        assert np.isclose(
+            statistics[i],
+            ks_2samp(rounded_age[test_mask], rounded_age[~test_mask]).statistic,
+        )
+
+    folds = stratified_fold_candidates(y, 5, 20, rng)
+    for candidate_folds in folds:
+        assert np.ptp(np.bincount(candidate_folds)) <= 1
+        for class_index in range(3):
+            assert np.ptp(np.bincount(candidate_folds[y == class_index])) <= 1